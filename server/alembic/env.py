@@ -16,20 +16,19 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
-# make project package importable (so `from db import Base` works when alembic
-# is executed from the `server/` directory)
+# make project package importable (so `from app.models import Base` works when
+# alembic is executed from the `server/` directory)
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 # If the DATABASE_URL environment variable isn't set (for example when
-# running `alembic` directly), prefer the value from alembic.ini. We must
-# set this environment variable before importing `db` because `db.py`
-# creates an Engine at import time using that variable.
+# running `alembic` directly), prefer the value from alembic.ini. Settings
+# require it.
 db_url = os.environ.get("DATABASE_URL") or config.get_main_option("sqlalchemy.url")
 if db_url:
     os.environ["DATABASE_URL"] = db_url
 
 # import your MetaData for 'autogenerate' support after DATABASE_URL is set
-from db import Base
+from app.models import Base
 target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
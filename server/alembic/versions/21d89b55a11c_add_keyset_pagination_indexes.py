@@ -0,0 +1,52 @@
+"""add_keyset_pagination_indexes
+
+Revision ID: 21d89b55a11c
+Revises: 59d4108d67f9
+Create Date: 2026-10-18 16:21:07.533902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '21d89b55a11c'
+down_revision: Union[str, Sequence[str], None] = '59d4108d67f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'documents',
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    )
+    # Existing documents recorded their upload time in metadata
+    op.execute(
+        """
+        UPDATE documents
+        SET created_at = (metadata->>'upload_time')::timestamptz
+        WHERE metadata->>'upload_time' IS NOT NULL
+        """
+    )
+    # Keyset cursors compare (created_at, id), so created_at can't be NULL
+    for table in ('documents', 'chats', 'messages'):
+        op.execute(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL")
+        op.alter_column(table, 'created_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+    op.create_index('ix_messages_chat_id_created_at_id', 'messages', ['chat_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_chats_user_id_created_at_id', 'chats', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_documents_user_id_created_at_id', 'documents', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_user_id_created_at_id', table_name='documents')
+    op.drop_index('ix_chats_user_id_created_at_id', table_name='chats')
+    op.drop_index('ix_messages_chat_id_created_at_id', table_name='messages')
+    for table in ('chats', 'messages'):
+        op.alter_column(table, 'created_at', existing_type=sa.DateTime(timezone=True), nullable=True)
+    op.drop_column('documents', 'created_at')
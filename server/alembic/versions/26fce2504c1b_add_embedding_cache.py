@@ -0,0 +1,39 @@
+"""add_embedding_cache
+
+Revision ID: 26fce2504c1b
+Revises: 51efb1e3ba25
+Create Date: 2026-10-18 11:26:54.018342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import pgvector.sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision: str = '26fce2504c1b'
+down_revision: Union[str, Sequence[str], None] = '51efb1e3ba25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'embedding_cache',
+        sa.Column('content_hash', sa.Text(), nullable=False),
+        sa.Column('model', sa.Text(), nullable=False),
+        sa.Column('dim', sa.Integer(), nullable=False),
+        sa.Column('embedding', pgvector.sqlalchemy.Vector(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('content_hash', 'model', 'dim'),
+    )
+    op.create_index(op.f('ix_embedding_cache_created_at'), 'embedding_cache', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_embedding_cache_created_at'), table_name='embedding_cache')
+    op.drop_table('embedding_cache')
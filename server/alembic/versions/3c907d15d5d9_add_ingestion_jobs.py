@@ -0,0 +1,51 @@
+"""add_ingestion_jobs
+
+Revision ID: 3c907d15d5d9
+Revises: 26fce2504c1b
+Create Date: 2026-10-18 13:02:09.871520
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c907d15d5d9'
+down_revision: Union[str, Sequence[str], None] = '26fce2504c1b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'ingestion_jobs',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('filename', sa.Text(), nullable=False),
+        sa.Column('content_type', sa.Text(), nullable=True),
+        sa.Column('status', sa.Text(), nullable=False),
+        sa.Column('stage', sa.Text(), nullable=True),
+        sa.Column('stage_timings', sa.JSON(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=True),
+        sa.Column('document_id', sa.UUID(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_ingestion_jobs_id'), 'ingestion_jobs', ['id'], unique=False)
+    op.create_index('ix_ingestion_jobs_status_created_at', 'ingestion_jobs', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ingestion_jobs_status_created_at', table_name='ingestion_jobs')
+    op.drop_index(op.f('ix_ingestion_jobs_id'), table_name='ingestion_jobs')
+    op.drop_table('ingestion_jobs')
@@ -0,0 +1,63 @@
+"""add_document_chunks
+
+Revision ID: 51efb1e3ba25
+Revises: 869fa4fd7830
+Create Date: 2026-10-18 10:03:17.552930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import pgvector.sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision: str = '51efb1e3ba25'
+down_revision: Union[str, Sequence[str], None] = '869fa4fd7830'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'document_chunks',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('document_id', sa.UUID(), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('embedding', pgvector.sqlalchemy.Vector(dim=1536), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_document_chunks_id'), 'document_chunks', ['id'], unique=False)
+    op.create_index(op.f('ix_document_chunks_document_id'), 'document_chunks', ['document_id'], unique=False)
+
+    # Existing documents become a single chunk so they stay searchable.
+    op.execute("""
+        INSERT INTO document_chunks (id, document_id, chunk_index, content, embedding)
+        SELECT uuid_generate_v4(), id, 0, content, embedding
+        FROM documents
+        WHERE content IS NOT NULL
+    """)
+
+    # Build the ANN index after the backfill; bulk-building HNSW is much
+    # faster than maintaining it row by row.
+    op.create_index(
+        'ix_document_chunks_embedding_hnsw',
+        'document_chunks',
+        ['embedding'],
+        unique=False,
+        postgresql_using='hnsw',
+        postgresql_with={'m': 16, 'ef_construction': 64},
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_document_chunks_embedding_hnsw', table_name='document_chunks', postgresql_using='hnsw')
+    op.drop_index(op.f('ix_document_chunks_document_id'), table_name='document_chunks')
+    op.drop_index(op.f('ix_document_chunks_id'), table_name='document_chunks')
+    op.drop_table('document_chunks')
@@ -0,0 +1,42 @@
+"""add_document_chunks_user_id
+
+Revision ID: 59d4108d67f9
+Revises: 6029478f1070
+Create Date: 2026-10-18 15:40:52.106734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '59d4108d67f9'
+down_revision: Union[str, Sequence[str], None] = '6029478f1070'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('document_chunks', sa.Column('user_id', postgresql.UUID(), nullable=True))
+    op.execute(
+        """
+        UPDATE document_chunks AS c
+        SET user_id = d.user_id
+        FROM documents AS d
+        WHERE d.id = c.document_id
+        """
+    )
+    op.alter_column('document_chunks', 'user_id', nullable=False)
+    op.create_foreign_key('document_chunks_user_id_fkey', 'document_chunks', 'users', ['user_id'], ['id'])
+    op.create_index(op.f('ix_document_chunks_user_id'), 'document_chunks', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_document_chunks_user_id'), table_name='document_chunks')
+    op.drop_constraint('document_chunks_user_id_fkey', 'document_chunks', type_='foreignkey')
+    op.drop_column('document_chunks', 'user_id')
@@ -0,0 +1,30 @@
+"""add_messages_embedding_attempts
+
+Revision ID: 5e2c7a91b4f3
+Revises: d8a5f03b6e17
+Create Date: 2026-10-18 21:37:12.184950
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2c7a91b4f3'
+down_revision: Union[str, Sequence[str], None] = 'd8a5f03b6e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('messages', sa.Column('embedding_attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('messages', sa.Column('embedding_claimed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('messages', 'embedding_claimed_at')
+    op.drop_column('messages', 'embedding_attempts')
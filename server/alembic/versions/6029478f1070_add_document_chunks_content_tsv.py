@@ -0,0 +1,41 @@
+"""add_document_chunks_content_tsv
+
+Revision ID: 6029478f1070
+Revises: 3c907d15d5d9
+Create Date: 2026-10-18 14:41:30.662187
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6029478f1070'
+down_revision: Union[str, Sequence[str], None] = '3c907d15d5d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Stored generated column: Postgres keeps it in sync on INSERT/UPDATE
+    # (including COPY), so no application code writes it.
+    op.add_column(
+        'document_chunks',
+        sa.Column(
+            'content_tsv',
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english', content)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.create_index('ix_document_chunks_content_tsv', 'document_chunks', ['content_tsv'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_document_chunks_content_tsv', table_name='document_chunks', postgresql_using='gin')
+    op.drop_column('document_chunks', 'content_tsv')
@@ -0,0 +1,39 @@
+"""add_documents_sha256_and_duplicate_of
+
+Revision ID: 7b3e91c2d4a8
+Revises: 21d89b55a11c
+Create Date: 2026-10-18 17:02:41.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b3e91c2d4a8'
+down_revision: Union[str, Sequence[str], None] = '21d89b55a11c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('sha256', sa.Text(), nullable=True))
+    op.add_column('documents', sa.Column('duplicate_of', postgresql.UUID(), nullable=True))
+    op.create_foreign_key(
+        'documents_duplicate_of_fkey', 'documents', 'documents', ['duplicate_of'], ['id'], ondelete='SET NULL'
+    )
+    # Every ingestion path has recorded the hash in metadata
+    op.execute("UPDATE documents SET sha256 = metadata->>'sha256' WHERE metadata->>'sha256' IS NOT NULL")
+    op.create_index('ix_documents_user_id_sha256', 'documents', ['user_id', 'sha256'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_user_id_sha256', table_name='documents')
+    op.drop_constraint('documents_duplicate_of_fkey', 'documents', type_='foreignkey')
+    op.drop_column('documents', 'duplicate_of')
+    op.drop_column('documents', 'sha256')
@@ -0,0 +1,40 @@
+"""add_documents_embedding_hnsw_index
+
+Revision ID: 869fa4fd7830
+Revises: a97a7c1757fa
+Create Date: 2026-10-18 09:12:41.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '869fa4fd7830'
+down_revision: Union[str, Sequence[str], None] = 'a97a7c1757fa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+    # HNSW over cosine distance. OpenAI embeddings are unit length, so the
+    # cosine ordering matches L2 and inner product; only cosine queries can
+    # use this index though.
+    op.create_index(
+        'ix_documents_embedding_hnsw',
+        'documents',
+        ['embedding'],
+        unique=False,
+        postgresql_using='hnsw',
+        postgresql_with={'m': 16, 'ef_construction': 64},
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_documents_embedding_hnsw', table_name='documents', postgresql_using='hnsw')
@@ -0,0 +1,29 @@
+"""add_ingestion_jobs_heartbeat_at
+
+Revision ID: 8f41d6c2a7e9
+Revises: 5e2c7a91b4f3
+Create Date: 2026-10-18 22:05:48.771203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f41d6c2a7e9'
+down_revision: Union[str, Sequence[str], None] = '5e2c7a91b4f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # NULL for jobs claimed before the upgrade; staleness falls back to started_at
+    op.add_column('ingestion_jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ingestion_jobs', 'heartbeat_at')
@@ -0,0 +1,51 @@
+"""add_reembedding_runs
+
+Revision ID: c41d2e7f9a30
+Revises: 7b3e91c2d4a8
+Create Date: 2026-10-18 18:11:52.640317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d2e7f9a30'
+down_revision: Union[str, Sequence[str], None] = '7b3e91c2d4a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The embedding_next shadow columns are added by the run itself, once
+    # the target dimension is known.
+    op.create_table(
+        'reembedding_runs',
+        sa.Column('id', sa.UUID(), nullable=False),
+        sa.Column('provider', sa.Text(), nullable=False),
+        sa.Column('model', sa.Text(), nullable=False),
+        sa.Column('dim', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Text(), nullable=False),
+        sa.Column('phase', sa.Text(), nullable=False),
+        sa.Column('cursor', sa.UUID(), nullable=True),
+        sa.Column('documents_done', sa.Integer(), nullable=False),
+        sa.Column('chunks_done', sa.Integer(), nullable=False),
+        sa.Column('tokens', sa.Integer(), nullable=False),
+        sa.Column('tokens_per_s', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('flipped_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_reembedding_runs_id'), 'reembedding_runs', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_reembedding_runs_id'), table_name='reembedding_runs')
+    op.drop_table('reembedding_runs')
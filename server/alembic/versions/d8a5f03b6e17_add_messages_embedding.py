@@ -0,0 +1,48 @@
+"""add_messages_embedding
+
+Revision ID: d8a5f03b6e17
+Revises: c41d2e7f9a30
+Create Date: 2026-10-18 19:04:27.530861
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import pgvector.sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a5f03b6e17'
+down_revision: Union[str, Sequence[str], None] = 'c41d2e7f9a30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable: existing messages are embedded by the background embedder
+    op.add_column('messages', sa.Column('embedding', pgvector.sqlalchemy.Vector(dim=1536), nullable=True))
+    op.create_index(
+        'ix_messages_embedding_hnsw',
+        'messages',
+        ['embedding'],
+        unique=False,
+        postgresql_using='hnsw',
+        postgresql_with={'m': 16, 'ef_construction': 64},
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+    op.create_index(
+        'ix_messages_unembedded',
+        'messages',
+        ['created_at'],
+        unique=False,
+        postgresql_where=sa.text("embedding IS NULL AND content <> ''"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_unembedded', table_name='messages')
+    op.drop_index('ix_messages_embedding_hnsw', table_name='messages', postgresql_using='hnsw')
+    op.drop_column('messages', 'embedding')
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import List, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -8,8 +9,157 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     DATABASE_URL: str
 
-    # OpenAI
-    OPENAI_API_KEY: str
+    # Connection pool (per process). DB_PGBOUNCER disables prepared
+    # statement caching for PgBouncer in transaction pooling mode.
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_S: float = 30
+    DB_POOL_RECYCLE_S: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WARMUP_CONNECTIONS: int = 5
+    DB_PGBOUNCER: bool = False
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+
+    # OpenAI: only needed by the "openai" embedding provider and chat
+    OPENAI_API_KEY: Optional[str] = None
+    # Point at a local stand-in (e.g. a fake embedding server) in tests
+    OPENAI_BASE_URL: Optional[str] = None
+
+    # Keyset-paginated list endpoints
+    PAGE_DEFAULT_LIMIT: int = 50
+    PAGE_MAX_LIMIT: int = 500
+
+    # Batch endpoints: GET /users|chats|messages?ids= and POST /messages/batch
+    BATCH_MAX_READ_IDS: int = 500
+    BATCH_MAX_WRITE_ITEMS: int = 5000
+
+    # Retrieval-augmented chat
+    CHAT_MODEL: str = "gpt-4o-mini"
+    CHAT_MAX_TOKENS: Optional[int] = None
+    CHAT_HISTORY_MESSAGES: int = 20
+    CHAT_CONTEXT_CHUNKS: int = 5
+    # Message embeddings for GET /chats/{id}/recall, filled in after commit by
+    # a background embedder in each worker process. Completions also add up
+    # to CHAT_RECALL_MESSAGES relevant turns from before the history window.
+    MESSAGE_EMBEDDINGS_ENABLED: bool = False
+    MESSAGE_EMBED_BATCH_SIZE: int = 64
+    MESSAGE_EMBED_POLL_INTERVAL_S: float = 2.0
+    # A message the provider keeps rejecting is given up on after this many
+    # attempts; claimed rows are left to other embedders for MESSAGE_EMBED_LEASE_S
+    MESSAGE_EMBED_MAX_ATTEMPTS: int = 3
+    MESSAGE_EMBED_LEASE_S: float = 300.0
+    CHAT_RECALL_MESSAGES: int = 0
+
+    # Startup: import the extractors' optional dependencies (PyPDF2, docx)
+    # in every extraction worker before serving, instead of on first upload
+    STARTUP_PRELOAD: bool = True
+
+    # Chunking
+    CHUNK_UNIT: Literal["chars", "tokens"] = "tokens"
+    CHUNK_SIZE: int = 512
+    CHUNK_OVERLAP: int = 64
+
+    # Embedding provider: "openai", "hashing" (deterministic, for tests) or
+    # "sentence-transformers" (local model name or path in EMBEDDING_MODEL).
+    # EMBEDDING_DIM must match the migrated vector columns; checked at startup.
+    EMBEDDING_PROVIDER: str = "openai"
+    EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    EMBEDDING_DIM: int = 1536
+    EMBEDDING_COST_PER_1K_TOKENS: float = 0.0001
+    EMBEDDING_DEVICE: Optional[str] = None
+    EMBEDDING_LOCAL_BACKEND: Literal["torch", "onnx", "openvino"] = "torch"
+
+    # Embedding micro-batching
+    EMBEDDING_MAX_BATCH_SIZE: int = 64
+    EMBEDDING_MAX_BATCH_TOKENS: int = 100_000
+    EMBEDDING_MAX_WAIT_MS: float = 10
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 3
+    EMBEDDING_RETRY_BACKOFF_S: float = 0.5
+
+    # Embedding cache (in-process LRU + embedding_cache table)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MEMORY_ENTRIES: int = 10_000
+    EMBEDDING_CACHE_TTL_S: float = 30 * 86400
+    EMBEDDING_CACHE_MAX_ROWS: int = 1_000_000
+
+    # Embedding admission control, per process (0 = no limit). Calls that
+    # would wait longer than their class's max wait get a 429; background
+    # workers always wait.
+    EMBEDDING_RPM: int = 0
+    EMBEDDING_TPM: int = 0
+    EMBEDDING_USER_RPM: int = 0
+    EMBEDDING_USER_TPM: int = 0
+    EMBEDDING_INTERACTIVE_MAX_WAIT_S: float = 2.0
+    EMBEDDING_BULK_MAX_WAIT_S: float = 10.0
+
+    # Uploads are streamed to a temp file in UPLOAD_CHUNK_BYTES pieces
+    MAX_UPLOAD_BYTES: int = 100 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    UPLOAD_SPOOL_DIR: Optional[str] = None
+
+    # Text extraction process pool (0 workers = one per CPU)
+    EXTRACTION_MAX_WORKERS: int = 0
+    EXTRACTION_TIMEOUT_S: float = 30
+    EXTRACTION_MAX_MEMORY_MB: int = 1024
+    EXTRACTION_MAX_PAGES: int = 2000
+    EXTRACTION_PAGES_PER_JOB: int = 16
+
+    # Background ingestion (workers per process; 0 = enqueue only)
+    INGESTION_WORKERS: int = 2
+    INGESTION_POLL_INTERVAL_S: float = 1.0
+    # Running jobs heartbeat several times within this; silent ones are reclaimed
+    INGESTION_JOB_STALE_AFTER_S: float = 600
+    INGESTION_MAX_ATTEMPTS: int = 3
+
+    # Ingest-time dedup within a user's documents: exact by sha256, near by
+    # document-embedding cosine distance (0 disables). "skip" returns the
+    # existing document, "link" stores a chunkless copy pointing at it and
+    # "replace" deletes it in favour of the new upload. Near matches are
+    # only likely, not certain (long documents' centroids converge), so
+    # they follow DEDUP_NEAR_POLICY, which only links by default.
+    DEDUP_POLICY: Literal["off", "skip", "link", "replace"] = "skip"
+    DEDUP_NEAR_MAX_DISTANCE: float = 0.0
+    DEDUP_NEAR_POLICY: Literal["skip", "link", "replace"] = "link"
+
+    # Re-embedding into shadow columns (cli.py reembed or the admin
+    # endpoints), paced to REEMBED_TOKENS_PER_S so live traffic keeps its quota
+    REEMBED_BATCH_DOCUMENTS: int = 50
+    REEMBED_TOKENS_PER_S: int = 20_000
+    REEMBED_STALE_AFTER_S: float = 300
+    # How soon a flip made by another process reaches this one's embeddings
+    EMBEDDING_SPACE_POLL_S: float = 5.0
+
+    # Bulk loading (COPY); POST /documents/bulk bodies are capped at
+    # BULK_MAX_UPLOAD_BYTES (larger corpora go through `cli.py bulk-load`)
+    BULK_BATCH_SIZE: int = 1000
+    BULK_MAX_UPLOAD_BYTES: int = 1024 * 1024 * 1024
+    BULK_INDEX_MAINTENANCE_WORK_MEM: str = "2GB"
+
+    # Vector search
+    SEARCH_MAX_K: int = 100
+    HNSW_EF_SEARCH: int = 40
+    IVFFLAT_PROBES: int = 10
+    # Tenant filters: keep scanning the index until k rows pass the filter
+    # (pgvector >= 0.8; turned off at startup on older versions), and skip the index
+    # entirely for tenants with at most SEARCH_EXACT_MAX_CHUNKS chunks.
+    SEARCH_ITERATIVE_SCAN: Literal["off", "relaxed_order", "strict_order"] = "relaxed_order"
+    HNSW_MAX_SCAN_TUPLES: int = 20_000
+    SEARCH_EXACT_MAX_CHUNKS: int = 10_000
+    HYBRID_VECTOR_CANDIDATES: int = 50
+    # ANN index queried: full-precision vectors, halfvec (fp16) or binary
+    # quantized; compact modes re-rank VECTOR_RERANK_FACTOR * k candidates.
+    # Migrations only build "full"; build the others with `cli.py vector-indexes`.
+    VECTOR_SEARCH_INDEX: Literal["full", "halfvec", "binary"] = "full"
+    VECTOR_RERANK_FACTOR: int = 4
+    VECTOR_RECALL_TARGET: float = 0.95
+    # Metrics with a full-precision HNSW index. Only cosine is migrated; build
+    # the others with `cli.py vector-indexes --metric`. Large tenants get a 400
+    # for the rest, rather than a sequential scan of every chunk.
+    SEARCH_ANN_METRICS: List[Literal["cosine", "l2", "inner_product"]] = ["cosine"]
+    HYBRID_TEXT_CANDIDATES: int = 50
+    # Diversified (MMR) searches pick k out of SEARCH_MMR_CANDIDATE_FACTOR * k
+    SEARCH_MMR_CANDIDATE_FACTOR: int = 4
 
     class Config:
         case_sensitive = True
@@ -21,4 +171,19 @@ def get_settings():
     return Settings()
 
 
-settings = get_settings()
\ No newline at end of file
+class _LazySettings:
+    """
+    Stands in for the Settings instance and builds it on first attribute
+    access instead of when this module is imported. The models and
+    services only read it when called; the routers still read their page
+    size limits when imported, as Query bounds.
+    """
+
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+
+settings = _LazySettings()
\ No newline at end of file
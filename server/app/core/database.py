@@ -1,19 +1,179 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Optional
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from app.core.config import settings
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.core.config import Settings, settings
+from app.core.metrics import DB_POOL_CONNECTIONS, DB_POOL_WAIT, REGISTRY, instrument_engine
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def async_database_url(url: str) -> str:
+    """Swap the sync driver in DATABASE_URL (still used by Alembic) for asyncpg."""
+    database_url = make_url(url)
+    if database_url.drivername in ("postgresql", "postgresql+psycopg2", "postgresql+psycopg"):
+        database_url = database_url.set(drivername="postgresql+asyncpg")
+    return database_url.render_as_string(hide_password=False)
+
+
+def asyncpg_dsn(url: str) -> str:
+    """Plain libpq-style DSN for raw asyncpg connections (e.g. COPY)."""
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.recent_waits = deque(maxlen=1000)
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.total_wait_s += waited
+            self.max_wait_s = max(self.max_wait_s, waited)
+            self.recent_waits.append(waited)
+            DB_POOL_WAIT.observe(waited)
+
+    def stats(self) -> dict:
+        recent = sorted(self.recent_waits)
+
+        def percentile(p: float) -> float:
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 3) if recent else 0.0
+
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms": {
+                "mean": round(self.total_wait_s / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": round(self.max_wait_s * 1000, 3),
+            },
+        }
+
+
+def create_engine_from_settings(settings: Settings) -> AsyncEngine:
+    connect_args = {}
+    if settings.DB_PGBOUNCER:
+        # PgBouncer in transaction mode hands each transaction to any server
+        # connection, so prepared statements must be neither cached nor named
+        # consistently across transactions.
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    elif settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args["server_settings"] = {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+
+    engine = create_async_engine(
+        async_database_url(settings.DATABASE_URL),
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_S,
+        pool_recycle=settings.DB_POOL_RECYCLE_S,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+    if settings.DB_PGBOUNCER and settings.DB_STATEMENT_TIMEOUT_MS:
+        # PgBouncer rejects unknown startup parameters, so set it per transaction
+        @event.listens_for(engine.sync_engine, "begin")
+        def set_statement_timeout(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.DB_STATEMENT_TIMEOUT_MS)}")
+
+    return engine
+
+
+async def warm_up_pool(engine: AsyncEngine, connections: int) -> int:
+    """Open `connections` pooled connections up front; returns how many succeeded."""
+    if connections <= 0:
+        return 0
+    opened = []
+
+    async def connect():
+        conn = await engine.connect()
+        opened.append(conn)
+        await conn.exec_driver_sql("SELECT 1")
+
+    results = await asyncio.gather(*(connect() for _ in range(connections)), return_exceptions=True)
+    # Closing returns them to the pool, where they stay open
+    for conn in opened:
+        await conn.close()
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        logger.error("Connection pool warm-up failed for %d of %d connections", len(errors), connections, exc_info=errors[0])
+    return connections - len(errors)
+
+
+def pool_stats(engine: AsyncEngine) -> Optional[dict]:
+    pool = engine.sync_engine.pool
+    return pool.stats() if isinstance(pool, InstrumentedPool) else None
+
+
+def _collect_pool_metrics() -> None:
+    stats = pool_stats(engine) if engine is not None else None
+    if stats is not None:
+        for state in ("checked_in", "checked_out", "overflow"):
+            DB_POOL_CONNECTIONS.set(stats[state], state=state)
+
+
+# Built by get_engine(): at startup for the API and workers, on first use
+# for scripts, never at import time
+engine: Optional[AsyncEngine] = None
+
+
+def get_engine() -> AsyncEngine:
+    global engine
+    if engine is None:
+        engine = create_engine_from_settings(settings)
+        instrument_engine(engine)
+    return engine
+
+
+class _LazySessionmaker(async_sessionmaker):
+    """Binds to get_engine() when the first session is opened."""
+
+    def __call__(self, **local_kw) -> AsyncSession:
+        if self.kw.get("bind") is None:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
+
+
+REGISTRY.add_collector(_collect_pool_metrics)
+SessionLocal = _LazySessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import re
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import Settings, get_settings, settings
+from app.core.database import get_engine, warm_up_pool
+from app.core.startup import StartupReport
+from app.services.admission import AdmissionController
+from app.services.chat import ChatService
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embeddings import EmbeddingService
+from app.services.extraction import ExtractionPool
+from app.services.ingestion import IngestionServices
+from app.services.jobs import IngestionWorkerPool
+from app.services.message_embeddings import MessageEmbedder
+from app.services.reembedding import EmbeddingSpaceWatcher
+
+logger = logging.getLogger(__name__)
+
+
+async def check_embedding_space(engine: AsyncEngine, settings: Settings) -> None:
+    """
+    Refuse to start when EMBEDDING_DIM disagrees with the migrated (or
+    flipped-in) vector column width. A flip to another model of the same
+    width is followed by the EmbeddingSpaceWatcher.
+    """
+    try:
+        async with engine.connect() as conn:
+            column_type = (await conn.execute(text(
+                "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                "WHERE attrelid = 'document_chunks'::regclass AND attname = 'embedding'"
+            ))).scalar_one_or_none()
+    except Exception as e:
+        logger.warning("Embedding configuration check skipped: %s", e)
+        return
+    dim = settings.EMBEDDING_DIM
+    if column_type is not None and column_type != f"vector({dim})":
+        raise RuntimeError(
+            f"EMBEDDING_DIM is {dim} but document_chunks.embedding is {column_type}; "
+            "migrate the vector columns or change the embedding provider."
+        )
+
+
+async def check_pgvector_version(engine: AsyncEngine, settings: Settings) -> None:
+    """
+    Turn SEARCH_ITERATIVE_SCAN off when the installed pgvector predates
+    iterative index scans (0.8), where setting hnsw.iterative_scan fails
+    every filtered search.
+    """
+    if settings.SEARCH_ITERATIVE_SCAN == "off":
+        return
+    try:
+        async with engine.connect() as conn:
+            version = (await conn.execute(text(
+                "SELECT extversion FROM pg_extension WHERE extname = 'vector'"
+            ))).scalar_one_or_none()
+    except Exception as e:
+        logger.warning("pgvector version check skipped: %s", e)
+        return
+    if version is None:
+        return
+    parts = tuple(int(part) for part in re.findall(r"\d+", version)[:2])
+    if parts < (0, 8):
+        logger.warning("pgvector %s has no iterative index scans; SEARCH_ITERATIVE_SCAN is off", version)
+        settings.SEARCH_ITERATIVE_SCAN = "off"
+
+
+async def start_services(state, run_workers: bool = True, report: Optional[StartupReport] = None) -> None:
+    """
+    Create the long-lived per-process services on `state` (e.g. app.state),
+    timing each phase into `report` (state.startup_report).
+    """
+    report = state.startup_report = report or StartupReport()
+
+    with report.phase("settings"):
+        get_settings()
+    with report.phase("engine"):
+        engine = get_engine()
+    # Pay connection setup (TCP, TLS, auth) before the first request does
+    with report.phase("pool_warmup"):
+        await warm_up_pool(engine, min(settings.DB_POOL_WARMUP_CONNECTIONS, settings.DB_POOL_SIZE))
+    with report.phase("embedding_check"):
+        await check_embedding_space(engine, settings)
+        await check_pgvector_version(engine, settings)
+
+    # One embedding client per process, shared by every request
+    with report.phase("embedding_service"):
+        state.embedding_service = EmbeddingService.from_settings(settings)
+        state.embedding_service.admission = AdmissionController.from_settings(
+            settings, state.embedding_service.provider.name
+        )
+        await state.embedding_service.start()
+        state.embedding_cache = EmbeddingCache.from_settings(settings) if settings.EMBEDDING_CACHE_ENABLED else None
+    # Follow re-embedding flips: adopt the last flipped model now, later ones as they happen
+    with report.phase("embedding_space"):
+        state.embedding_space = EmbeddingSpaceWatcher(
+            state.embedding_service, settings, poll_interval=settings.EMBEDDING_SPACE_POLL_S
+        )
+        try:
+            await state.embedding_space.refresh()
+        except Exception as e:
+            logger.warning("Embedding space check skipped: %s", e)
+        state.embedding_space.start()
+    with report.phase("extraction_pool"):
+        state.extraction_pool = ExtractionPool.from_settings(settings)
+        state.extraction_pool.start()
+        if state.extraction_pool.preload:
+            try:
+                report.preloaded = await state.extraction_pool.warm_up()
+            except Exception:
+                logger.exception("Extraction pool warm-up error")
+    with report.phase("chat_service"):
+        state.chat_service = ChatService.from_settings(settings) if settings.OPENAI_API_KEY else None
+
+    state.ingestion_workers = None
+    state.reembedding_task = None
+    if run_workers and settings.INGESTION_WORKERS > 0:
+        services = IngestionServices(
+            state.embedding_service, state.embedding_cache, state.extraction_pool, priority="background"
+        )
+        state.ingestion_workers = IngestionWorkerPool.from_settings(settings, services)
+        state.ingestion_workers.start()
+    state.message_embedder = None
+    if run_workers and settings.MESSAGE_EMBEDDINGS_ENABLED:
+        state.message_embedder = MessageEmbedder.from_settings(settings, state.embedding_service, state.embedding_cache)
+        state.message_embedder.start()
+    report.log()
+
+
+async def stop_services(state) -> None:
+    if state.reembedding_task is not None and not state.reembedding_task.done():
+        # Marks the run paused; it resumes from its last committed batch
+        state.reembedding_task.cancel()
+        await asyncio.gather(state.reembedding_task, return_exceptions=True)
+    if state.ingestion_workers is not None:
+        await state.ingestion_workers.close()
+    if state.message_embedder is not None:
+        await state.message_embedder.close()
+    state.extraction_pool.close()
+    await state.embedding_space.close()
+    if state.chat_service is not None:
+        await state.chat_service.close()
+    await state.embedding_service.close()
+    await get_engine().dispose()
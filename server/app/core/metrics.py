@@ -0,0 +1,311 @@
+"""
+Minimal in-process metrics registry rendered in the Prometheus text format.
+
+Metrics are per process: with several uvicorn workers, scrape each one (or
+run a single worker per pod).
+"""
+import abc
+import bisect
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    type: str = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines for every label set, without HELP and TYPE."""
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket (non-cumulative) counts, +Inf last, then sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """`collector` runs before each render, e.g. to refresh gauges."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logger.exception("Metrics collector error")
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests being served.", ("method", "route"))
+REQUEST_QUERIES = REGISTRY.histogram("http_request_db_queries", "Database queries issued per HTTP request.", ("method", "route"), COUNT_BUCKETS)
+REQUEST_QUERY_TIME = REGISTRY.histogram("http_request_db_seconds", "Database time per HTTP request.", ("method", "route"))
+
+DB_POOL_WAIT = REGISTRY.histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.")
+DB_POOL_CONNECTIONS = REGISTRY.gauge("db_pool_connections", "Pooled connections by state.", ("state",))
+DB_QUERIES = REGISTRY.counter("db_queries_total", "Database queries by statement fingerprint.", ("statement",))
+DB_QUERY_LATENCY = REGISTRY.histogram("db_query_duration_seconds", "Database query latency by statement fingerprint.", ("statement",))
+
+STAGE_LATENCY = REGISTRY.histogram("pipeline_stage_duration_seconds", "Duration of each pipeline stage.", ("pipeline", "stage"))
+
+EMBEDDING_LATENCY = REGISTRY.histogram("embedding_request_duration_seconds", "Embedding API request latency, retries included.", ("model",))
+EMBEDDING_TEXTS = REGISTRY.counter("embedding_texts_total", "Texts sent to the embedding API.", ("model",))
+EMBEDDING_TOKENS = REGISTRY.counter("embedding_tokens_total", "Tokens billed by the embedding API.", ("model",))
+EMBEDDING_COST = REGISTRY.counter("embedding_cost_usd_total", "Estimated embedding spend in USD.", ("model",))
+EMBEDDING_ERRORS = REGISTRY.counter("embedding_errors_total", "Embedding API requests that failed after retries.", ("model",))
+STARTUP_PHASE = REGISTRY.gauge("startup_phase_seconds", "Time spent in each phase of process startup.", ("phase",))
+
+EMBEDDING_CACHE = REGISTRY.counter("embedding_cache_lookups_total", "Embedding cache lookups by result.", ("result",))
+EMBEDDING_ADMISSION_QUEUE = REGISTRY.gauge("embedding_admission_queue_depth", "Embedding calls waiting for rate limit budget.", ("priority",))
+EMBEDDING_ADMISSION_WAIT = REGISTRY.histogram("embedding_admission_wait_seconds", "Time embedding calls waited for admission.", ("priority",))
+EMBEDDING_ADMISSION_REJECTED = REGISTRY.counter("embedding_admission_rejected_total", "Embedding calls rejected by admission control.", ("priority", "limit"))
+
+
+# -------------------
+# Per-request database accounting
+# -------------------
+class _RequestQueries:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_request_queries: ContextVar[Optional[_RequestQueries]] = ContextVar("request_queries", default=None)
+
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PARAM_LIST = re.compile(r"\(\s*(?:\$\d+|\?|%\(\w+\)s)(?:\s*,\s*(?:\$\d+|\?|%\(\w+\)s))+\s*\)")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s")
+# asyncpg statements cast every parameter: $1::VARCHAR, $2::TIMESTAMP WITH TIME ZONE, $3::vector(384)
+_CAST = re.compile(
+    r"::\s*(?:timestamp with(?:out)? time zone|double precision|character varying|\w+)(?:\s*\(\s*\d+(?:\s*,\s*\d+)?\s*\))?(?:\[\])*",
+    re.IGNORECASE,
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str, max_length: int = 160) -> str:
+    """
+    Statement with literals, casts and parameter lists collapsed, so label
+    cardinality stays bounded. Statements longer than `max_length` keep a
+    readable prefix and a hash of the whole, so two that share the prefix
+    stay apart.
+    """
+    statement = _STRING.sub("?", statement)
+    statement = _CAST.sub("", statement)
+    statement = _PARAM.sub("?", statement)
+    statement = _PARAM_LIST.sub("(...)", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    # Multi-row VALUES lists differ only in their length
+    statement = re.sub(r"(\(\.\.\.\))(\s*,\s*\(\.\.\.\))+", r"\1, ...", statement)
+    if len(statement) <= max_length:
+        return statement
+    digest = hashlib.blake2b(statement.encode(), digest_size=4).hexdigest()
+    return f"{statement[:max_length - len(digest) - 2].rstrip()} #{digest}"
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Time every statement on `engine`, by fingerprint and per HTTP request."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        label = fingerprint(statement)
+        DB_QUERIES.inc(statement=label)
+        DB_QUERY_LATENCY.observe(elapsed, statement=label)
+        totals = _request_queries.get()
+        if totals is not None:
+            totals.count += 1
+            totals.seconds += elapsed
+
+
+# -------------------
+# HTTP middleware
+# -------------------
+class MetricsMiddleware:
+    """
+    Latency, status and in-flight counts per route template (e.g.
+    /api/v1/chats/{chat_id}), plus database queries and time per request.
+
+    `paths` returns the route templates, in routing order; it is called once,
+    on the first request, after every router has been included.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Callable[[], Iterable[str]], exclude: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.paths = paths
+        self.exclude = tuple(exclude)
+        self._templates: Optional[List[Tuple[re.Pattern, str]]] = None
+
+    def _route_template(self, path: str) -> str:
+        if self._templates is None:
+            self._templates = [(compile_path(template)[0], template) for template in self.paths()]
+        for regex, template in self._templates:
+            if regex.match(path):
+                return template
+        # Unknown paths share one label so scanners can't blow up cardinality
+        return "unmatched"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope["path"])
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        totals = _RequestQueries()
+        token = _request_queries.set(totals)
+        HTTP_IN_FLIGHT.inc(method=method, route=route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            HTTP_IN_FLIGHT.dec(method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=status)
+            HTTP_LATENCY.observe(elapsed, method=method, route=route)
+            REQUEST_QUERIES.observe(totals.count, method=method, route=route)
+            REQUEST_QUERY_TIME.observe(totals.seconds, method=method, route=route)
@@ -0,0 +1,43 @@
+from typing import Iterable
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class MaxBodySizeMiddleware:
+    """
+    Rejects request bodies over `max_bytes` on the given path suffixes with
+    413, before they are parsed: up front from Content-Length, or as soon as
+    a chunked body crosses the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.max_bytes or not scope["path"].endswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds the {self.max_bytes} byte limit."
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside body parsing; FastAPI passes HTTPExceptions through
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
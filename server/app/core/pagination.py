@@ -0,0 +1,64 @@
+import base64
+import datetime
+import json
+from typing import Any, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(created_at: datetime.datetime, id: Any) -> str:
+    raw = json.dumps([created_at.isoformat(), str(id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.datetime.fromisoformat(created_at), UUID(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class KeysetPage:
+    # A plain class rather than a dataclass: FastAPI would asdict() a
+    # dataclass response, deep-copying the ORM rows in `items`.
+    def __init__(self, items: List[Any], next_cursor: Optional[str]):
+        self.items = items
+        self.next_cursor = next_cursor
+
+
+async def keyset_paginate(
+    db: AsyncSession,
+    query: Select,
+    model,
+    *,
+    limit: int,
+    cursor: Optional[str] = None,
+    order: str = "desc",
+) -> KeysetPage:
+    """
+    One page of `query` ordered by (created_at, id), starting after `cursor`.
+
+    The row comparison is served straight from a (filter, created_at, id)
+    composite index, so page N costs the same as page 1, unlike OFFSET.
+    """
+    key = tuple_(model.created_at, model.id)
+    if cursor is not None:
+        after = tuple_(*decode_cursor(cursor))
+        query = query.where(key < after if order == "desc" else key > after)
+    if order == "desc":
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at, model.id)
+
+    # One extra row tells whether there is a next page
+    items = list((await db.execute(query.limit(limit + 1))).scalars().all())
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+    return KeysetPage(items=items, next_cursor=next_cursor)
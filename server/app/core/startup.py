@@ -0,0 +1,51 @@
+"""
+Where a process's cold start goes: module imports, then each startup
+phase (settings, engine, pool warm-up, clients, extraction workers).
+
+The report is logged once the process is ready, exported as the
+startup_phase_seconds gauge and served at GET /api/v1/system/startup.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from app.core.metrics import STARTUP_PHASE
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        # Optional dependencies imported ahead of the first request
+        self.preloaded: Dict[str, Optional[float]] = {}
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        STARTUP_PHASE.set(self.phases[phase], phase=phase)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_ms": round(sum(self.phases.values()) * 1000, 3),
+            "phases_ms": {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()},
+            # None: the module is not installed
+            "preloaded_ms": {
+                module: None if seconds is None else round(seconds * 1000, 3)
+                for module, seconds in self.preloaded.items()
+            },
+        }
+
+    def log(self) -> None:
+        report = self.as_dict()
+        phases = ", ".join(f"{phase} {ms:.0f}ms" for phase, ms in report["phases_ms"].items())
+        logger.info("Startup took %.0fms: %s", report["total_ms"], phases)
+
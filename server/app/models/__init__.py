@@ -8,5 +8,9 @@ from .models import (
     Chat,
     Message,
     Document,
+    DocumentChunk,
+    EmbeddingCacheEntry,
+    IngestionJob,
+    ReembeddingRun,
     Base
 )
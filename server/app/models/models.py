@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Text, JSON, ForeignKey, DateTime, func
-from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Computed, Text, JSON, ForeignKey, DateTime, Index, Integer, LargeBinary, PrimaryKeyConstraint, func, text
+from sqlalchemy.orm import deferred, relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 from pgvector.sqlalchemy import Vector
 import uuid
 
@@ -33,11 +33,16 @@ class Chat(Base):
     id = Column(UUID, primary_key=True, index=True, default=generate_uuid)
     title = Column(Text, nullable=True)
     user_id = Column(UUID, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     user = relationship("User", back_populates="chats")
     messages = relationship("Message", back_populates="chat")
 
+    __table_args__ = (
+        # Keyset pagination of a user's chats
+        Index("ix_chats_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
 
 # -------------------
 # Messages Table
@@ -49,10 +54,34 @@ class Message(Base):
     chat_id = Column(UUID, ForeignKey("chats.id"), nullable=False)
     role = Column(Text, nullable=False)  # e.g. "user" or "assistant"
     content = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Filled in after commit by the background MessageEmbedder (NULL until then)
+    embedding = deferred(Column(Vector()), raiseload=True)
+    # Failed embedding attempts (rows stop being retried at MESSAGE_EMBED_MAX_ATTEMPTS),
+    # and when an embedder last claimed the row
+    embedding_attempts = Column(Integer, nullable=False, server_default="0")
+    embedding_claimed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     chat = relationship("Chat", back_populates="messages")
 
+    __table_args__ = (
+        # Keyset pagination of a chat's history
+        Index("ix_messages_chat_id_created_at_id", "chat_id", "created_at", "id"),
+        Index(
+            "ix_messages_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+        # The embedder's backlog; shrinks to nothing once it has caught up
+        Index(
+            "ix_messages_unembedded",
+            "created_at",
+            postgresql_where=text("embedding IS NULL AND content <> ''"),
+        ),
+    )
+
 
 # -------------------
 # Documents Table
@@ -63,7 +92,139 @@ class Document(Base):
     id = Column(UUID, primary_key=True, index=True, default=generate_uuid)
     filename = Column(Text, nullable=False)
     doc_metadata = Column("metadata", JSON)
-    content = Column(Text)
-    embedding = Column(Vector(1536))
+    # Tens of KB per row; only loaded when a query asks for them (load_only /
+    # undefer). raiseload turns an accidental lazy load into a clear error
+    # instead of an implicit round trip, which async sessions can't do anyway.
+    content = deferred(Column(Text), raiseload=True)
+    # No width, like the other vector columns: the migrations size them and
+    # startup checks EMBEDDING_DIM against them
+    embedding = deferred(Column(Vector()), raiseload=True)
+    # Hex sha256 of the uploaded bytes, for exact-duplicate lookups
+    sha256 = Column(Text, nullable=True)
+    # Set on chunkless copies kept under DEDUP_POLICY=link
+    duplicate_of = Column(UUID, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
     user_id = Column(UUID, ForeignKey("users.id"), nullable=False)
-    user = relationship("User", back_populates="documents")
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    user = relationship("User", back_populates="documents")
+    chunks = relationship(
+        "DocumentChunk",
+        back_populates="document",
+        cascade="all, delete-orphan",
+        order_by="DocumentChunk.chunk_index",
+    )
+
+    __table_args__ = (
+        # Whole-document ANN index; queries must order by cosine_distance
+        # for the planner to pick it up.
+        Index(
+            "ix_documents_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+        # Keyset pagination of a user's documents
+        Index("ix_documents_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_documents_user_id_sha256", "user_id", "sha256"),
+    )
+
+
+# -------------------
+# Document Chunks Table
+# -------------------
+class DocumentChunk(Base):
+    __tablename__ = "document_chunks"
+
+    id = Column(UUID, primary_key=True, index=True, default=generate_uuid)
+    document_id = Column(UUID, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Copied from the parent document so tenant filters need no join
+    user_id = Column(UUID, ForeignKey("users.id"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    content = Column(Text, nullable=False)
+    embedding = Column(Vector())
+    # Maintained by Postgres; used by the lexical leg of hybrid search
+    content_tsv = Column(TSVECTOR, Computed("to_tsvector('english', content)", persisted=True))
+
+    document = relationship("Document", back_populates="chunks")
+
+    __table_args__ = (
+        Index("ix_document_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+        Index(
+            "ix_document_chunks_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
+
+
+# -------------------
+# Embedding Cache Table
+# -------------------
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    content_hash = Column(Text, nullable=False)  # sha256 of the embedded text
+    model = Column(Text, nullable=False)
+    dim = Column(Integer, nullable=False)
+    embedding = Column(Vector(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("content_hash", "model", "dim"),
+    )
+
+
+# -------------------
+# Ingestion Jobs Table
+# -------------------
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(UUID, primary_key=True, index=True, default=generate_uuid)
+    user_id = Column(UUID, ForeignKey("users.id"), nullable=False)
+    filename = Column(Text, nullable=False)
+    content_type = Column(Text, nullable=True)
+    status = Column(Text, nullable=False, default="queued")  # queued, running, succeeded, failed
+    stage = Column(Text, nullable=True)
+    stage_timings = Column(JSON, nullable=False, default=dict)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    payload = Column(LargeBinary, nullable=True)  # raw upload, cleared once the job finishes
+    document_id = Column(UUID, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    # Bumped by the worker while it runs the job; a silent job is reclaimed
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_ingestion_jobs_status_created_at", "status", "created_at"),
+    )
+
+
+# -------------------
+# Re-embedding Runs Table
+# -------------------
+class ReembeddingRun(Base):
+    """Progress of one re-embedding into the embedding_next shadow columns."""
+    __tablename__ = "reembedding_runs"
+
+    id = Column(UUID, primary_key=True, index=True, default=generate_uuid)
+    provider = Column(Text, nullable=False)
+    model = Column(Text, nullable=False)
+    dim = Column(Integer, nullable=False)
+    # running, paused, failed, completed (ready to flip), flipped
+    status = Column(Text, nullable=False, default="running")
+    phase = Column(Text, nullable=False, default="walk")  # walk, catch_up, index
+    cursor = Column(UUID, nullable=True)  # last documents.id written in the walk
+    documents_done = Column(Integer, nullable=False, default=0)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    tokens = Column(Integer, nullable=False, default=0)
+    tokens_per_s = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    flipped_at = Column(DateTime(timezone=True), nullable=True)
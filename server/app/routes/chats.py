@@ -1,26 +1,242 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import asyncio
+import json
+import logging
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
 from uuid import UUID
 
-from app.core.database import get_db
-from app.models.models import Chat
-from app.schemas import ChatCreate, ChatResponse
+from app.core.batch import fetch_by_ids, parse_ids
+from app.core.config import settings
+from app.core.database import SessionLocal, get_db
+from app.core.pagination import keyset_paginate
+from app.models.models import Chat, Message
+from app.schemas import (
+    BatchGetResponse,
+    ChatCompletionRequest,
+    ChatCreate,
+    ChatResponse,
+    MessageResponse,
+    Page,
+    RecalledMessageResponse,
+)
+from app.services.admission import AdmissionRejected, too_many_requests
+from app.services.chat import ChatService, build_prompt, get_chat_service
+from app.services.embedding_cache import EmbeddingCache, get_embedding_cache
+from app.services.embeddings import EmbeddingService, EmbeddingSpaceChanged, get_embedding_service
+from app.services.ingestion import StageTimer
+from app.services.message_embeddings import MessageEmbedder, get_message_embedder, recall_messages
+from app.services.search import QueryEmbeddingError, embed_query, vector_search
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, default=str)}\n\n"
+
+
 @router.post("/", response_model=ChatResponse)
-def create_chat(chat: ChatCreate, db: Session = Depends(get_db)):
+async def create_chat(chat: ChatCreate, db: AsyncSession = Depends(get_db)):
     db_chat = Chat(title=chat.title, user_id=chat.user_id)
     db.add(db_chat)
-    db.commit()
-    db.refresh(db_chat)
+    await db.commit()
+    await db.refresh(db_chat)
     return db_chat
 
 
+@router.get("/", response_model=BatchGetResponse[ChatResponse])
+async def get_chats(
+    ids: List[str] = Query(description="Chat ids, comma-separated and/or repeated"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Up to BATCH_MAX_READ_IDS chats in one query, in the order asked for."""
+    chat_ids, errors = parse_ids(ids, settings.BATCH_MAX_READ_IDS)
+    return await fetch_by_ids(db, select(Chat), Chat, chat_ids, errors)
+
+
 @router.get("/{chat_id}", response_model=ChatResponse)
-def get_chat(chat_id: UUID, db: Session = Depends(get_db)):
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+async def get_chat(chat_id: UUID, db: AsyncSession = Depends(get_db)):
+    chat = await db.get(Chat, chat_id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return chat
+
+
+@router.get("/{chat_id}/messages", response_model=Page[MessageResponse])
+async def list_chat_messages(
+    chat_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    order: Literal["asc", "desc"] = "desc",
+    db: AsyncSession = Depends(get_db),
+):
+    """Chat history, newest first by default; follow `next_cursor` to page back."""
+    if not await db.get(Chat, chat_id):
+        raise HTTPException(status_code=404, detail="Chat not found")
+    query = select(Message).where(Message.chat_id == chat_id)
+    return await keyset_paginate(db, query, Message, limit=limit, cursor=cursor, order=order)
+
+
+@router.get("/{chat_id}/recall", response_model=List[RecalledMessageResponse])
+async def recall_chat_messages(
+    chat_id: UUID,
+    q: str = Query(min_length=1),
+    k: int = Query(5, ge=1, le=50),
+    before: Optional[UUID] = Query(None, description="Only messages older than this message"),
+    db: AsyncSession = Depends(get_db),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    embedding_cache: Optional[EmbeddingCache] = Depends(get_embedding_cache),
+):
+    """
+    The chat's messages most relevant to `q`, closest first. Only messages
+    the background embedder has reached are searched (MESSAGE_EMBEDDINGS_ENABLED).
+    """
+    chat = await db.get(Chat, chat_id)
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    before_time = None
+    if before is not None:
+        before_time = (await db.execute(
+            select(Message.created_at).where(Message.id == before, Message.chat_id == chat_id)
+        )).scalar_one_or_none()
+        if before_time is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+    try:
+        query_vector = await embed_query(db, embedding_service, embedding_cache, q, user_id=chat.user_id)
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+    except EmbeddingSpaceChanged as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except QueryEmbeddingError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    recalled = await recall_messages(db, chat_id, query_vector, limit=k, before=before_time)
+    # Ends the transaction (and the SET LOCALs) and keeps any cache writes
+    await db.commit()
+    return recalled
+
+
+@router.post("/{chat_id}/completions")
+async def create_chat_completion(
+    chat_id: UUID,
+    request: ChatCompletionRequest,
+    db: AsyncSession = Depends(get_db),
+    chat_service: ChatService = Depends(get_chat_service),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    embedding_cache: Optional[EmbeddingCache] = Depends(get_embedding_cache),
+    embedder: Optional[MessageEmbedder] = Depends(get_message_embedder),
+):
+    """
+    Answer a user message with retrieval over the chat owner's documents
+    and, with `recall`, over earlier turns of the chat that fell out of the
+    history window. Streamed as Server-Sent Events:
+
+    - `event: context` with the retrieved chunks,
+    - `event: recall` with the recalled message ids, if any,
+    - one unnamed event per content delta: `{"delta": "..."}`,
+    - `event: done` with the stored message ids and timings
+      (or `event: error` if the model fails mid-stream).
+    """
+    started = time.perf_counter()
+    timer = StageTimer(pipeline="chat")
+
+    chat = await db.get(Chat, chat_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    return chat
\ No newline at end of file
+
+    async def load_history():
+        async with SessionLocal() as history_db:
+            rows = (await history_db.execute(
+                select(Message)
+                .where(Message.chat_id == chat_id)
+                .order_by(Message.created_at.desc())
+                .limit(settings.CHAT_HISTORY_MESSAGES)
+            )).scalars().all()
+        return list(reversed(rows))
+
+    recall_k = settings.CHAT_RECALL_MESSAGES if request.recall is None else request.recall
+
+    async def retrieve():
+        k = settings.CHAT_CONTEXT_CHUNKS if request.k is None else request.k
+        if k == 0 and recall_k == 0:
+            return [], []
+        hits, recalled = [], []
+        async with SessionLocal() as search_db:
+            query_vector = await embed_query(
+                search_db, embedding_service, embedding_cache, request.content, user_id=chat.user_id
+            )
+            if k:
+                hits = await vector_search(search_db, query_vector, limit=k, user_id=chat.user_id)
+            if recall_k:
+                # Over-fetch: turns still in the history window are dropped below
+                recalled = await recall_messages(
+                    search_db,
+                    chat_id,
+                    query_vector,
+                    limit=recall_k + settings.CHAT_HISTORY_MESSAGES,
+                )
+            await search_db.commit()
+        return hits, recalled
+
+    # History and retrieval run on separate connections, in parallel
+    async with timer.stage("context"):
+        try:
+            history, (hits, recalled) = await asyncio.gather(load_history(), retrieve())
+        except AdmissionRejected as e:
+            raise too_many_requests(e)
+        except EmbeddingSpaceChanged as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except QueryEmbeddingError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+
+    # Only stored once the request can be answered, so a refused request
+    # leaves no unanswered turn behind
+    async with timer.stage("persist_user_message"):
+        user_message = Message(chat_id=chat_id, role="user", content=request.content)
+        db.add(user_message)
+        await db.commit()
+        await db.refresh(user_message)
+
+    in_history = {message.id for message in history}
+    recalled = [message for message in recalled if message.id not in in_history][:recall_k]
+    prompt = build_prompt(history, hits, request.content, recalled=recalled)
+
+    async def events():
+        yield _sse(
+            [{"chunk_id": hit.chunk_id, "document_id": hit.document_id, "filename": hit.filename, "distance": hit.distance} for hit in hits],
+            event="context",
+        )
+        if recalled:
+            yield _sse([{"message_id": message.id, "distance": message.distance} for message in recalled], event="recall")
+        parts = []
+        try:
+            async for delta in chat_service.stream(prompt):
+                if not parts:
+                    timer.timings["time_to_first_token"] = round((time.perf_counter() - started) * 1000, 3)
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except Exception:
+            logger.exception("Chat completion error in chat %s", chat_id)
+            yield _sse({"detail": "Chat completion failed.", "user_message_id": user_message.id}, event="error")
+            return
+
+        async with timer.stage("persist_assistant_message"):
+            async with SessionLocal() as answer_db:
+                assistant_message = Message(chat_id=chat_id, role="assistant", content="".join(parts))
+                answer_db.add(assistant_message)
+                await answer_db.commit()
+            if embedder is not None:
+                embedder.notify()
+        timer.timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+        yield _sse(
+            {"user_message_id": user_message.id, "assistant_message_id": assistant_message.id, "timings": timer.timings},
+            event="done",
+        )
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,104 +1,271 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+import base64
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, load_only
+from starlette.concurrency import run_in_threadpool
 from uuid import UUID
-import datetime
-import hashlib
-import os
-from openai import OpenAI
+from typing import Literal, Optional
 
-from app.core.database import get_db
+from app.core.database import SessionLocal, get_db
 from app.core.config import settings
-from app.models.models import Document
-from app.schemas import DocumentResponse
+from app.models.models import Document, IngestionJob
+from app.schemas import (
+    BulkIngestResponse,
+    DocumentDetail,
+    DocumentResponse,
+    DocumentSearchHit,
+    DocumentSearchRequest,
+    DocumentSearchResponse,
+    IngestionJobResponse,
+)
+from app.services.admission import AdmissionRejected, retry_after_header, too_many_requests
+from app.services.bulk import BulkLoader, iter_ndjson_items, iter_zip_items
+from app.services.embedding_cache import EmbeddingCache, get_embedding_cache
+from app.services.embeddings import EmbeddingService, EmbeddingSpaceChanged, get_embedding_service
+from app.services.extraction import get_extractor
+from app.services.ingestion import IngestionError, IngestionServices, get_ingestion_services, ingest_document
+from app.services.jobs import IngestionWorkerPool, enqueue_ingestion, get_ingestion_workers
+from app.services.search import QueryEmbeddingError, SearchPlanError, SearchStats, diversify, embed_query, hybrid_search, vector_search
+from app.services.uploads import UploadTooLarge, spool_upload
 
 router = APIRouter()
 
+# `fields=` names -> (mapped column, response field); metadata keeps its
+# historical response name.
+DOCUMENT_FIELDS = {
+    "id": (Document.id, "id"),
+    "filename": (Document.filename, "filename"),
+    "metadata": (Document.doc_metadata, "doc_metadata"),
+    "content": (Document.content, "content"),
+    "created_at": (Document.created_at, "created_at"),
+    "user_id": (Document.user_id, "user_id"),
+    "sha256": (Document.sha256, "sha256"),
+    "duplicate_of": (Document.duplicate_of, "duplicate_of"),
+}
+DEFAULT_DOCUMENT_FIELDS = ("id", "filename", "metadata", "content", "created_at")
+DOCUMENT_INCLUDES = ("embedding",)
+
+
+def _parse_list(value: Optional[str], allowed, name: str) -> list:
+    items = [item.strip() for item in (value or "").split(",") if item.strip()]
+    unknown = [item for item in items if item not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown {name}: {', '.join(unknown)}. Expected any of {', '.join(allowed)}.",
+        )
+    return items
+
+
+def _encode_vector(vector) -> str:
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
 
-@router.post("/upload", response_model=DocumentResponse)
+@router.post("/upload", response_model=DocumentResponse, responses={202: {"model": IngestionJobResponse}})
 async def upload_document(
     file: UploadFile = File(...),
     user_id: UUID = Form(...),
-    db: Session = Depends(get_db)
+    mode: Literal["sync", "async"] = Form("sync"),
+    db: AsyncSession = Depends(get_db),
+    services: IngestionServices = Depends(get_ingestion_services),
+    workers: Optional[IngestionWorkerPool] = Depends(get_ingestion_workers),
 ):
-    # Read file content
-    content = await file.read()
-    text = None
-    # Detect and extract text based on file type
-    if file.content_type == "text/plain" or file.filename.lower().endswith(".txt"):
+    if mode == "async":
+        # Queue the raw upload and return immediately; a worker runs the
+        # pipeline and GET /jobs/{job_id} reports its progress.
+        if get_extractor(file.content_type, file.filename) is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}")
         try:
-            text = content.decode("utf-8")
-        except Exception:
-            raise HTTPException(status_code=400, detail="Could not decode text file as UTF-8.")
-    elif file.content_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" or file.filename.lower().endswith(".docx"):
+            upload = await spool_upload(file)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
         try:
-            from docx import Document as DocxDocument
-            from io import BytesIO
-            docx = DocxDocument(BytesIO(content))
-            text = "\n".join([p.text for p in docx.paragraphs])
-        except Exception:
-            raise HTTPException(status_code=400, detail="Could not extract text from Word document.")
-    elif file.content_type == "application/pdf" or file.filename.lower().endswith(".pdf"):
-        try:
-            from PyPDF2 import PdfReader
-            from io import BytesIO
-            reader = PdfReader(BytesIO(content))
-            text = "\n".join(page.extract_text() or "" for page in reader.pages)
-        except Exception:
-            raise HTTPException(status_code=400, detail="Could not extract text from PDF document.")
-    else:
-        raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.content_type}")
+            # The bytea insert needs the whole payload; MAX_UPLOAD_BYTES bounds it
+            payload = await run_in_threadpool(upload.read_bytes)
+        finally:
+            upload.close()
+        job = await enqueue_ingestion(
+            db,
+            filename=file.filename,
+            content_type=file.content_type,
+            user_id=user_id,
+            payload=payload,
+        )
+        if workers is not None:
+            workers.notify()
+        return JSONResponse(status_code=202, content=jsonable_encoder(IngestionJobResponse.model_validate(job)))
+
+    try:
+        return await ingest_document(
+            db,
+            services,
+            filename=file.filename,
+            content_type=file.content_type,
+            user_id=user_id,
+            read=lambda: spool_upload(file),
+        )
+    except IngestionError as e:
+        headers = retry_after_header(e.retry_after) if e.retry_after is not None else None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
 
-    if not text or not text.strip():
-        raise HTTPException(status_code=400, detail="No extractable text found in file.")
 
-    # Generate embeddings using OpenAI
+@router.post("/bulk", response_model=BulkIngestResponse)
+async def bulk_ingest_documents(
+    file: UploadFile = File(...),
+    user_id: UUID = Form(...),
+    services: IngestionServices = Depends(get_ingestion_services),
+):
+    """
+    Load an NDJSON file (one DocumentCreate per line, `embedding` optional)
+    or a zip of documents with COPY. Use the CLI for very large corpora;
+    only it can defer the ANN indexes, which affects every tenant.
+    """
+    if file.content_type in ("application/zip", "application/x-zip-compressed") or file.filename.lower().endswith(".zip"):
+        items = iter_zip_items(file.file, services)
+    else:
+        items = iter_ndjson_items(file.file)
+    loader = BulkLoader(services, user_id, batch_size=settings.BULK_BATCH_SIZE, priority="bulk")
     try:
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        embedding_response = client.embeddings.create(
-            input=text,
-            model="text-embedding-ada-002"
+        return await loader.run(items)
+    except AdmissionRejected as e:
+        # Resending the file skips what was loaded as exact duplicates
+        raise HTTPException(
+            status_code=429,
+            detail=f"{e} {loader.result.documents} documents were loaded before the limit was reached.",
+            headers=retry_after_header(e.retry_after),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(job_id: UUID, db: AsyncSession = Depends(get_db)):
+    job = await db.get(IngestionJob, job_id, options=[defer(IngestionJob.payload)])
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
+
+@router.post("/search", response_model=DocumentSearchResponse)
+async def search_documents(
+    request: DocumentSearchRequest,
+    db: AsyncSession = Depends(get_db),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    embedding_cache: Optional[EmbeddingCache] = Depends(get_embedding_cache),
+):
+    if request.k > settings.SEARCH_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be at most {settings.SEARCH_MAX_K}.")
+    if request.embedding is not None and len(request.embedding) != settings.EMBEDDING_DIM:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Embedding must have {settings.EMBEDDING_DIM} dimensions, got {len(request.embedding)}.",
         )
-        embedding = embedding_response.data[0].embedding
-        n_tokens = embedding_response.usage.total_tokens if hasattr(embedding_response, 'usage') else len(text.split())
-        cost = n_tokens / 1000 * 0.0001
-    except Exception as e:
-        print("Embedding error:", e)
-        embedding = [0.0] * 1536
-        cost = 0.0
-
-    # Enrich metadata
-    current_time = datetime.datetime.now(datetime.timezone.utc)
-    metadata = {
-        "filename": file.filename,
-        "content_type": file.content_type,
-        "size_bytes": len(content),
-        "word_count": len(text.split()),
-        "line_count": text.count("\n") + 1,
-        "sha256": hashlib.sha256(content).hexdigest(),
-        "upload_time": current_time.isoformat(),
-        "upload_time_epoch": int(current_time.timestamp()),
-        "embedding_model": "text-embedding-ada-002",
-        "embedding_cost_usd": cost,
-        "embedding_dim": len(embedding),
-        "embedding_tokens": n_tokens if 'n_tokens' in locals() else len(text.split()),
-    }
-
-    db_doc = Document(
-        filename=file.filename,
-        doc_metadata=metadata,
-        content=text,
-        embedding=embedding,
-        user_id=user_id
+
+    stats = SearchStats()
+    # Diversified searches re-rank a larger candidate set down to k
+    candidates = request.k
+    if request.mmr_lambda is not None:
+        candidates = request.k * settings.SEARCH_MMR_CANDIDATE_FACTOR
+    query_vector = None
+    try:
+        if request.mode == "hybrid":
+            hits = await hybrid_search(
+                SessionLocal,
+                embedding_service,
+                embedding_cache,
+                request.query,
+                k=candidates,
+                metric=request.metric,
+                user_id=request.user_id,
+                vector_weight=request.vector_weight,
+                text_weight=request.text_weight,
+                vector_candidates=max(request.vector_candidates or settings.HYBRID_VECTOR_CANDIDATES, candidates),
+                text_candidates=max(request.text_candidates or settings.HYBRID_TEXT_CANDIDATES, candidates),
+                rrf_k=request.rrf_k,
+                ef_search=request.ef_search,
+                probes=request.probes,
+                index=request.index,
+                rerank_factor=request.rerank_factor,
+                stats=stats,
+            )
+        else:
+            query_vector = request.embedding
+            if query_vector is None:
+                async with stats.timer.stage("embed"):
+                    query_vector = await embed_query(
+                        db, embedding_service, embedding_cache, request.query, user_id=request.user_id
+                    )
+            hits = await vector_search(
+                db,
+                query_vector,
+                metric=request.metric,
+                limit=candidates,
+                user_id=request.user_id,
+                ef_search=request.ef_search,
+                probes=request.probes,
+                index=request.index,
+                rerank_factor=request.rerank_factor,
+                stats=stats,
+            )
+        if request.mmr_lambda is not None:
+            async with stats.timer.stage("diversify"):
+                hits = await diversify(db, hits, request.k, request.mmr_lambda, query_vector)
+        # Ends the transaction (and the SET LOCALs) and keeps any cache writes
+        await db.commit()
+    except AdmissionRejected as e:
+        raise too_many_requests(e)
+    except EmbeddingSpaceChanged as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except QueryEmbeddingError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except SearchPlanError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return DocumentSearchResponse(
+        mode=request.mode,
+        metric=request.metric,
+        k=request.k,
+        plan=stats.plan,
+        tenant_chunks=stats.tenant_chunks,
+        timings=stats.timer.timings,
+        results=[DocumentSearchHit.model_validate(hit) for hit in hits],
     )
-    db.add(db_doc)
-    db.commit()
-    db.refresh(db_doc)
-    return db_doc
 
 
-@router.get("/{doc_id}", response_model=DocumentResponse)
-def get_document(doc_id: UUID, db: Session = Depends(get_db)):
-    doc = db.query(Document).filter(Document.id == doc_id).first()
+@router.get("/embedding-cache/stats")
+async def get_embedding_cache_stats(embedding_cache: Optional[EmbeddingCache] = Depends(get_embedding_cache)):
+    if embedding_cache is None:
+        raise HTTPException(status_code=404, detail="Embedding cache is disabled")
+    return embedding_cache.stats()
+
+
+@router.get("/{doc_id}", response_model=DocumentDetail, response_model_exclude_unset=True)
+async def get_document(
+    doc_id: UUID,
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. id,filename,metadata"),
+    include: Optional[str] = Query(None, description="embedding: add the vector as base64 float32"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Only the requested columns are SELECTed, so metadata lookups never read
+    the content or the vector. Decode an included embedding with
+    numpy.frombuffer(base64.b64decode(value), "<f4").
+    """
+    names = _parse_list(fields, tuple(DOCUMENT_FIELDS), "fields") or list(DEFAULT_DOCUMENT_FIELDS)
+    includes = _parse_list(include, DOCUMENT_INCLUDES, "include")
+    names = list(dict.fromkeys(["id"] + names))
+
+    columns = [DOCUMENT_FIELDS[name][0] for name in names]
+    if "embedding" in includes:
+        columns.append(Document.embedding)
+    doc = await db.get(Document, doc_id, options=[load_only(*columns)])
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-    return doc
\ No newline at end of file
+
+    values = {DOCUMENT_FIELDS[name][1]: getattr(doc, DOCUMENT_FIELDS[name][0].key) for name in names}
+    if "embedding" in includes:
+        values["embedding"] = _encode_vector(doc.embedding) if doc.embedding is not None else None
+    return DocumentDetail(**values)
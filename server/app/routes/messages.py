@@ -1,26 +1,108 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from uuid import UUID
 
+from app.core.batch import fetch_by_ids, id_in, parse_ids, validation_message
+from app.core.config import settings
 from app.core.database import get_db
-from app.models.models import Message
-from app.schemas import MessageCreate, MessageResponse
+from app.models.models import Chat, Message
+from app.schemas import (
+    BatchGetResponse,
+    MessageBatchCreate,
+    MessageBatchItem,
+    MessageBatchResponse,
+    MessageCreate,
+    MessageResponse,
+)
+from app.services.message_embeddings import MessageEmbedder, get_message_embedder
+from app.services.messages import insert_messages
 
 router = APIRouter()
 
 
 @router.post("/", response_model=MessageResponse)
-def create_message(message: MessageCreate, db: Session = Depends(get_db)):
+async def create_message(
+    message: MessageCreate,
+    db: AsyncSession = Depends(get_db),
+    embedder: Optional[MessageEmbedder] = Depends(get_message_embedder),
+):
     db_message = Message(chat_id=message.chat_id, role=message.role, content=message.content)
     db.add(db_message)
-    db.commit()
-    db.refresh(db_message)
+    await db.commit()
+    await db.refresh(db_message)
+    if embedder is not None:
+        embedder.notify()
     return db_message
 
 
+@router.post("/batch", response_model=MessageBatchResponse)
+async def create_messages(
+    batch: MessageBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    embedder: Optional[MessageEmbedder] = Depends(get_message_embedder),
+):
+    """
+    Create up to BATCH_MAX_WRITE_ITEMS messages, across any chats, in one
+    transaction: one query checks the chats, one multi-row INSERT writes
+    them. Invalid items and items for unknown chats are reported in
+    `errors` (by position) and the rest are still created.
+    """
+    if len(batch.messages) > settings.BATCH_MAX_WRITE_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_WRITE_ITEMS} messages per batch.")
+
+    errors = {}
+    items = []
+    for position, raw in enumerate(batch.messages):
+        try:
+            items.append((position, MessageBatchItem.model_validate(raw)))
+        except ValidationError as e:
+            errors[position] = validation_message(e)
+
+    chat_ids = list({item.chat_id for _, item in items})
+    known = set()
+    if chat_ids:
+        known = {str(id) for id in (await db.execute(select(Chat.id).where(id_in(Chat.id, chat_ids)))).scalars()}
+    valid = []
+    for position, item in items:
+        if str(item.chat_id) in known:
+            valid.append(item)
+        else:
+            errors[position] = "Chat not found"
+
+    created = []
+    if valid:
+        try:
+            created = await insert_messages(db, valid)
+            await db.commit()
+        except IntegrityError:
+            # A chat was deleted between the check and the insert
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="A chat in the batch no longer exists; nothing was created.")
+        if embedder is not None:
+            embedder.notify()
+    return MessageBatchResponse(
+        items=[MessageResponse.model_validate(row) for row in created],
+        errors=[{"ref": f"messages[{position}]", "error": errors[position]} for position in sorted(errors)],
+    )
+
+
+@router.get("/", response_model=BatchGetResponse[MessageResponse])
+async def get_messages(
+    ids: List[str] = Query(description="Message ids, comma-separated and/or repeated"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Up to BATCH_MAX_READ_IDS messages in one query, in the order asked for."""
+    message_ids, errors = parse_ids(ids, settings.BATCH_MAX_READ_IDS)
+    return await fetch_by_ids(db, select(Message), Message, message_ids, errors)
+
+
 @router.get("/{message_id}", response_model=MessageResponse)
-def get_message(message_id: UUID, db: Session = Depends(get_db)):
-    message = db.query(Message).filter(Message.id == message_id).first()
+async def get_message(message_id: UUID, db: AsyncSession = Depends(get_db)):
+    message = await db.get(Message, message_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
-    return message
\ No newline at end of file
+    return message
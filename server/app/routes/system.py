@@ -0,0 +1,119 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import get_db, get_engine, pool_stats
+from app.schemas import ReembeddingRequest, ReembeddingRunResponse
+from app.services.embedding_providers import PROVIDERS
+from app.services.reembedding import (
+    ReembeddingError,
+    abandon_run,
+    create_run,
+    flip_run,
+    latest_run,
+    pause_run,
+    run_in_background,
+)
+
+router = APIRouter()
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    """Live pool occupancy and checkout wait times for this worker process."""
+    stats = pool_stats(get_engine())
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Connection pool is not instrumented")
+    return stats
+
+
+@router.get("/startup")
+async def get_startup_report(request: Request):
+    """Where this process's cold start went: imports, then each startup phase."""
+    report = getattr(request.app.state, "startup_report", None)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No startup report")
+    return report.as_dict()
+
+
+@router.get("/embedding-admission")
+async def get_embedding_admission_stats(request: Request):
+    """Rate limit budgets, queue depth and admission waits per priority, for tuning the EMBEDDING_*PM limits."""
+    admission = getattr(request.app.state.embedding_service, "admission", None)
+    if admission is None:
+        raise HTTPException(status_code=404, detail="Embedding admission control is not running")
+    return admission.stats()
+
+
+async def _latest_run_or_404(db: AsyncSession):
+    run = await latest_run(db)
+    if run is None:
+        raise HTTPException(status_code=404, detail="No re-embedding run")
+    return run
+
+
+@router.get("/reembedding", response_model=ReembeddingRunResponse)
+async def get_reembedding(db: AsyncSession = Depends(get_db)):
+    return await _latest_run_or_404(db)
+
+
+@router.post("/reembedding", response_model=ReembeddingRunResponse, status_code=202)
+async def start_reembedding(body: ReembeddingRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Start re-embedding every document into shadow columns, or resume the
+    open run with the same target, in the background of this process.
+    Flip it in with POST /reembedding/flip once it is `completed`.
+    """
+    provider = body.provider or settings.EMBEDDING_PROVIDER
+    if provider not in PROVIDERS:
+        raise HTTPException(status_code=400, detail=f"Unknown provider: {provider}")
+    try:
+        run = await create_run(
+            db,
+            provider=provider,
+            model=body.model or settings.EMBEDDING_MODEL,
+            dim=body.dim or settings.EMBEDDING_DIM,
+            tokens_per_s=body.tokens_per_s,
+        )
+        if run.status in ("pending", "paused", "failed", "running"):
+            await run_in_background(request.app.state, settings, run)
+    except ReembeddingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return run
+
+
+@router.post("/reembedding/pause", response_model=ReembeddingRunResponse)
+async def pause_reembedding(db: AsyncSession = Depends(get_db)):
+    run = await _latest_run_or_404(db)
+    await pause_run(db, run.id)
+    await db.refresh(run)
+    return run
+
+
+@router.post("/reembedding/flip", response_model=ReembeddingRunResponse)
+async def flip_reembedding(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Atomically swap the re-embedded vectors in. This process embeds with
+    the new model straight away, others within EMBEDDING_SPACE_POLL_S;
+    roll out the matching EMBEDDING_* settings before the next restart.
+    """
+    run = await _latest_run_or_404(db)
+    try:
+        run = await flip_run(db, run.id)
+    except ReembeddingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    watcher = getattr(request.app.state, "embedding_space", None)
+    if watcher is not None:
+        await watcher.refresh()
+    return run
+
+
+@router.delete("/reembedding", response_model=ReembeddingRunResponse)
+async def abandon_reembedding(db: AsyncSession = Depends(get_db)):
+    """Stop the open run and drop its shadow columns."""
+    run = await _latest_run_or_404(db)
+    try:
+        await abandon_run(db, run.id)
+    except ReembeddingError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return run
@@ -1,26 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from typing import List, Literal, Optional
 from uuid import UUID
 
+from app.core.batch import fetch_by_ids, parse_ids
+from app.core.config import settings
 from app.core.database import get_db
-from app.models.models import User
-from app.schemas import UserCreate, UserResponse
+from app.core.pagination import keyset_paginate
+from app.models.models import Chat, Document, User
+from app.schemas import BatchGetResponse, ChatResponse, DocumentSummary, Page, UserCreate, UserResponse
 
 router = APIRouter()
 
 
 @router.post("/", response_model=UserResponse)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     db_user = User(username=user.username, email=user.email)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 
+@router.get("/", response_model=BatchGetResponse[UserResponse])
+async def get_users(
+    ids: List[str] = Query(description="User ids, comma-separated and/or repeated"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Up to BATCH_MAX_READ_IDS users in one query, in the order asked for."""
+    user_ids, errors = parse_ids(ids, settings.BATCH_MAX_READ_IDS)
+    return await fetch_by_ids(db, select(User), User, user_ids, errors)
+
+
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user(user_id: UUID, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user(user_id: UUID, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
\ No newline at end of file
+    return user
+
+
+@router.get("/{user_id}/chats", response_model=Page[ChatResponse])
+async def list_user_chats(
+    user_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    order: Literal["asc", "desc"] = "desc",
+    db: AsyncSession = Depends(get_db),
+):
+    if not await db.get(User, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    query = select(Chat).where(Chat.user_id == user_id)
+    return await keyset_paginate(db, query, Chat, limit=limit, cursor=cursor, order=order)
+
+
+@router.get("/{user_id}/documents", response_model=Page[DocumentSummary])
+async def list_user_documents(
+    user_id: UUID,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGE_DEFAULT_LIMIT, ge=1, le=settings.PAGE_MAX_LIMIT),
+    order: Literal["asc", "desc"] = "desc",
+    db: AsyncSession = Depends(get_db),
+):
+    if not await db.get(User, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    # Leave content and embedding on disk; a listing never shows them
+    query = (
+        select(Document)
+        .options(load_only(Document.id, Document.filename, Document.doc_metadata, Document.created_at))
+        .where(Document.user_id == user_id)
+    )
+    return await keyset_paginate(db, query, Document, limit=limit, cursor=cursor, order=order)
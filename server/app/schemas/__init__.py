@@ -6,10 +6,29 @@ It provides a centralized point for accessing data validation and serialization
 from .schemas import (
     UserCreate,
     UserResponse,
+    Page,
+    BatchItemError,
+    BatchGetResponse,
     ChatCreate,
     ChatResponse,
+    ChatCompletionRequest,
     MessageCreate,
     MessageResponse,
+    MessageBatchItem,
+    MessageBatchCreate,
+    MessageBatchResponse,
+    RecalledMessageResponse,
     DocumentCreate,
-    DocumentResponse
+    DocumentResponse,
+    DuplicateMatchResponse,
+    DocumentDetail,
+    DocumentSummary,
+    IngestionJobResponse,
+    BulkIngestError,
+    BulkIngestResponse,
+    DocumentSearchRequest,
+    DocumentSearchHit,
+    DocumentSearchResponse,
+    ReembeddingRequest,
+    ReembeddingRunResponse
 )
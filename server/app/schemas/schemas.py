@@ -1,7 +1,9 @@
-from pydantic import BaseModel, UUID4
-from typing import Optional, List
+from pydantic import BaseModel, Field, UUID4, model_validator
+from typing import Any, Dict, Generic, Literal, Optional, List, TypeVar
 from datetime import datetime
 
+T = TypeVar("T")
+
 
 # -------------------
 # User Schemas
@@ -21,6 +23,38 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+# -------------------
+# Pagination
+# -------------------
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    # Pass as `cursor` to fetch the next page; null on the last page
+    next_cursor: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+# -------------------
+# Batch Schemas
+# -------------------
+class BatchItemError(BaseModel):
+    # The malformed id, or the position of the rejected item (e.g. "messages[3]")
+    ref: str
+    error: str
+
+
+class BatchGetResponse(BaseModel, Generic[T]):
+    # In the order the ids were given
+    items: List[T]
+    # Well-formed ids with no row
+    missing: List[UUID4]
+    errors: List[BatchItemError]
+
+    class Config:
+        from_attributes = True
+
+
 # -------------------
 # Chat Schemas
 # -------------------
@@ -59,6 +93,36 @@ class MessageResponse(BaseModel):
         from_attributes = True
 
 
+class MessageBatchItem(MessageCreate):
+    # Keeps the original timeline of imported chats; default: now, in batch order
+    created_at: Optional[datetime] = None
+
+
+class MessageBatchCreate(BaseModel):
+    # Validated one by one (as MessageBatchItem), so a bad item is reported
+    # in `errors` instead of failing the batch
+    messages: List[Dict[str, Any]]
+
+
+class MessageBatchResponse(BaseModel):
+    # Created messages, in request order
+    items: List[MessageResponse]
+    errors: List[BatchItemError]
+
+
+class RecalledMessageResponse(MessageResponse):
+    # Cosine distance between the message and the recall query
+    distance: float
+
+
+class ChatCompletionRequest(BaseModel):
+    content: str = Field(min_length=1)
+    # Document chunks retrieved as context (default CHAT_CONTEXT_CHUNKS; 0 disables retrieval)
+    k: Optional[int] = Field(default=None, ge=0, le=50)
+    # Earlier turns recalled from outside the history window (default CHAT_RECALL_MESSAGES)
+    recall: Optional[int] = Field(default=None, ge=0, le=20)
+
+
 # -------------------
 # Document Schemas
 # -------------------
@@ -66,14 +130,180 @@ class DocumentCreate(BaseModel):
     filename: str
     doc_metadata: Optional[dict] = None
     content: str
-    embedding: List[float]
+    embedding: Optional[List[float]] = None
+
+
+class DuplicateMatchResponse(BaseModel):
+    document_id: UUID4
+    kind: Literal["exact", "near"]
+    action: Literal["skip", "link", "replace"]
+    distance: Optional[float] = None
+
+    class Config:
+        from_attributes = True
 
 
 class DocumentResponse(BaseModel):
     id: UUID4
     filename: str
     doc_metadata: Optional[dict]
+    content: Optional[str] = None  # None on linked duplicates
+    created_at: Optional[datetime] = None
+    sha256: Optional[str] = None
+    duplicate_of: Optional[UUID4] = None
+    # Set when the upload matched an existing document (see DEDUP_POLICY)
+    dedup: Optional[DuplicateMatchResponse] = None
+
+    class Config:
+        from_attributes = True
+
+
+class DocumentDetail(BaseModel):
+    """GET /documents/{doc_id}: only the requested fields are present."""
+    id: UUID4
+    filename: Optional[str] = None
+    doc_metadata: Optional[dict] = None
+    content: Optional[str] = None
+    created_at: Optional[datetime] = None
+    user_id: Optional[UUID4] = None
+    sha256: Optional[str] = None
+    duplicate_of: Optional[UUID4] = None
+    # Base64 of little-endian float32s, with include=embedding
+    embedding: Optional[str] = None
+
+
+class DocumentSummary(BaseModel):
+    id: UUID4
+    filename: str
+    doc_metadata: Optional[dict]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class IngestionJobResponse(BaseModel):
+    id: UUID4
+    user_id: UUID4
+    filename: str
+    content_type: Optional[str] = None
+    status: str
+    stage: Optional[str] = None
+    stage_timings: Dict[str, float] = {}
+    error: Optional[str] = None
+    attempts: int
+    document_id: Optional[UUID4] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class BulkIngestError(BaseModel):
+    ref: str
+    error: str
+
+
+class BulkIngestResponse(BaseModel):
+    documents: int
+    chunks: int
+    embedding_tokens: int
+    errors: List[BulkIngestError]
+    duplicates: int = 0  # exact duplicates skipped (DEDUP_POLICY != "off")
+    elapsed_ms: float
+
+    class Config:
+        from_attributes = True
+
+
+class DocumentSearchRequest(BaseModel):
+    query: Optional[str] = None
+    embedding: Optional[List[float]] = None
+    metric: Literal["cosine", "l2", "inner_product"] = "cosine"
+    k: int = Field(default=10, ge=1)
+    # Searches are always scoped to one tenant
+    user_id: UUID4
+    # HNSW / IVFFlat recall knobs, applied with SET LOCAL for this query only
+    ef_search: Optional[int] = Field(default=None, ge=1, le=1000)
+    probes: Optional[int] = Field(default=None, ge=1, le=32768)
+    # Compact index to shortlist from (default VECTOR_SEARCH_INDEX), re-ranked exactly
+    index: Optional[Literal["full", "halfvec", "binary"]] = None
+    rerank_factor: Optional[int] = Field(default=None, ge=1, le=100)
+    # Maximal marginal relevance: 1 ranks by relevance only, lower values
+    # trade relevance for diversity so near-identical chunks don't fill the top k
+    mmr_lambda: Optional[float] = Field(default=None, ge=0, le=1)
+    # Hybrid mode: full-text and vector legs merged with reciprocal rank fusion
+    mode: Literal["vector", "hybrid"] = "vector"
+    vector_weight: float = Field(default=1.0, ge=0)
+    text_weight: float = Field(default=1.0, ge=0)
+    vector_candidates: Optional[int] = Field(default=None, ge=1)
+    text_candidates: Optional[int] = Field(default=None, ge=1)
+    rrf_k: int = Field(default=60, ge=1)
+
+    @model_validator(mode="after")
+    def check_query(self):
+        if (self.query is None) == (self.embedding is None):
+            raise ValueError("Provide exactly one of 'query' or 'embedding'.")
+        if self.query is not None and not self.query.strip():
+            raise ValueError("'query' must not be empty.")
+        if self.mode == "hybrid" and self.query is None:
+            raise ValueError("Hybrid search needs a text 'query'.")
+        return self
+
+
+class DocumentSearchHit(BaseModel):
+    chunk_id: UUID4
+    chunk_index: int
     content: str
+    document_id: UUID4
+    filename: str
+    distance: Optional[float] = None
+    text_rank: Optional[float] = None
+    score: Optional[float] = None  # reciprocal rank fusion score, hybrid mode only
+
+    class Config:
+        from_attributes = True
+
+
+class DocumentSearchResponse(BaseModel):
+    mode: str
+    metric: str
+    k: int
+    plan: Optional[str] = None  # "exact" or "ann", as chosen for the tenant
+    tenant_chunks: Optional[int] = None  # counted up to SEARCH_EXACT_MAX_CHUNKS + 1
+    timings: Dict[str, float] = {}
+    results: List[DocumentSearchHit]
+
+
+# -------------------
+# Re-embedding Schemas
+# -------------------
+class ReembeddingRequest(BaseModel):
+    # Target embedding space; each defaults to the current EMBEDDING_* setting
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    dim: Optional[int] = Field(default=None, ge=1, le=2000)  # HNSW indexes up to 2000 dimensions
+    tokens_per_s: Optional[int] = Field(default=None, ge=0)  # 0 = unthrottled
+
+
+class ReembeddingRunResponse(BaseModel):
+    id: UUID4
+    provider: str
+    model: str
+    dim: int
+    status: str
+    phase: str
+    cursor: Optional[UUID4] = None
+    documents_done: int
+    chunks_done: int
+    tokens: int
+    tokens_per_s: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    heartbeat_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    flipped_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
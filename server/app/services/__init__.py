@@ -0,0 +1,4 @@
+"""
+This module contains the application services.
+It keeps ingestion and retrieval logic out of the route handlers.
+"""
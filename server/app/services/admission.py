@@ -0,0 +1,280 @@
+"""
+Admission control for embedding traffic.
+
+Each EmbeddingService.embed call is admitted against token buckets for
+requests and tokens per minute, for the provider as a whole and for the
+calling user, before anything reaches the provider. Callers that have to
+wait are served in priority order (interactive queries ahead of bulk
+ingestion); one that would wait longer than its class allows is rejected
+straight away with AdmissionRejected, which routes answer with a 429 and
+Retry-After.
+
+Buckets are per process, like the metrics: with several workers, divide
+the provider's limits between them.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+
+from app.core.config import Settings
+from app.core.metrics import EMBEDDING_ADMISSION_QUEUE, EMBEDDING_ADMISSION_REJECTED, EMBEDDING_ADMISSION_WAIT
+
+# Highest first; "background" callers (workers) wait as long as it takes
+PRIORITIES = ("interactive", "bulk", "background")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: float, limit: str):
+        super().__init__(f"Embedding rate limit reached ({limit}); retry in {math.ceil(retry_after)}s.")
+        self.retry_after = retry_after
+        self.limit = limit
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+def too_many_requests(error: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(error), headers=retry_after_header(error.retry_after))
+
+
+class TokenBucket:
+    """Refills `per_minute` units a minute, holding at most a minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float, ahead: float = 0) -> float:
+        """
+        Seconds until `amount` can be taken once `ahead` has been. A call
+        larger than the bucket only needs a full one; it leaves the bucket
+        in debt, which later callers wait out.
+        """
+        self._refill(now)
+        return max(0.0, (ahead + min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= amount
+
+
+class _Budget:
+    """Requests/min and tokens/min buckets; a limit of 0 is no bucket."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+
+    def wait_time(self, requests: int, tokens: int, now: float, ahead: Tuple[int, int] = (0, 0)) -> Tuple[float, str]:
+        """The longer of the two waits, and which limit it comes from."""
+        waits = [(0.0, "")]
+        if self.requests is not None:
+            waits.append((self.requests.wait_time(requests, now, ahead[0]), "rpm"))
+        if self.tokens is not None:
+            waits.append((self.tokens.wait_time(tokens, now, ahead[1]), "tpm"))
+        return max(waits)
+
+    def take(self, requests: int, tokens: int, now: float) -> None:
+        if self.requests is not None:
+            self.requests.take(requests, now)
+        if self.tokens is not None:
+            self.tokens.take(tokens, now)
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    seq: int
+    requests: int = field(compare=False)
+    tokens: int = field(compare=False)
+    wakeup: asyncio.Event = field(compare=False, default_factory=asyncio.Event)
+    done: bool = field(compare=False, default=False)
+
+
+class AdmissionController:
+    """
+    Token buckets for one provider and for each user, plus a priority queue
+    for the provider's. Requests are counted as the upstream batches a call
+    needs, tokens with the same estimate the micro-batcher uses.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        rpm: int = 0,
+        tpm: int = 0,
+        user_rpm: int = 0,
+        user_tpm: int = 0,
+        max_wait: Optional[Dict[str, Optional[float]]] = None,
+        max_users: int = 10_000,
+    ):
+        self.provider = provider
+        self.limits = {"rpm": rpm, "tpm": tpm, "user_rpm": user_rpm, "user_tpm": user_tpm}
+        self.budget = _Budget(rpm, tpm)
+        self.max_wait: Dict[str, Optional[float]] = {"interactive": 2.0, "bulk": 10.0, "background": None, **(max_wait or {})}
+        self.max_users = max_users
+        self._users: "OrderedDict[UUID, _Budget]" = OrderedDict()
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self.depth = {priority: 0 for priority in PRIORITIES}
+        self.admitted = {priority: 0 for priority in PRIORITIES}
+        self.rejected = {priority: 0 for priority in PRIORITIES}
+        self.wait_seconds = {priority: 0.0 for priority in PRIORITIES}
+        self.max_wait_seen = {priority: 0.0 for priority in PRIORITIES}
+
+    @classmethod
+    def from_settings(cls, settings: Settings, provider: str) -> "AdmissionController":
+        return cls(
+            provider,
+            rpm=settings.EMBEDDING_RPM,
+            tpm=settings.EMBEDDING_TPM,
+            user_rpm=settings.EMBEDDING_USER_RPM,
+            user_tpm=settings.EMBEDDING_USER_TPM,
+            max_wait={
+                "interactive": settings.EMBEDDING_INTERACTIVE_MAX_WAIT_S,
+                "bulk": settings.EMBEDDING_BULK_MAX_WAIT_S,
+            },
+        )
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        available = {}
+        for name, bucket in (("requests", self.budget.requests), ("tokens", self.budget.tokens)):
+            if bucket is not None:
+                bucket._refill(now)
+                available[name] = round(bucket.level, 1)
+        return {
+            "provider": self.provider,
+            "limits": self.limits,
+            "max_wait_s": self.max_wait,
+            "available": available,
+            "queue_depth": dict(self.depth),
+            "admitted": dict(self.admitted),
+            "rejected": dict(self.rejected),
+            "mean_wait_ms": {
+                priority: round(self.wait_seconds[priority] / self.admitted[priority] * 1000, 3) if self.admitted[priority] else 0.0
+                for priority in PRIORITIES
+            },
+            "max_wait_ms": {priority: round(seconds * 1000, 3) for priority, seconds in self.max_wait_seen.items()},
+            "tracked_users": len(self._users),
+        }
+
+    def _user_budget(self, user_id: Optional[UUID]) -> Optional[_Budget]:
+        if user_id is None or not (self.limits["user_rpm"] > 0 or self.limits["user_tpm"] > 0):
+            return None
+        budget = self._users.get(user_id)
+        if budget is None:
+            budget = self._users[user_id] = _Budget(self.limits["user_rpm"], self.limits["user_tpm"])
+            # Forgetting an idle user only forgives debt they have long since waited out
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        self._users.move_to_end(user_id)
+        return budget
+
+    async def acquire(self, requests: int, tokens: int, user_id: Optional[UUID] = None, priority: str = "bulk") -> float:
+        """
+        Wait until the call fits the provider's and the user's budgets and
+        take it from both; returns the seconds waited. Raises
+        AdmissionRejected as soon as the wait is known to exceed the
+        priority's max wait.
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        start = time.monotonic()
+        max_wait = self.max_wait[priority]
+        deadline = None if max_wait is None else start + max_wait
+        try:
+            # A user over their own budget waits (or is turned away) without
+            # holding a place in the shared queue
+            user = self._user_budget(user_id)
+            while user is not None:
+                wait, limit = user.wait_time(requests, tokens, time.monotonic())
+                if wait <= 0:
+                    break
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    raise AdmissionRejected(wait, f"user {limit}")
+                await asyncio.sleep(wait)
+            await self._take_turn(requests, tokens, PRIORITIES.index(priority), deadline)
+            if user is not None:
+                user.take(requests, tokens, time.monotonic())
+        except AdmissionRejected as e:
+            self.rejected[priority] += 1
+            EMBEDDING_ADMISSION_REJECTED.inc(priority=priority, limit=e.limit)
+            raise
+        waited = time.monotonic() - start
+        self.admitted[priority] += 1
+        self.wait_seconds[priority] += waited
+        self.max_wait_seen[priority] = max(self.max_wait_seen[priority], waited)
+        EMBEDDING_ADMISSION_WAIT.observe(waited, priority=priority)
+        return waited
+
+    def _head(self) -> Optional[_Waiter]:
+        while self._waiters and self._waiters[0].done:
+            heapq.heappop(self._waiters)
+        return self._waiters[0] if self._waiters else None
+
+    def _wait_estimate(self, waiter: _Waiter) -> Tuple[float, str]:
+        """Time until the provider budget covers `waiter` and everyone queued ahead of it."""
+        ahead = [other for other in self._waiters if not other.done and other < waiter]
+        return self.budget.wait_time(
+            waiter.requests,
+            waiter.tokens,
+            time.monotonic(),
+            ahead=(sum(other.requests for other in ahead), sum(other.tokens for other in ahead)),
+        )
+
+    async def _take_turn(self, requests: int, tokens: int, rank: int, deadline: Optional[float]) -> None:
+        waiter = _Waiter(rank, next(self._seq), requests, tokens)
+        wait, limit = self._wait_estimate(waiter)
+        if wait <= 0 and not any(not other.done and other < waiter for other in self._waiters):
+            self.budget.take(requests, tokens, time.monotonic())
+            return
+        if deadline is not None and time.monotonic() + wait > deadline:
+            raise AdmissionRejected(wait, f"provider {limit}")
+
+        priority = PRIORITIES[rank]
+        heapq.heappush(self._waiters, waiter)
+        self.depth[priority] += 1
+        EMBEDDING_ADMISSION_QUEUE.set(self.depth[priority], priority=priority)
+        try:
+            while True:
+                wait = None
+                if self._head() is waiter:
+                    wait, limit = self.budget.wait_time(requests, tokens, time.monotonic())
+                    if wait <= 0:
+                        self.budget.take(requests, tokens, time.monotonic())
+                        return
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and (remaining <= 0 or (wait is not None and wait > remaining)):
+                    # Higher priority callers got in first
+                    wait, limit = self._wait_estimate(waiter)
+                    raise AdmissionRejected(max(wait, 1.0), f"provider {limit}")
+                # Only the head polls the buckets; the rest sleep until it leaves
+                waiter.wakeup.clear()
+                timeout = wait if remaining is None else remaining if wait is None else min(wait, remaining)
+                try:
+                    await asyncio.wait_for(waiter.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            waiter.done = True
+            self.depth[priority] -= 1
+            EMBEDDING_ADMISSION_QUEUE.set(self.depth[priority], priority=priority)
+            head = self._head()
+            if head is not None:
+                head.wakeup.set()
@@ -0,0 +1,357 @@
+import hashlib
+import json
+import logging
+import re
+import time
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, BinaryIO, List, Optional, Union
+from uuid import UUID
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import SessionLocal, asyncpg_dsn
+from app.schemas import DocumentCreate
+from app.services.admission import AdmissionRejected
+from app.services.chunking import iter_chunks
+from app.services.embedding_cache import embed_with_cache
+from app.services.embedding_providers import estimate_tokens
+from app.services.embeddings import EmbeddingSpaceChanged, mean_vector
+from app.services.extraction import get_extractor
+from app.services.ingestion import IngestionServices, build_metadata
+from app.services.reembedding import FLIPPED_SPACE_SQL
+from app.services.uploads import UploadTooLarge, spool_fileobj
+
+if TYPE_CHECKING:
+    import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Held by a load that drops the ANN indexes, so two never drop and rebuild at once
+DEFER_INDEXES_LOCK = 7_241_083_512
+
+# Lines are read off the event loop this many bytes at a time
+NDJSON_READ_BYTES = 1024 * 1024
+
+DOCUMENT_COLUMNS = ["id", "filename", "metadata", "content", "embedding", "sha256", "user_id"]
+CHUNK_COLUMNS = ["id", "document_id", "user_id", "chunk_index", "content", "embedding"]
+
+
+@dataclass
+class BulkItem:
+    ref: str  # line number or archive member, for error reporting
+    filename: str
+    text: str
+    size: int
+    sha256: str
+    content_type: Optional[str] = None
+    doc_metadata: Optional[dict] = None
+    embedding: Optional[List[float]] = None
+
+
+@dataclass
+class BulkError:
+    ref: str
+    error: str
+
+
+@dataclass
+class BulkResult:
+    documents: int = 0
+    chunks: int = 0
+    embedding_tokens: int = 0
+    errors: List[BulkError] = field(default_factory=list)
+    duplicates: int = 0
+    elapsed_ms: float = 0.0
+
+
+async def iter_ndjson_items(fileobj: BinaryIO) -> AsyncIterator[Union[BulkItem, BulkError]]:
+    """One DocumentCreate object per line; `embedding` may be omitted."""
+    line_number = 0
+    while lines := await run_in_threadpool(fileobj.readlines, NDJSON_READ_BYTES):
+        for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                record = DocumentCreate.model_validate_json(line)
+            except ValidationError as e:
+                yield BulkError(ref=f"line {line_number}", error=str(e))
+                continue
+            if record.embedding is not None and len(record.embedding) != settings.EMBEDDING_DIM:
+                yield BulkError(ref=f"line {line_number}", error=f"Embedding must have {settings.EMBEDDING_DIM} dimensions.")
+                continue
+            content = record.content.encode("utf-8")
+            yield BulkItem(
+                ref=f"line {line_number}",
+                filename=record.filename,
+                text=record.content,
+                size=len(content),
+                sha256=hashlib.sha256(content).hexdigest(),
+                content_type="text/plain",
+                doc_metadata=record.doc_metadata,
+                embedding=record.embedding,
+            )
+
+
+async def iter_zip_items(fileobj: BinaryIO, services: IngestionServices) -> AsyncIterator[Union[BulkItem, BulkError]]:
+    """Every supported file in the archive, extracted through the process pool."""
+    # Reading the central directory and members is blocking file I/O
+    with await run_in_threadpool(zipfile.ZipFile, fileobj) as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            extractor = get_extractor(None, member.filename)
+            if extractor is None:
+                yield BulkError(ref=member.filename, error="Unsupported file type")
+                continue
+            # file_size is only what the archive claims; the spooler enforces the cap as it reads
+            if member.file_size > settings.MAX_UPLOAD_BYTES:
+                yield BulkError(ref=member.filename, error=f"File exceeds the {settings.MAX_UPLOAD_BYTES} byte limit.")
+                continue
+            try:
+                with await run_in_threadpool(archive.open, member) as f:
+                    upload = await spool_fileobj(f, settings.MAX_UPLOAD_BYTES)
+            except UploadTooLarge as e:
+                yield BulkError(ref=member.filename, error=str(e))
+                continue
+            try:
+                text = "\n".join([page async for page in services.extraction_pool.iter_pages(extractor, upload.path)])
+            except Exception:
+                yield BulkError(ref=member.filename, error=extractor.error_message)
+                continue
+            finally:
+                upload.close()
+            if not text.strip():
+                yield BulkError(ref=member.filename, error="No extractable text found in file.")
+                continue
+            yield BulkItem(
+                ref=member.filename, filename=member.filename, text=text, size=upload.size, sha256=upload.sha256
+            )
+
+
+class BulkLoader:
+    """
+    Loads documents and chunks with binary COPY on a dedicated connection.
+
+    Items are embedded and written `batch_size` documents at a time, one
+    transaction per batch. With `defer_indexes` the ANN indexes on
+    `documents` and `document_chunks` are dropped for the duration of the
+    load and rebuilt once at the end, which is far cheaper than updating
+    an HNSW graph row by row; every tenant's searches fall back to exact
+    scans meanwhile, so only the CLI offers it.
+
+    Unless DEDUP_POLICY is "off", exact duplicates (by sha256) of the user's
+    documents or of earlier items in the load are skipped and counted; near
+    duplicates are left to the upload path.
+
+    Embedding calls are admitted at `priority`. A "background" load (the
+    CLI) waits for rate limit budget as long as it takes; otherwise
+    AdmissionRejected stops the load, with the batches before it committed
+    and counted in `result`.
+    """
+
+    def __init__(
+        self,
+        services: IngestionServices,
+        user_id: UUID,
+        batch_size: int = 1000,
+        defer_indexes: bool = False,
+        priority: str = "bulk",
+    ):
+        self.services = services
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.defer_indexes = defer_indexes
+        self.priority = priority
+        self.result = BulkResult()
+        self._seen_sha256 = set()
+
+    async def run(self, items: AsyncIterator[Union[BulkItem, BulkError]]) -> BulkResult:
+        # Only bulk loads need a raw asyncpg connection; keep it off the import path
+        import asyncpg
+        from pgvector.asyncpg import register_vector
+
+        result = self.result = BulkResult()
+        started = time.perf_counter()
+        conn = await asyncpg.connect(
+            asyncpg_dsn(settings.DATABASE_URL),
+            statement_cache_size=0 if settings.DB_PGBOUNCER else 100,
+        )
+        index_definitions = []
+        try:
+            # Binary codec for vector columns; this connection never goes back to a pool.
+            await register_vector(conn)
+            if not await conn.fetchval("SELECT 1 FROM users WHERE id = $1", self.user_id):
+                raise ValueError(f"User {self.user_id} not found")
+            if self.defer_indexes:
+                if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", DEFER_INDEXES_LOCK):
+                    raise ValueError("Another bulk load is deferring the ANN indexes; retry once it finishes.")
+                index_definitions = await self._drop_ann_indexes(conn)
+
+            batch: List[BulkItem] = []
+            async for item in items:
+                if isinstance(item, BulkError):
+                    result.errors.append(item)
+                    continue
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    await self._flush(conn, batch, result)
+                    batch = []
+            if batch:
+                await self._flush(conn, batch, result)
+        finally:
+            if index_definitions:
+                await self._rebuild_indexes(conn, index_definitions)
+            await conn.close()
+        result.elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    async def _drop_duplicates(self, conn: "asyncpg.Connection", batch: List[BulkItem], result: BulkResult) -> List[BulkItem]:
+        existing = {
+            row["sha256"]
+            for row in await conn.fetch(
+                "SELECT sha256 FROM documents WHERE user_id = $1 AND sha256 = ANY($2::text[])",
+                self.user_id,
+                list({item.sha256 for item in batch}),
+            )
+        }
+        kept = []
+        for item in batch:
+            if item.sha256 in existing or item.sha256 in self._seen_sha256:
+                result.duplicates += 1
+                continue
+            self._seen_sha256.add(item.sha256)
+            kept.append(item)
+        return kept
+
+    async def _flush(self, conn: "asyncpg.Connection", batch: List[BulkItem], result: BulkResult) -> None:
+        if settings.DEDUP_POLICY != "off":
+            batch = await self._drop_duplicates(conn, batch, result)
+            if not batch:
+                return
+        chunked = [list(iter_chunks(item.text)) for item in batch]
+
+        # A precomputed embedding is used as-is for single-chunk documents;
+        # everything else is embedded through the shared service and cache.
+        needs_embedding = [not (item.embedding is not None and len(chunks) == 1) for item, chunks in zip(batch, chunked)]
+        pending = [
+            chunk.content
+            for chunks, needed in zip(chunked, needs_embedding)
+            if needed
+            for chunk in chunks
+        ]
+        space = self.services.embedding_service.space
+        try:
+            async with SessionLocal() as db:
+                embedded = await embed_with_cache(
+                    db,
+                    self.services.embedding_service,
+                    self.services.embedding_cache,
+                    pending,
+                    user_id=self.user_id,
+                    priority=self.priority,
+                )
+                await db.commit()
+        except AdmissionRejected:
+            raise
+        except Exception as e:
+            # Never store placeholder vectors in a bulk load; report the batch instead.
+            result.errors.extend(BulkError(ref=item.ref, error=f"Embedding failed: {e}") for item in batch)
+            return
+        vectors = iter(embedded.vectors)
+        cached = iter(embedded.cached)
+        # Usage is reported for the whole batch; split it by estimated tokens
+        estimated = [
+            sum(estimate_tokens(chunk.content) for chunk in chunks) if needed else 0
+            for chunks, needed in zip(chunked, needs_embedding)
+        ]
+        total_estimated = sum(estimated) or 1
+
+        documents, chunk_rows = [], []
+        for item, chunks, item_estimate in zip(batch, chunked, estimated):
+            if not chunks:
+                result.errors.append(BulkError(ref=item.ref, error="No extractable text found in file."))
+                continue
+            if item.embedding is not None and len(chunks) == 1:
+                chunk_vectors, cache_hits = [item.embedding], 0
+            else:
+                chunk_vectors = [next(vectors) for _ in chunks]
+                cache_hits = sum(next(cached) for _ in chunks)
+            document_id = uuid.uuid4()
+            # Computed fields win over same-named keys in the caller's metadata
+            metadata = dict(item.doc_metadata or {})
+            metadata.update(build_metadata(
+                filename=item.filename,
+                content_type=item.content_type,
+                size_bytes=item.size,
+                sha256=item.sha256,
+                text=item.text,
+                n_tokens=round(embedded.tokens * item_estimate / total_estimated),
+                cache_hits=cache_hits,
+                chunk_count=len(chunks),
+                provider=self.services.embedding_service.provider,
+            ))
+            metadata["ingest_source"] = "bulk"
+            embedding = item.embedding if item.embedding is not None else mean_vector(chunk_vectors)
+            documents.append(
+                (document_id, item.filename, json.dumps(metadata), item.text, embedding, item.sha256, self.user_id)
+            )
+            chunk_rows.extend(
+                (uuid.uuid4(), document_id, self.user_id, chunk.index, chunk.content, vector)
+                for chunk, vector in zip(chunks, chunk_vectors)
+            )
+
+        try:
+            async with conn.transaction():
+                await conn.copy_records_to_table("documents", records=documents, columns=DOCUMENT_COLUMNS)
+                await conn.copy_records_to_table("document_chunks", records=chunk_rows, columns=CHUNK_COLUMNS)
+                # As verify_embedding_space: a flip that committed meanwhile voids the batch
+                flipped = await conn.fetchrow(FLIPPED_SPACE_SQL)
+                if flipped is not None and tuple(flipped) != space:
+                    raise EmbeddingSpaceChanged("The embedding model changed during the load; reload these documents.")
+        except EmbeddingSpaceChanged as e:
+            result.errors.extend(BulkError(ref=item.ref, error=str(e)) for item in batch)
+            return
+        result.documents += len(documents)
+        result.chunks += len(chunk_rows)
+        result.embedding_tokens += embedded.tokens
+
+    async def _drop_ann_indexes(self, conn: "asyncpg.Connection") -> List[str]:
+        rows = await conn.fetch(
+            """
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE schemaname = current_schema()
+              AND tablename IN ('documents', 'document_chunks')
+              AND (indexdef ILIKE '%USING hnsw%' OR indexdef ILIKE '%USING ivfflat%')
+            """
+        )
+        for row in rows:
+            await conn.execute(f'DROP INDEX IF EXISTS "{row["indexname"]}"')
+        return [row["indexdef"] for row in rows]
+
+    async def _rebuild_indexes(self, conn: "asyncpg.Connection", definitions: List[str]) -> None:
+        """
+        Rebuild with CREATE INDEX CONCURRENTLY, so writes keep flowing, and
+        replace any invalid leftover of an interrupted build. Definitions
+        that still fail are listed in the error, to be run by hand.
+        """
+        await conn.execute(f"SET maintenance_work_mem = '{settings.BULK_INDEX_MAINTENANCE_WORK_MEM}'")
+        failed = []
+        try:
+            for definition in definitions:
+                name = re.match(r"CREATE INDEX (\S+) ON ", definition).group(1)
+                try:
+                    if await conn.fetchval("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", name):
+                        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                    await conn.execute(definition.replace("CREATE INDEX ", "CREATE INDEX CONCURRENTLY IF NOT EXISTS ", 1))
+                except Exception:
+                    logger.exception("Rebuilding %s failed", name)
+                    failed.append(definition)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", DEFER_INDEXES_LOCK)
+        if failed:
+            raise RuntimeError("ANN indexes were not rebuilt; run:\n" + ";\n".join(failed) + ";")
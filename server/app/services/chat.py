@@ -0,0 +1,80 @@
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException, Request
+
+from app.core.config import Settings
+from app.models.models import Message
+from app.services.message_embeddings import RecalledMessage
+from app.services.search import SearchHit
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. Answer using the context excerpts from the "
+    "user's documents when they are relevant, and say so when they do not "
+    "contain the answer."
+)
+
+
+class ChatService:
+    """Streams chat completions from an OpenAI-compatible endpoint."""
+
+    def __init__(self, client: "AsyncOpenAI", model: str, max_tokens: Optional[int] = None):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ChatService":
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+        return cls(client, model=settings.CHAT_MODEL, max_tokens=settings.CHAT_MAX_TOKENS)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Yield the reply's content deltas as they arrive."""
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            stream=True,
+        )
+        async for event in stream:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+
+def build_prompt(
+    history: Sequence[Message],
+    hits: Sequence[SearchHit],
+    question: str,
+    recalled: Sequence[RecalledMessage] = (),
+) -> List[Dict[str, str]]:
+    """
+    System prompt with retrieved excerpts and recalled earlier turns, then
+    the history (oldest first), then the question.
+    """
+    system = SYSTEM_PROMPT
+    if hits:
+        excerpts = "\n\n".join(f"[{i}] {hit.filename}:\n{hit.content}" for i, hit in enumerate(hits, start=1))
+        system += "\n\nContext:\n" + excerpts
+    if recalled:
+        turns = "\n\n".join(
+            f"{message.role}: {message.content}" for message in sorted(recalled, key=lambda message: message.created_at)
+        )
+        system += "\n\nEarlier in this conversation:\n" + turns
+    messages = [{"role": "system", "content": system}]
+    messages.extend({"role": message.role, "content": message.content} for message in history)
+    messages.append({"role": "user", "content": question})
+    return messages
+
+
+def get_chat_service(request: Request) -> ChatService:
+    chat_service = getattr(request.app.state, "chat_service", None)
+    if chat_service is None:
+        raise HTTPException(status_code=503, detail="Chat is not configured; set OPENAI_API_KEY.")
+    return chat_service
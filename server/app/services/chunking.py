@@ -0,0 +1,80 @@
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+from app.core.config import settings
+
+
+@dataclass
+class TextChunk:
+    index: int
+    content: str
+
+
+def _windows(items: Iterable, size: int, overlap: int) -> Iterator[List]:
+    """Slide a window of `size` items with `overlap` items carried over."""
+    window, fresh = [], 0
+    for item in items:
+        window.append(item)
+        fresh += 1
+        if len(window) == size:
+            yield window
+            window = window[size - overlap:] if overlap else []
+            fresh = 0
+    # Only emit the tail if it contains items not already covered.
+    if fresh:
+        yield window
+
+
+def _iter_char_chunks(text: str, size: int, overlap: int) -> Iterator[str]:
+    step = size - overlap
+    for start in range(0, len(text), step):
+        yield text[start:start + size]
+        if start + size >= len(text):
+            break
+
+
+def _iter_token_chunks(text: str, size: int, overlap: int) -> Iterator[str]:
+    try:
+        import tiktoken
+    except ImportError:
+        tiktoken = None
+
+    if tiktoken is not None:
+        encoding = tiktoken.get_encoding("cl100k_base")
+        for window in _windows(encoding.encode(text), size, overlap):
+            yield encoding.decode(window)
+        return
+
+    # Without tiktoken, approximate tokens by whitespace-separated words and
+    # slice the original text so line breaks inside a chunk are preserved.
+    for window in _windows(re.finditer(r"\S+", text), size, overlap):
+        yield text[window[0].start():window[-1].end()]
+
+
+def iter_chunks(
+    text: str,
+    size: Optional[int] = None,
+    overlap: Optional[int] = None,
+    unit: Optional[str] = None,
+) -> Iterator[TextChunk]:
+    """Lazily split `text` into overlapping windows of characters or tokens."""
+    size = size or settings.CHUNK_SIZE
+    overlap = settings.CHUNK_OVERLAP if overlap is None else overlap
+    unit = unit or settings.CHUNK_UNIT
+    if size <= 0 or not 0 <= overlap < size:
+        raise ValueError("Chunk overlap must be non-negative and smaller than the chunk size.")
+
+    if unit == "chars":
+        pieces = _iter_char_chunks(text, size, overlap)
+    elif unit == "tokens":
+        pieces = _iter_token_chunks(text, size, overlap)
+    else:
+        raise ValueError(f"Unknown chunk unit: {unit}")
+
+    index = 0
+    for piece in pieces:
+        if not piece.strip():
+            continue
+        yield TextChunk(index=index, content=piece)
+        index += 1
@@ -0,0 +1,64 @@
+"""
+Ingest-time duplicate detection, scoped to one user.
+
+Exact duplicates share a sha256 (indexed on documents); near duplicates are
+found with a one-row ANN probe on the document embedding. Only original
+documents (duplicate_of IS NULL) are ever matched, so linked copies never
+chain.
+"""
+from dataclasses import dataclass
+from typing import Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import delete, select, text as sql_text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import Document
+
+
+@dataclass
+class DuplicateMatch:
+    document_id: UUID
+    kind: str  # "exact" or "near"
+    action: str  # the DEDUP_POLICY applied: "skip", "link" or "replace"
+    distance: Optional[float] = None
+
+
+async def find_exact_duplicate(db: AsyncSession, user_id: UUID, sha256: str) -> Optional[UUID]:
+    return (await db.execute(
+        select(Document.id)
+        .where(Document.user_id == user_id, Document.sha256 == sha256, Document.duplicate_of.is_(None))
+        .order_by(Document.created_at)
+        .limit(1)
+    )).scalar_one_or_none()
+
+
+async def find_near_duplicate(
+    db: AsyncSession,
+    user_id: UUID,
+    embedding: Sequence[float],
+    max_distance: float,
+) -> Optional[tuple]:
+    """(document_id, cosine distance) of the closest original within `max_distance`, if any."""
+    # Same knobs as a filtered chunk search: keep scanning the HNSW graph
+    # until a row of this user's turns up. Lasts until the caller commits.
+    if settings.SEARCH_ITERATIVE_SCAN != "off":
+        await db.execute(sql_text(f"SET LOCAL hnsw.iterative_scan = {settings.SEARCH_ITERATIVE_SCAN}"))
+        await db.execute(sql_text(f"SET LOCAL hnsw.max_scan_tuples = {int(settings.HNSW_MAX_SCAN_TUPLES)}"))
+    distance = Document.embedding.cosine_distance(embedding).label("distance")
+    row = (await db.execute(
+        select(Document.id, distance)
+        .where(Document.user_id == user_id, Document.duplicate_of.is_(None))
+        .order_by(distance)
+        .limit(1)
+    )).first()
+    if row is None or row.distance is None or row.distance > max_distance:
+        return None
+    return row.id, float(row.distance)
+
+
+async def replace_document(db: AsyncSession, old_id: UUID, new_id: UUID) -> None:
+    """Move links from `old_id` to `new_id`, then delete it (its chunks cascade). Flush `new_id` first."""
+    await db.execute(update(Document).where(Document.duplicate_of == old_id).values(duplicate_of=new_id))
+    await db.execute(delete(Document).where(Document.id == old_id))
@@ -0,0 +1,214 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Request
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import Settings
+from app.core.metrics import EMBEDDING_CACHE
+from app.models.models import EmbeddingCacheEntry
+from app.services.embeddings import EmbeddingResult, EmbeddingService
+
+CacheKey = Tuple[str, str, int]  # (sha256 of text, model, dimension)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedEmbeddings(EmbeddingResult):
+    cache_hits: int = 0
+    # Per text, in order: whether its vector came from the cache
+    cached: List[bool] = field(default_factory=list)
+
+
+class EmbeddingCache:
+    """
+    Two-tier, content-addressed embedding cache.
+
+    The first tier is an in-process LRU bounded by entry count and age; the
+    second is the `embedding_cache` table, shared by every worker and pruned
+    by age and row count. Keys include the model and dimension so switching
+    models never returns vectors from another space.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 30 * 86400,
+        max_rows: int = 1_000_000,
+        prune_every: int = 1000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._lru: "OrderedDict[CacheKey, Tuple[float, List[float]]]" = OrderedDict()
+        self._writes_since_prune = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "EmbeddingCache":
+        return cls(
+            max_entries=settings.EMBEDDING_CACHE_MEMORY_ENTRIES,
+            ttl_seconds=settings.EMBEDDING_CACHE_TTL_S,
+            max_rows=settings.EMBEDDING_CACHE_MAX_ROWS,
+        )
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_entries": len(self._lru),
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, key: CacheKey, vector: List[float]) -> None:
+        self._lru[key] = (time.monotonic(), vector)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def _recall(self, key: CacheKey) -> Optional[List[float]]:
+        entry = self._lru.get(key)
+        if entry is None:
+            return None
+        stored_at, vector = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._lru[key]
+            self.evictions += 1
+            return None
+        self._lru.move_to_end(key)
+        return vector
+
+    async def get_many(self, db: AsyncSession, keys: List[CacheKey]) -> Dict[CacheKey, List[float]]:
+        found = {}
+        missing = []
+        for key in set(keys):
+            vector = self._recall(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                found[key] = vector
+                self.memory_hits += 1
+
+        if missing:
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+            by_space: Dict[Tuple[str, int], List[str]] = {}
+            for digest, model, dim in missing:
+                by_space.setdefault((model, dim), []).append(digest)
+            for (model, dim), digests in by_space.items():
+                rows = (await db.execute(
+                    select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.embedding).where(
+                        EmbeddingCacheEntry.model == model,
+                        EmbeddingCacheEntry.dim == dim,
+                        EmbeddingCacheEntry.content_hash.in_(digests),
+                        EmbeddingCacheEntry.created_at >= cutoff,
+                    )
+                )).all()
+                for digest, vector in rows:
+                    key = (digest, model, dim)
+                    found[key] = list(vector)
+                    self._remember(key, found[key])
+                    self.db_hits += 1
+
+        self.misses += len(set(keys)) - len(found)
+        return found
+
+    async def put_many(self, db: AsyncSession, entries: Dict[CacheKey, List[float]]) -> None:
+        if not entries:
+            return
+        for key, vector in entries.items():
+            self._remember(key, vector)
+        await db.execute(
+            insert(EmbeddingCacheEntry)
+            .values([
+                {"content_hash": digest, "model": model, "dim": dim, "embedding": vector}
+                for (digest, model, dim), vector in entries.items()
+            ])
+            .on_conflict_do_nothing()
+        )
+        self._writes_since_prune += len(entries)
+        if self._writes_since_prune >= self.prune_every:
+            await self.prune(db)
+
+    async def prune(self, db: AsyncSession) -> int:
+        """Drop expired rows, then the oldest rows beyond `max_rows`."""
+        self._writes_since_prune = 0
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+        deleted = (await db.execute(delete(EmbeddingCacheEntry).where(EmbeddingCacheEntry.created_at < cutoff))).rowcount
+        oldest_kept = (
+            select(EmbeddingCacheEntry.created_at)
+            .order_by(EmbeddingCacheEntry.created_at.desc())
+            .offset(self.max_rows)
+            .limit(1)
+            .scalar_subquery()
+        )
+        deleted += (await db.execute(delete(EmbeddingCacheEntry).where(EmbeddingCacheEntry.created_at <= oldest_kept))).rowcount
+        self.evictions += deleted
+        return deleted
+
+
+async def embed_with_cache(
+    db: AsyncSession,
+    service: EmbeddingService,
+    cache: Optional[EmbeddingCache],
+    texts: List[str],
+    *,
+    user_id: Optional[UUID] = None,
+    priority: str = "bulk",
+) -> CachedEmbeddings:
+    """
+    Embed `texts`, only sending cache misses to the embedding service, so
+    only misses count against `user_id`'s rate limits.
+    """
+    if cache is None:
+        result = await service.embed(texts, user_id=user_id, priority=priority)
+        return CachedEmbeddings(vectors=result.vectors, tokens=result.tokens, cached=[False] * len(texts))
+
+    keys = [(content_hash(text), service.model, service.dim) for text in texts]
+    found = await cache.get_many(db, keys)
+
+    # Deduplicate misses so repeated chunks inside one document embed once.
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found:
+            missing.setdefault(key, text)
+
+    EMBEDDING_CACHE.inc(len(keys) - len(missing), result="hit")
+    EMBEDDING_CACHE.inc(len(missing), result="miss")
+
+    tokens = 0
+    if missing:
+        result = await service.embed(list(missing.values()), user_id=user_id, priority=priority)
+        fresh = dict(zip(missing.keys(), result.vectors))
+        await cache.put_many(db, fresh)
+        found.update(fresh)
+        tokens = result.tokens
+
+    cached = [key not in missing for key in keys]
+    return CachedEmbeddings(
+        vectors=[found[key] for key in keys],
+        tokens=tokens,
+        cache_hits=sum(cached),
+        cached=cached,
+    )
+
+
+def get_embedding_cache(request: Request) -> Optional[EmbeddingCache]:
+    return getattr(request.app.state, "embedding_cache", None)
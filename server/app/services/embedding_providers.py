@@ -0,0 +1,236 @@
+"""
+Embedding backends. EmbeddingService owns batching, retries and metrics;
+a provider only turns one batch of texts into vectors.
+
+Selected with EMBEDDING_PROVIDER:
+
+- "openai": any OpenAI-compatible /embeddings endpoint.
+- "hashing": a deterministic signed feature-hashing vectorizer in NumPy.
+  No model, network or cost; meant for tests and benchmarks.
+- "sentence-transformers": a local model (hub name or path), loaded lazily
+  in-process on CPU or GPU, optionally through its ONNX backend.
+"""
+import abc
+import asyncio
+import hashlib
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+from app.core.config import Settings
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+@dataclass
+class EmbeddingResult:
+    vectors: List[List[float]]
+    tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; only used to size batches.
+    return max(1, len(text) // 4)
+
+
+class EmbeddingProvider(abc.ABC):
+    name: str = ""
+    # Errors worth retrying with backoff; anything else fails the batch at once
+    retryable_errors: Tuple[Type[BaseException], ...] = ()
+
+    def __init__(self, model: str, dim: int, cost_per_1k_tokens: float = 0.0):
+        self.model = model
+        self.dim = dim
+        self.cost_per_1k_tokens = cost_per_1k_tokens
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def embed(self, texts: List[str]) -> EmbeddingResult:
+        """One vector per text, in order, and the tokens used."""
+
+
+class OpenAIProvider(EmbeddingProvider):
+    """The openai package (~0.5s to import) is only loaded when this provider is built."""
+
+    name = "openai"
+
+    def __init__(self, client: "AsyncOpenAI", model: str, dim: int, cost_per_1k_tokens: float = 0.0):
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+        super().__init__(model, dim, cost_per_1k_tokens)
+        self.client = client
+        self.retryable_errors = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "OpenAIProvider":
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            # Retries are handled per batch by EmbeddingService.
+            max_retries=0,
+        )
+        return cls(client, settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM, settings.EMBEDDING_COST_PER_1K_TOKENS)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+    async def embed(self, texts: List[str]) -> EmbeddingResult:
+        kwargs = {}
+        # Only the text-embedding-3 family can shorten its output
+        if self.model.startswith("text-embedding-3"):
+            kwargs["dimensions"] = self.dim
+        response = await self.client.embeddings.create(input=texts, model=self.model, **kwargs)
+        usage = getattr(response, "usage", None)
+        return EmbeddingResult(
+            vectors=[data.embedding for data in sorted(response.data, key=lambda d: d.index)],
+            tokens=usage.total_tokens if usage else sum(estimate_tokens(text) for text in texts),
+        )
+
+
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=65536)
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashingProvider(EmbeddingProvider):
+    """
+    Signed feature hashing of lower-cased words and word bigrams, with
+    sublinear term frequency, L2-normalised. Texts sharing vocabulary land
+    close together, so search and dedup behave sensibly in tests.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int):
+        super().__init__("hashing-v1", dim)
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "HashingProvider":
+        return cls(settings.EMBEDDING_DIM)
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def _embed_sync(self, texts: List[str]) -> np.ndarray:
+        rows, hashes = [], []
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            rows.extend([row] * len(features))
+            hashes.extend(_feature_hash(feature) for feature in features)
+        hashes = np.array(hashes, dtype=np.uint64)
+        columns = (hashes % np.uint64(self.dim)).astype(np.intp)
+        signs = np.where((hashes >> np.uint64(63)) == 1, -1.0, 1.0)
+
+        counts = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(counts, (np.array(rows, dtype=np.intp), columns), signs)
+        matrix = np.sign(counts) * np.log1p(np.abs(counts))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    async def embed(self, texts: List[str]) -> EmbeddingResult:
+        matrix = await asyncio.to_thread(self._embed_sync, texts)
+        return EmbeddingResult(vectors=matrix.tolist(), tokens=sum(estimate_tokens(text) for text in texts))
+
+
+class SentenceTransformersProvider(EmbeddingProvider):
+    """
+    A sentence-transformers model run in-process. The package is optional
+    (the local-embeddings extra) and is only imported on start.
+    """
+
+    name = "sentence-transformers"
+
+    def __init__(self, model: str, dim: int, device: Optional[str] = None, backend: str = "torch", batch_size: int = 32):
+        super().__init__(model, dim)
+        self.device = device
+        self.backend = backend
+        self.batch_size = batch_size
+        self._model = None
+        # One batch at a time: the model already uses every core
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "SentenceTransformersProvider":
+        return cls(
+            settings.EMBEDDING_MODEL,
+            settings.EMBEDDING_DIM,
+            device=settings.EMBEDDING_DEVICE,
+            backend=settings.EMBEDDING_LOCAL_BACKEND,
+            batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+        )
+
+    def _load(self):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_PROVIDER=sentence-transformers needs the optional dependency: "
+                "pip install sentence-transformers (the local-embeddings extra)"
+            ) from e
+        kwargs = {"backend": self.backend} if self.backend != "torch" else {}
+        model = SentenceTransformer(self.model, device=self.device, **kwargs)
+        dim = model.get_sentence_embedding_dimension()
+        if dim != self.dim:
+            raise RuntimeError(f"Model {self.model} produces {dim}-dimensional vectors; EMBEDDING_DIM is {self.dim}.")
+        return model
+
+    async def start(self) -> None:
+        if self._model is None:
+            self._model = await asyncio.to_thread(self._load)
+
+    async def close(self) -> None:
+        self._model = None
+
+    def _embed_sync(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            return self._model.encode(
+                texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+            )
+
+    async def embed(self, texts: List[str]) -> EmbeddingResult:
+        if self._model is None:
+            raise RuntimeError("SentenceTransformersProvider has not been started.")
+        matrix = await asyncio.to_thread(self._embed_sync, texts)
+        tokenizer = getattr(self._model, "tokenizer", None)
+        if tokenizer is not None:
+            tokens = sum(len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"])
+        else:
+            tokens = sum(estimate_tokens(text) for text in texts)
+        return EmbeddingResult(vectors=matrix.astype(np.float32).tolist(), tokens=tokens)
+
+
+PROVIDERS: Dict[str, Callable[[Settings], EmbeddingProvider]] = {
+    OpenAIProvider.name: OpenAIProvider.from_settings,
+    HashingProvider.name: HashingProvider.from_settings,
+    SentenceTransformersProvider.name: SentenceTransformersProvider.from_settings,
+}
+
+
+def register_provider(name: str, factory: Callable[[Settings], EmbeddingProvider]) -> None:
+    PROVIDERS[name] = factory
+
+
+def create_provider(settings: Settings) -> EmbeddingProvider:
+    try:
+        factory = PROVIDERS[settings.EMBEDDING_PROVIDER]
+    except KeyError:
+        raise ValueError(
+            f"Unknown EMBEDDING_PROVIDER {settings.EMBEDDING_PROVIDER!r}; expected one of {', '.join(sorted(PROVIDERS))}"
+        )
+    return factory(settings)
@@ -0,0 +1,222 @@
+import asyncio
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from fastapi import Request
+
+from app.core.config import Settings, settings
+from app.core.metrics import EMBEDDING_COST, EMBEDDING_ERRORS, EMBEDDING_LATENCY, EMBEDDING_TEXTS, EMBEDDING_TOKENS
+from app.services.admission import AdmissionController
+from app.services.embedding_providers import EmbeddingProvider, EmbeddingResult, create_provider, estimate_tokens
+
+class EmbeddingSpaceChanged(Exception):
+    """The stored vectors were re-embedded into a space this process cannot embed into (yet)."""
+
+
+@dataclass
+class _PendingText:
+    text: str
+    tokens: int
+    future: asyncio.Future = field(repr=False)
+
+
+def mean_vector(vectors: List[List[float]]) -> List[float]:
+    """Unit-length centroid of the chunk vectors, used as the document embedding."""
+    if not vectors:
+        return [0.0] * settings.EMBEDDING_DIM
+    centroid = [sum(values) / len(vectors) for values in zip(*vectors)]
+    norm = math.sqrt(sum(value * value for value in centroid))
+    return [value / norm for value in centroid] if norm else centroid
+
+
+class EmbeddingService:
+    """
+    Long-lived embedding client shared by all requests.
+
+    Texts submitted by concurrent callers are queued and coalesced into
+    micro-batches, bounded by item count, estimated tokens and a maximum
+    wait. Batches are sent to the provider with bounded concurrency and
+    retried with exponential backoff; each caller gets back only its own
+    vectors. With an `admission` controller, each call first waits for (or
+    is refused) rate limit budget.
+    """
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        max_batch_size: int = 64,
+        max_batch_tokens: int = 100_000,
+        max_wait_ms: float = 10,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        admission: Optional[AdmissionController] = None,
+        space: Optional[Tuple[str, str, int]] = None,
+    ):
+        self.provider = provider
+        self.admission = admission
+        # (EMBEDDING_PROVIDER, EMBEDDING_MODEL, EMBEDDING_DIM) the provider was
+        # built from, as recorded by re-embedding runs
+        self.space = space or (provider.name, provider.model, provider.dim)
+        # Set when a re-embedding flip moved the vectors somewhere this
+        # process cannot follow; embed() refuses with this message
+        self.blocked: Optional[str] = None
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait_ms / 1000
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queue: "asyncio.Queue[_PendingText]" = asyncio.Queue()
+        self._carry: Optional[_PendingText] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "EmbeddingService":
+        return cls(
+            create_provider(settings),
+            max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+            max_batch_tokens=settings.EMBEDDING_MAX_BATCH_TOKENS,
+            max_wait_ms=settings.EMBEDDING_MAX_WAIT_MS,
+            max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+            max_retries=settings.EMBEDDING_MAX_RETRIES,
+            retry_backoff=settings.EMBEDDING_RETRY_BACKOFF_S,
+            space=(settings.EMBEDDING_PROVIDER, settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM),
+        )
+
+    @property
+    def model(self) -> str:
+        return self.provider.model
+
+    @property
+    def dim(self) -> int:
+        return self.provider.dim
+
+    async def switch_provider(self, provider: EmbeddingProvider, space: Tuple[str, str, int]) -> None:
+        """
+        Send every batch from now on to `provider`, e.g. after a
+        re-embedding flip. The old provider is closed once the requests it
+        is serving have finished.
+        """
+        await provider.start()
+        old, self.provider = self.provider, provider
+        self.space = space
+        self.blocked = None
+        if self._in_flight:
+            await asyncio.gather(*list(self._in_flight), return_exceptions=True)
+        await old.close()
+
+    async def start(self) -> None:
+        await self.provider.start()
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def close(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        await self.provider.close()
+
+    async def embed(self, texts: List[str], *, user_id: Optional[UUID] = None, priority: str = "bulk") -> EmbeddingResult:
+        """
+        Embed `texts`, sharing upstream requests with other callers. Raises
+        AdmissionRejected when `user_id` or the provider is out of budget,
+        EmbeddingSpaceChanged while the service is blocked.
+        """
+        if self._dispatcher is None:
+            raise RuntimeError("EmbeddingService has not been started.")
+        if self.blocked is not None:
+            raise EmbeddingSpaceChanged(self.blocked)
+        loop = asyncio.get_running_loop()
+        pending = [_PendingText(text, estimate_tokens(text), loop.create_future()) for text in texts]
+        if self.admission is not None and pending:
+            await self.admission.acquire(
+                math.ceil(len(pending) / self.max_batch_size),
+                sum(item.tokens for item in pending),
+                user_id=user_id,
+                priority=priority,
+            )
+        for item in pending:
+            self._queue.put_nowait(item)
+        results = await asyncio.gather(*(item.future for item in pending))
+        return EmbeddingResult(
+            vectors=[vector for vector, _ in results],
+            tokens=sum(tokens for _, tokens in results),
+        )
+
+    async def _next_batch(self) -> List[_PendingText]:
+        loop = asyncio.get_running_loop()
+        first = self._carry or await self._queue.get()
+        self._carry = None
+        batch, tokens = [first], first.tokens
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            try:
+                item = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if tokens + item.tokens > self.max_batch_tokens:
+                self._carry = item
+                break
+            batch.append(item)
+            tokens += item.tokens
+        return batch
+
+    async def _dispatch(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            await self._semaphore.acquire()
+            task = asyncio.create_task(self._send(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[_PendingText]) -> None:
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    result = await self.provider.embed([item.text for item in batch])
+                    break
+                except self.provider.retryable_errors:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.retry_backoff * 2 ** attempt
+                    await asyncio.sleep(delay + random.uniform(0, delay))
+            if any(len(vector) != self.dim for vector in result.vectors):
+                raise ValueError(f"{self.provider.name} returned vectors that are not {self.dim}-dimensional.")
+        except Exception as e:
+            EMBEDDING_ERRORS.inc(model=self.model)
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        finally:
+            self._semaphore.release()
+            EMBEDDING_LATENCY.observe(time.perf_counter() - start, model=self.model)
+
+        # Usage is reported per request; split it across callers by their
+        # share of the estimated tokens.
+        total = result.tokens
+        estimated = sum(item.tokens for item in batch)
+        EMBEDDING_TEXTS.inc(len(batch), model=self.model)
+        EMBEDDING_TOKENS.inc(total, model=self.model)
+        EMBEDDING_COST.inc(total / 1000 * self.provider.cost_per_1k_tokens, model=self.model)
+        for item, vector in zip(batch, result.vectors):
+            if not item.future.done():
+                item.future.set_result((vector, round(total * item.tokens / estimated)))
+
+
+def get_embedding_service(request: Request) -> EmbeddingService:
+    return request.app.state.embedding_service
@@ -0,0 +1,309 @@
+import abc
+import asyncio
+import importlib
+import logging
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Set
+
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    pass
+
+
+class Extractor(abc.ABC):
+    """
+    Text extractor for one family of file types.
+
+    `count_pages` and `extract_pages` run in worker processes, so they must
+    be plain functions of picklable arguments; they get the path of the
+    spooled file rather than its bytes, so nothing large is pickled per job.
+    Extractors with `in_process = True` are cheap enough to skip the pool and
+    run in a thread instead. `modules` are the (optional) dependencies the worker processes
+    import at startup rather than on the first upload.
+    """
+
+    name: str = ""
+    content_types: tuple = ()
+    extensions: tuple = ()
+    modules: tuple = ()
+    error_message: str = "Could not extract text from file."
+    in_process: bool = False
+
+    def count_pages(self, path: str) -> int:
+        return 1
+
+    @abc.abstractmethod
+    def extract_pages(self, path: str, start: int, stop: int) -> List[str]:
+        """Text of pages `start` to `stop` (exclusive) of the file at `path`."""
+
+
+class TextExtractor(Extractor):
+    name = "text"
+    content_types = ("text/plain",)
+    extensions = (".txt",)
+    error_message = "Could not decode text file as UTF-8."
+    in_process = True
+
+    def extract_pages(self, path: str, start: int, stop: int) -> List[str]:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return [""]
+            # Decode straight from the page cache instead of reading a bytes copy first
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return [str(data, "utf-8")]
+
+
+class DocxExtractor(Extractor):
+    name = "docx"
+    content_types = ("application/vnd.openxmlformats-officedocument.wordprocessingml.document",)
+    extensions = (".docx",)
+    modules = ("docx",)
+    error_message = "Could not extract text from Word document."
+
+    def extract_pages(self, path: str, start: int, stop: int) -> List[str]:
+        from docx import Document as DocxDocument
+        docx = DocxDocument(path)
+        return ["\n".join(p.text for p in docx.paragraphs)]
+
+
+class PdfExtractor(Extractor):
+    name = "pdf"
+    content_types = ("application/pdf",)
+    extensions = (".pdf",)
+    modules = ("PyPDF2",)
+    error_message = "Could not extract text from PDF document."
+
+    def count_pages(self, path: str) -> int:
+        from PyPDF2 import PdfReader
+        return len(PdfReader(path).pages)
+
+    def extract_pages(self, path: str, start: int, stop: int) -> List[str]:
+        from PyPDF2 import PdfReader
+        reader = PdfReader(path)
+        return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+_registry: Dict[str, Extractor] = {}
+
+
+def register_extractor(extractor: Extractor) -> None:
+    for key in extractor.content_types + extractor.extensions:
+        _registry[key] = extractor
+
+
+def get_extractor(content_type: Optional[str], filename: Optional[str]) -> Optional[Extractor]:
+    if content_type in _registry:
+        return _registry[content_type]
+    extension = os.path.splitext(filename or "")[1].lower()
+    return _registry.get(extension)
+
+
+for _extractor in (TextExtractor(), DocxExtractor(), PdfExtractor()):
+    register_extractor(_extractor)
+
+
+def preload_modules() -> List[str]:
+    return sorted({module for extractor in _registry.values() for module in extractor.modules})
+
+
+def _limit_worker_memory(max_bytes: Optional[int]) -> None:
+    if not max_bytes:
+        return
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except (ImportError, ValueError, OSError):
+        # Not supported on this platform; rely on the per-job timeout.
+        pass
+
+
+# Per worker process: seconds each preloaded module took (None: not installed)
+_preload_timings: Dict[str, Optional[float]] = {}
+
+
+def _init_worker(max_bytes: Optional[int], modules: Sequence[str]) -> None:
+    _limit_worker_memory(max_bytes)
+    for module in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+            _preload_timings[module] = time.perf_counter() - start
+        except ImportError:
+            _preload_timings[module] = None
+
+
+def _get_preload_timings() -> Dict[str, Optional[float]]:
+    return dict(_preload_timings)
+
+
+class ExtractionPool:
+    """
+    Bounded process pool for CPU-heavy text extraction.
+
+    Paged formats are split into jobs of `pages_per_job` pages that run in
+    parallel; pages are yielded in order as soon as their job finishes. Each
+    job has a timeout and each worker an address-space limit, so one hostile
+    file cannot stall the event loop or exhaust the pod's memory. A timeout
+    fails only that document; other uploads' jobs run to completion.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: float = 30,
+        max_memory_mb: Optional[int] = 1024,
+        max_pages: int = 2000,
+        pages_per_job: int = 16,
+        preload: Sequence[str] = (),
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024 if max_memory_mb else None
+        self.max_pages = max_pages
+        self.pages_per_job = pages_per_job
+        self.preload = tuple(preload)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._in_flight: Dict[ProcessPoolExecutor, int] = {}
+        # Executors with a timed-out job, killed once their other jobs finish
+        self._retired: Set[ProcessPoolExecutor] = set()
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "ExtractionPool":
+        return cls(
+            max_workers=settings.EXTRACTION_MAX_WORKERS,
+            timeout=settings.EXTRACTION_TIMEOUT_S,
+            max_memory_mb=settings.EXTRACTION_MAX_MEMORY_MB,
+            max_pages=settings.EXTRACTION_MAX_PAGES,
+            pages_per_job=settings.EXTRACTION_PAGES_PER_JOB,
+            preload=preload_modules() if settings.STARTUP_PRELOAD else (),
+        )
+
+    def start(self) -> None:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.max_memory_bytes, self.preload),
+            )
+
+    async def warm_up(self) -> Dict[str, Optional[float]]:
+        """
+        Start every worker process now, so they fork and import `preload`
+        before the first upload. Returns the slowest import time per module.
+        """
+        if self._executor is None:
+            raise RuntimeError("ExtractionPool has not been started.")
+        loop = asyncio.get_running_loop()
+        # Submitted together, so the pool spawns a worker for each
+        results = await asyncio.wait_for(
+            asyncio.gather(*(loop.run_in_executor(self._executor, _get_preload_timings) for _ in range(self.max_workers))),
+            self.timeout,
+        )
+        timings: Dict[str, Optional[float]] = {}
+        for result in results:
+            for module, seconds in result.items():
+                previous = timings.get(module)
+                timings[module] = seconds if previous is None else max(previous, seconds or 0.0)
+        return timings
+
+    def close(self) -> None:
+        for executor in list(self._retired):
+            self._kill(executor)
+        self._retired.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def _kill(executor: ProcessPoolExecutor) -> None:
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _retire(self, executor: ProcessPoolExecutor) -> None:
+        # A timed-out job keeps its worker busy forever and the executor has
+        # no API to cancel running work. New jobs go to fresh workers; the old
+        # ones are killed once the other jobs they are running have finished.
+        if executor is self._executor:
+            logger.warning("Replacing the extraction workers after a timed-out or crashed job")
+            self._executor = None
+            self.start()
+            self._retired.add(executor)
+        self._reap(executor)
+
+    def _reap(self, executor: ProcessPoolExecutor) -> None:
+        if executor in self._retired and not self._in_flight.get(executor):
+            self._retired.discard(executor)
+            self._in_flight.pop(executor, None)
+            self._kill(executor)
+
+    async def _run(self, func, *args):
+        if self._executor is None:
+            raise RuntimeError("ExtractionPool has not been started.")
+        loop = asyncio.get_running_loop()
+        # Jobs queue here rather than in the executor, so the timeout only
+        # counts the time a job actually runs. A slot is freed when the
+        # worker is, not when the caller gives up.
+        await self._slots.acquire()
+        executor = self._executor
+        try:
+            future = executor.submit(func, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._retire(executor)
+            raise ExtractionError("Text extraction worker exceeded its resource limits.")
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._slots.release))
+        self._in_flight[executor] = self._in_flight.get(executor, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self._retire(executor)
+            raise ExtractionError(f"Text extraction timed out after {self.timeout:g}s.")
+        except BrokenProcessPool:
+            # A worker died, most likely by hitting the memory limit, and took
+            # the executor's other jobs with it.
+            self._retire(executor)
+            raise ExtractionError("Text extraction worker exceeded its resource limits.")
+        finally:
+            self._in_flight[executor] -= 1
+            self._reap(executor)
+
+    async def iter_pages(self, extractor: Extractor, path: str) -> AsyncIterator[str]:
+        """Yield the text of each page of the file at `path`, in order."""
+        if extractor.in_process:
+            # Still file I/O and decoding, so kept off the event loop
+            for page in await run_in_threadpool(extractor.extract_pages, path, 0, 1):
+                yield page
+            return
+
+        n_pages = await self._run(extractor.count_pages, path)
+        if n_pages > self.max_pages:
+            raise ExtractionError(f"Document has {n_pages} pages; the limit is {self.max_pages}.")
+
+        jobs = [
+            asyncio.ensure_future(self._run(extractor.extract_pages, path, start, min(start + self.pages_per_job, n_pages)))
+            for start in range(0, n_pages, self.pages_per_job)
+        ]
+        try:
+            for job in jobs:
+                for page in await job:
+                    yield page
+        finally:
+            for job in jobs:
+                job.cancel()
+
+
+def get_extraction_pool(request: Request) -> ExtractionPool:
+    return request.app.state.extraction_pool
@@ -0,0 +1,307 @@
+import datetime
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional
+from uuid import UUID
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
+
+from app.core.config import settings
+from app.core.metrics import STAGE_LATENCY
+from app.models.models import Document, DocumentChunk, generate_uuid
+from app.services.admission import AdmissionRejected
+from app.services.chunking import iter_chunks
+from app.services.dedup import DuplicateMatch, find_exact_duplicate, find_near_duplicate, replace_document
+from app.services.embedding_cache import EmbeddingCache, embed_with_cache
+from app.services.embedding_providers import EmbeddingProvider
+from app.services.embeddings import EmbeddingService, EmbeddingSpaceChanged, mean_vector
+from app.services.extraction import ExtractionError, ExtractionPool, get_extractor
+from app.services.reembedding import verify_embedding_space
+from app.services.uploads import SpooledFile, UploadTooLarge
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("read", "dedup", "extract", "embed", "insert")
+
+
+class IngestionError(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass
+class IngestionServices:
+    embedding_service: EmbeddingService
+    embedding_cache: Optional[EmbeddingCache]
+    extraction_pool: ExtractionPool
+    # Admission priority of the embedding calls; workers use "background"
+    priority: str = "bulk"
+
+
+class StageTimer:
+    """
+    Records wall-clock milliseconds per pipeline stage. With a `pipeline`
+    name, each stage is also observed in the stage latency histogram.
+    """
+
+    def __init__(
+        self,
+        on_stage: Optional[Callable[[str, Dict[str, float]], Awaitable[None]]] = None,
+        pipeline: Optional[str] = None,
+    ):
+        self.on_stage = on_stage
+        self.pipeline = pipeline
+        self.timings: Dict[str, float] = {}
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        if self.on_stage is not None:
+            await self.on_stage(name, self.timings)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = round(elapsed * 1000, 3)
+            if self.pipeline is not None:
+                STAGE_LATENCY.observe(elapsed, pipeline=self.pipeline, stage=name)
+
+
+def build_metadata(
+    *,
+    filename: str,
+    content_type: Optional[str],
+    size_bytes: int,
+    sha256: str,
+    text: str,
+    n_tokens: int,
+    cache_hits: int,
+    chunk_count: int,
+    provider: EmbeddingProvider,
+) -> dict:
+    """Metadata recorded on every Document, whichever path ingested it."""
+    current_time = datetime.datetime.now(datetime.timezone.utc)
+    return {
+        "filename": filename,
+        "content_type": content_type,
+        "size_bytes": size_bytes,
+        "word_count": len(text.split()),
+        "line_count": text.count("\n") + 1,
+        "sha256": sha256,
+        "upload_time": current_time.isoformat(),
+        "upload_time_epoch": int(current_time.timestamp()),
+        "embedding_provider": provider.name,
+        "embedding_model": provider.model,
+        "embedding_cost_usd": n_tokens / 1000 * provider.cost_per_1k_tokens,
+        "embedding_dim": provider.dim,
+        "embedding_tokens": n_tokens,
+        "embedding_cache_hits": cache_hits,
+        "chunk_count": chunk_count,
+        "chunk_unit": settings.CHUNK_UNIT,
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+    }
+
+
+async def _duplicate_result(
+    db: AsyncSession,
+    match: DuplicateMatch,
+    *,
+    filename: str,
+    content_type: Optional[str],
+    user_id: UUID,
+    metadata: Optional[dict] = None,
+) -> Document:
+    """Apply the skip or link policy: return the original, or a chunkless row pointing at it."""
+    if match.action == "skip":
+        doc = await db.get(Document, match.document_id, options=[undefer(Document.content)])
+        await db.commit()
+    else:
+        if metadata is None:
+            # Exact copy: nothing was extracted, so start from the original's metadata
+            original = await db.get(Document, match.document_id)
+            metadata = dict(original.doc_metadata or {})
+            current_time = datetime.datetime.now(datetime.timezone.utc)
+            metadata.update(
+                filename=filename,
+                content_type=content_type,
+                upload_time=current_time.isoformat(),
+                upload_time_epoch=int(current_time.timestamp()),
+            )
+        metadata.update(duplicate_of=str(match.document_id), duplicate_kind=match.kind, duplicate_distance=match.distance)
+        # Content and vectors stay with the original, so copies never show up in search
+        doc = Document(
+            id=generate_uuid(),
+            filename=filename,
+            doc_metadata=metadata,
+            content=None,
+            embedding=None,
+            sha256=metadata.get("sha256"),
+            duplicate_of=match.document_id,
+            user_id=user_id,
+        )
+        db.add(doc)
+        await db.commit()
+        await db.refresh(doc, ["created_at"])
+    doc.dedup = match
+    return doc
+
+
+async def ingest_document(
+    db: AsyncSession,
+    services: IngestionServices,
+    *,
+    filename: str,
+    content_type: Optional[str],
+    user_id: UUID,
+    read: Callable[[], Awaitable[SpooledFile]],
+    timer: Optional[StageTimer] = None,
+) -> Document:
+    """
+    Run read -> extract -> embed -> insert for one file and return the new
+    Document. `read` spools the file to disk; it is deleted once extracted.
+
+    Duplicates of one of the user's documents are handled per DEDUP_POLICY:
+    exact copies are caught by sha256 right after the read, before any
+    extraction or embedding is paid for; near copies (DEDUP_NEAR_POLICY) by
+    the distance of the new document embedding. The returned Document then
+    carries a `dedup` DuplicateMatch.
+    """
+    timer = timer or StageTimer(pipeline="ingestion")
+    policy = settings.DEDUP_POLICY
+
+    extractor = get_extractor(content_type, filename)
+    if extractor is None:
+        raise IngestionError(400, f"Unsupported file type: {content_type}")
+
+    async with timer.stage("read"):
+        try:
+            upload = await read()
+        except UploadTooLarge as e:
+            raise IngestionError(413, str(e))
+
+    # The spooled file is deleted once extracted, or when dedup ends the upload or fails
+    try:
+        match = None
+        if policy != "off":
+            async with timer.stage("dedup"):
+                existing = await find_exact_duplicate(db, user_id, upload.sha256)
+            if existing is not None:
+                match = DuplicateMatch(document_id=existing, kind="exact", action=policy)
+                if policy != "replace":
+                    return await _duplicate_result(
+                        db, match, filename=filename, content_type=content_type, user_id=user_id
+                    )
+
+        # Parsing runs in the extraction process pool, off the event loop
+        async with timer.stage("extract"):
+            try:
+                text = "\n".join([page async for page in services.extraction_pool.iter_pages(extractor, upload.path)])
+            except ExtractionError as e:
+                raise IngestionError(400, str(e))
+            except Exception:
+                raise IngestionError(400, extractor.error_message)
+    finally:
+        upload.close()
+
+    if not text or not text.strip():
+        raise IngestionError(400, "No extractable text found in file.")
+
+    async with timer.stage("embed"):
+        # Split into bounded chunks; the shared embedding service batches them
+        # (together with other requests' chunks) under the model's token limit.
+        text_chunks = list(iter_chunks(text))
+        space = services.embedding_service.space
+        # Chunks already embedded with this model (e.g. a re-upload of the same
+        # file) come from the cache and cost nothing. A failed embedding fails
+        # the upload; placeholder vectors would silently never match a search.
+        try:
+            result = await embed_with_cache(
+                db,
+                services.embedding_service,
+                services.embedding_cache,
+                [chunk.content for chunk in text_chunks],
+                user_id=user_id,
+                priority=services.priority,
+            )
+        except AdmissionRejected as e:
+            raise IngestionError(429, str(e), retry_after=e.retry_after)
+        except EmbeddingSpaceChanged as e:
+            raise IngestionError(503, str(e))
+        except Exception:
+            logger.exception("Could not embed document %s", filename)
+            raise IngestionError(502, "Could not embed document.")
+        vectors = result.vectors
+        n_tokens = result.tokens
+        cache_hits = result.cache_hits
+        chunks = [
+            DocumentChunk(user_id=user_id, chunk_index=chunk.index, content=chunk.content, embedding=vector)
+            for chunk, vector in zip(text_chunks, vectors)
+        ]
+        embedding = mean_vector(vectors)
+
+    metadata = build_metadata(
+        filename=filename,
+        content_type=content_type,
+        size_bytes=upload.size,
+        sha256=upload.sha256,
+        text=text,
+        n_tokens=n_tokens,
+        cache_hits=cache_hits,
+        chunk_count=len(chunks),
+        provider=services.embedding_service.provider,
+    )
+
+    if match is None and policy != "off" and settings.DEDUP_NEAR_MAX_DISTANCE > 0:
+        async with timer.stage("dedup"):
+            near = await find_near_duplicate(db, user_id, embedding, settings.DEDUP_NEAR_MAX_DISTANCE)
+        if near is not None:
+            match = DuplicateMatch(
+                document_id=near[0], kind="near", action=settings.DEDUP_NEAR_POLICY, distance=near[1]
+            )
+            if match.action != "replace":
+                return await _duplicate_result(
+                    db, match, filename=filename, content_type=content_type, user_id=user_id, metadata=metadata
+                )
+
+    async with timer.stage("insert"):
+        db_doc = Document(
+            id=generate_uuid(),
+            filename=filename,
+            doc_metadata=metadata,
+            content=text,
+            embedding=embedding,
+            sha256=upload.sha256,
+            user_id=user_id,
+            chunks=chunks
+        )
+        db.add(db_doc)
+        await db.flush()
+        if match is not None:
+            await replace_document(db, match.document_id, db_doc.id)
+        try:
+            await verify_embedding_space(db, space)
+        except EmbeddingSpaceChanged as e:
+            await db.rollback()
+            raise IngestionError(503, str(e), retry_after=settings.EMBEDDING_SPACE_POLL_S)
+        await db.commit()
+        # Only the server default; a full refresh would drop the deferred
+        # content and embedding the response still needs.
+        await db.refresh(db_doc, ["created_at"])
+    db_doc.dedup = match
+    return db_doc
+
+
+def get_ingestion_services(request: Request) -> IngestionServices:
+    return IngestionServices(
+        embedding_service=request.app.state.embedding_service,
+        embedding_cache=getattr(request.app.state, "embedding_cache", None),
+        extraction_pool=request.app.state.extraction_pool,
+    )
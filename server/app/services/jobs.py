@@ -0,0 +1,227 @@
+import asyncio
+import datetime
+import logging
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import Request
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import Settings
+from app.core.database import SessionLocal
+from app.models.models import IngestionJob
+from app.services.ingestion import IngestionError, IngestionServices, StageTimer, ingest_document
+from app.services.uploads import SpooledFile, spool_bytes
+
+logger = logging.getLogger(__name__)
+
+
+async def enqueue_ingestion(
+    db: AsyncSession,
+    *,
+    filename: str,
+    content_type: Optional[str],
+    user_id: UUID,
+    payload: bytes,
+) -> IngestionJob:
+    job = IngestionJob(
+        filename=filename,
+        content_type=content_type,
+        user_id=user_id,
+        payload=payload,
+        status="queued",
+        stage_timings={},
+        attempts=0,
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+class IngestionWorkerPool:
+    """
+    In-process asyncio workers draining the `ingestion_jobs` table.
+
+    Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+    of API pods or standalone `worker.py` processes can share the queue.
+    A running job's heartbeat is bumped at every stage and every
+    `stale_after / 3` seconds; jobs left `running` by a crashed worker are
+    reclaimed once it is `stale_after` seconds old, up to `max_attempts`
+    times.
+    """
+
+    def __init__(
+        self,
+        services: IngestionServices,
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+        stale_after: float = 600,
+        max_attempts: int = 3,
+        session_factory: async_sessionmaker = SessionLocal,
+    ):
+        self.services = services
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.session_factory = session_factory
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    @classmethod
+    def from_settings(cls, settings: Settings, services: IngestionServices) -> "IngestionWorkerPool":
+        return cls(
+            services,
+            concurrency=settings.INGESTION_WORKERS,
+            poll_interval=settings.INGESTION_POLL_INTERVAL_S,
+            stale_after=settings.INGESTION_JOB_STALE_AFTER_S,
+            max_attempts=settings.INGESTION_MAX_ATTEMPTS,
+        )
+
+    def start(self) -> None:
+        for _ in range(self.concurrency - len(self._tasks)):
+            self._tasks.append(asyncio.create_task(self._run()))
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake idle workers; called right after a local enqueue."""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                job_id = await self._claim()
+            except Exception:
+                logger.exception("Ingestion queue error")
+                job_id = None
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            try:
+                await self._process(job_id)
+            except Exception:
+                # The job stays running and is reclaimed once its heartbeat is stale
+                logger.exception("Ingestion job %s error", job_id)
+
+    async def _update(self, job_id: UUID, **values) -> None:
+        async with self.session_factory() as db:
+            await db.execute(update(IngestionJob).where(IngestionJob.id == job_id).values(**values))
+            await db.commit()
+
+    async def _claim(self) -> Optional[UUID]:
+        async with self.session_factory() as db:
+            # Jobs out of attempts are failed on the way to the next claimable one
+            while True:
+                now = datetime.datetime.now(datetime.timezone.utc)
+                stale = now - datetime.timedelta(seconds=self.stale_after)
+                row = (await db.execute(
+                    select(IngestionJob.id, IngestionJob.attempts)
+                    .where(or_(
+                        IngestionJob.status == "queued",
+                        and_(
+                            IngestionJob.status == "running",
+                            func.coalesce(IngestionJob.heartbeat_at, IngestionJob.started_at) < stale,
+                        ),
+                    ))
+                    .order_by(IngestionJob.created_at)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )).first()
+                if row is None:
+                    return None
+                if row.attempts < self.max_attempts:
+                    await db.execute(
+                        update(IngestionJob)
+                        .where(IngestionJob.id == row.id)
+                        .values(status="running", stage=None, started_at=now, heartbeat_at=now, attempts=row.attempts + 1)
+                    )
+                    await db.commit()
+                    return row.id
+                await db.execute(
+                    update(IngestionJob)
+                    .where(IngestionJob.id == row.id)
+                    .values(status="failed", error="Exceeded maximum attempts.", finished_at=now, payload=None)
+                )
+                await db.commit()
+
+    async def _heartbeat(self, job_id: UUID) -> None:
+        while True:
+            await asyncio.sleep(self.stale_after / 3)
+            try:
+                await self._update(job_id, heartbeat_at=datetime.datetime.now(datetime.timezone.utc))
+            except Exception:
+                logger.exception("Ingestion heartbeat error for job %s", job_id)
+
+    async def _process(self, job_id: UUID) -> None:
+        async def on_stage(stage, timings):
+            await self._update(
+                job_id,
+                stage=stage,
+                stage_timings=dict(timings),
+                heartbeat_at=datetime.datetime.now(datetime.timezone.utc),
+            )
+
+        timer = StageTimer(on_stage=on_stage, pipeline="ingestion")
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            values = await self._ingest(job_id, timer)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+        await self._update(
+            job_id,
+            stage=None,
+            stage_timings=timer.timings,
+            finished_at=datetime.datetime.now(datetime.timezone.utc),
+            payload=None,
+            **values,
+        )
+
+    async def _ingest(self, job_id: UUID, timer: StageTimer) -> dict:
+        """Run the job's ingestion; returns its final status and error or document."""
+        values = {"status": "failed"}
+        async with self.session_factory() as db:
+            job = (await db.execute(
+                select(IngestionJob.filename, IngestionJob.content_type, IngestionJob.user_id)
+                .where(IngestionJob.id == job_id)
+            )).one()
+
+            async def read() -> SpooledFile:
+                payload = (await db.execute(
+                    select(IngestionJob.payload).where(IngestionJob.id == job_id)
+                )).scalar_one()
+                return await spool_bytes(payload)
+
+            try:
+                doc = await ingest_document(
+                    db,
+                    self.services,
+                    filename=job.filename,
+                    content_type=job.content_type,
+                    user_id=job.user_id,
+                    read=read,
+                    timer=timer,
+                )
+                values = {"status": "succeeded", "document_id": doc.id, "error": None}
+            except IngestionError as e:
+                values["error"] = e.detail
+            except Exception as e:
+                await db.rollback()
+                values["error"] = f"{type(e).__name__}: {e}"
+        return values
+
+
+def get_ingestion_workers(request: Request) -> Optional[IngestionWorkerPool]:
+    return getattr(request.app.state, "ingestion_workers", None)
@@ -0,0 +1,303 @@
+"""
+Chat message embeddings, for recalling relevant earlier turns.
+
+Messages are stored without a vector; MessageEmbedder fills them in after
+commit, in batches, from a background task. Rows are leased with
+FOR UPDATE SKIP LOCKED, so several processes can share the backlog, and a
+message the provider keeps rejecting is given up on after a few attempts
+instead of holding up the ones behind it.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from fastapi import Request
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import bindparam, func, literal_column, or_, select, text as sql_text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import Settings, settings
+from app.core.database import SessionLocal
+from app.core.metrics import EMBEDDING_CACHE
+from app.models.models import Message
+from app.services.chunking import iter_chunks
+from app.services.embedding_cache import CacheKey, EmbeddingCache, content_hash
+from app.services.embeddings import EmbeddingService, EmbeddingSpaceChanged, mean_vector
+from app.services.reembedding import verify_embedding_space
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RecalledMessage:
+    id: UUID
+    chat_id: UUID
+    role: str
+    content: str
+    created_at: datetime
+    distance: float
+
+
+def _chunk_texts(content: str) -> List[str]:
+    return [chunk.content for chunk in iter_chunks(content)] or [content]
+
+
+class MessageEmbedder:
+    def __init__(
+        self,
+        service: EmbeddingService,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 64,
+        poll_interval: float = 2.0,
+        max_attempts: int = 3,
+        lease: float = 300.0,
+        session_factory: async_sessionmaker = SessionLocal,
+    ):
+        self.service = service
+        self.cache = cache
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.session_factory = session_factory
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings, service: EmbeddingService, cache: Optional[EmbeddingCache] = None) -> "MessageEmbedder":
+        return cls(
+            service,
+            cache,
+            batch_size=settings.MESSAGE_EMBED_BATCH_SIZE,
+            poll_interval=settings.MESSAGE_EMBED_POLL_INTERVAL_S,
+            max_attempts=settings.MESSAGE_EMBED_MAX_ATTEMPTS,
+            lease=settings.MESSAGE_EMBED_LEASE_S,
+        )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self) -> None:
+        """Wake the embedder; called right after messages are committed."""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                embedded = await self.embed_batch()
+            except Exception:
+                # Provider or database trouble: the rows stay NULL and are retried
+                logger.exception("Message embedding error")
+                embedded = 0
+            if embedded >= self.batch_size:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def embed_batch(self) -> int:
+        """
+        Embed up to `batch_size` of the oldest unembedded messages; returns
+        how many were claimed. Rows are claimed in a short transaction and
+        embedded outside it, so no locks or connection are held while
+        waiting for the provider. Long messages are chunked like documents
+        and embedded as the mean of their chunks.
+        """
+        rows, found = await self._claim()
+        if not rows:
+            return 0
+        space = self.service.space
+        chunks = {row.id: _chunk_texts(row.content) for row in rows}
+        keys = {
+            message_id: [(content_hash(text), self.service.model, self.service.dim) for text in texts]
+            for message_id, texts in chunks.items()
+        }
+        try:
+            fresh, failed = await self._embed_missing(rows, chunks, keys, found)
+        except Exception:
+            await self._release([row.id for row in rows])
+            raise
+        found.update(fresh)
+
+        table = Message.__table__
+        async with self.session_factory() as db:
+            if self.cache is not None:
+                await self.cache.put_many(db, fresh)
+            embedded = [row for row in rows if row.id not in failed]
+            if embedded:
+                await db.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("message_id"))
+                    .values(embedding=bindparam("vector", type_=Vector(self.service.dim)), embedding_claimed_at=None),
+                    [
+                        {"message_id": row.id, "vector": mean_vector([found[key] for key in keys[row.id]])}
+                        for row in embedded
+                    ],
+                )
+            if failed:
+                # Still claimed, so the next attempt waits out the lease
+                await db.execute(
+                    update(table)
+                    .where(table.c.id.in_(list(failed)))
+                    .values(embedding_attempts=table.c.embedding_attempts + 1)
+                )
+            await verify_embedding_space(db, space)
+            await db.commit()
+        for row in rows:
+            if row.id in failed and row.embedding_attempts + 1 >= self.max_attempts:
+                logger.error("Giving up embedding message %s after %d attempts: %s", row.id, self.max_attempts, failed[row.id])
+        return len(rows)
+
+    async def _claim(self):
+        """Lease the next batch, and look up its chunks in the cache."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.lease)
+        async with self.session_factory() as db:
+            rows = (await db.execute(
+                select(Message.id, Message.content, Message.embedding_attempts)
+                # A literal '' so the planner can match the partial ix_messages_unembedded
+                .where(
+                    Message.embedding.is_(None),
+                    Message.content != literal_column("''"),
+                    Message.embedding_attempts < self.max_attempts,
+                    or_(Message.embedding_claimed_at.is_(None), Message.embedding_claimed_at < cutoff),
+                )
+                .order_by(Message.created_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not rows:
+                return [], {}
+            await db.execute(
+                update(Message.__table__)
+                .where(Message.__table__.c.id.in_([row.id for row in rows]))
+                .values(embedding_claimed_at=func.now())
+            )
+            found = {}
+            if self.cache is not None:
+                found = await self.cache.get_many(db, [
+                    (content_hash(text), self.service.model, self.service.dim)
+                    for row in rows
+                    for text in _chunk_texts(row.content)
+                ])
+            await db.commit()
+        return rows, found
+
+    async def _embed_missing(self, rows, chunks, keys, found) -> Tuple[Dict[CacheKey, List[float]], Dict[UUID, Exception]]:
+        """
+        Embed the chunks not in `found`, all in one call. If the provider
+        rejects that, each message is retried on its own so only the ones it
+        rejects again fail. Retryable provider errors (after the service's
+        own retries) and EmbeddingSpaceChanged are raised: nothing is wrong
+        with the messages.
+        """
+        def missing_for(batch) -> Dict[CacheKey, str]:
+            missing = {}
+            for row in batch:
+                for key, text in zip(keys[row.id], chunks[row.id]):
+                    if key not in found:
+                        missing.setdefault(key, text)
+            return missing
+
+        async def embed(missing: Dict[CacheKey, str]) -> Dict[CacheKey, List[float]]:
+            if not missing:
+                return {}
+            result = await self.service.embed(list(missing.values()), priority="background")
+            return dict(zip(missing.keys(), result.vectors))
+
+        missing = missing_for(rows)
+        EMBEDDING_CACHE.inc(sum(len(keys[row.id]) for row in rows) - len(missing), result="hit")
+        EMBEDDING_CACHE.inc(len(missing), result="miss")
+        transient = (EmbeddingSpaceChanged, *self.service.provider.retryable_errors)
+        try:
+            return await embed(missing), {}
+        except transient:
+            raise
+        except Exception as e:
+            if len(rows) == 1:
+                return {}, {rows[0].id: e}
+        fresh, failed = {}, {}
+        for row in rows:
+            try:
+                fresh.update(await embed({key: text for key, text in missing_for([row]).items() if key not in fresh}))
+            except transient:
+                raise
+            except Exception as e:
+                failed[row.id] = e
+        return fresh, failed
+
+    async def _release(self, message_ids: List[UUID]) -> None:
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Message.__table__).where(Message.__table__.c.id.in_(message_ids)).values(embedding_claimed_at=None)
+            )
+            await db.commit()
+
+
+async def count_chat_embeddings(db: AsyncSession, chat_id: UUID, cap: int) -> int:
+    """Embedded messages in `chat_id`, counted no further than cap + 1."""
+    bounded = (
+        select(literal_column("1"))
+        .where(Message.chat_id == chat_id, Message.embedding.is_not(None))
+        .limit(cap + 1)
+        .subquery()
+    )
+    return (await db.execute(select(func.count()).select_from(bounded))).scalar_one()
+
+
+async def recall_messages(
+    db: AsyncSession,
+    chat_id: UUID,
+    query_vector: Sequence[float],
+    *,
+    limit: int = 5,
+    before: Optional[datetime] = None,
+    exclude: Sequence[UUID] = (),
+) -> List[RecalledMessage]:
+    """
+    Messages of `chat_id` closest to `query_vector`, optionally only those
+    created before `before`. The caller ends the transaction.
+
+    Like vector_search: chats with at most SEARCH_EXACT_MAX_CHUNKS embedded
+    messages are scanned exactly through the chat_id index, longer ones go
+    through the HNSW index with an iterative scan.
+    """
+    filters = [Message.chat_id == chat_id, Message.embedding.is_not(None)]
+    if before is not None:
+        filters.append(Message.created_at < before)
+    if exclude:
+        filters.append(Message.id.not_in(list(exclude)))
+    columns = (Message.id, Message.chat_id, Message.role, Message.content, Message.created_at)
+
+    exact = settings.SEARCH_EXACT_MAX_CHUNKS > 0 and (
+        await count_chat_embeddings(db, chat_id, settings.SEARCH_EXACT_MAX_CHUNKS) <= settings.SEARCH_EXACT_MAX_CHUNKS
+    )
+    if exact:
+        chat = select(*columns, Message.embedding).where(*filters).cte("chat_messages").prefix_with("MATERIALIZED")
+        distance = chat.c.embedding.cosine_distance(query_vector).label("distance")
+        query = select(*[column for column in chat.c if column.key != "embedding"], distance)
+    else:
+        ef_search = min(max(settings.HNSW_EF_SEARCH, limit), 1000)
+        await db.execute(sql_text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+        if settings.SEARCH_ITERATIVE_SCAN != "off":
+            await db.execute(sql_text(f"SET LOCAL hnsw.iterative_scan = {settings.SEARCH_ITERATIVE_SCAN}"))
+            await db.execute(sql_text(f"SET LOCAL hnsw.max_scan_tuples = {int(settings.HNSW_MAX_SCAN_TUPLES)}"))
+        distance = Message.embedding.cosine_distance(query_vector).label("distance")
+        query = select(*columns, distance).where(*filters)
+    rows = (await db.execute(query.order_by(distance).limit(limit))).all()
+    return sorted((RecalledMessage(**row._mapping) for row in rows), key=lambda message: message.distance)
+
+
+def get_message_embedder(request: Request) -> Optional[MessageEmbedder]:
+    return getattr(request.app.state, "message_embedder", None)
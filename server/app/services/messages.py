@@ -0,0 +1,47 @@
+import datetime
+from typing import List, Sequence
+
+from sqlalchemy import DateTime, insert, literal_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import Message, generate_uuid
+from app.schemas import MessageBatchItem
+
+# Postgres caps a statement at 32767 bind parameters; a row takes five
+INSERT_ROWS_PER_STATEMENT = 5000
+
+
+async def insert_messages(db: AsyncSession, items: Sequence[MessageBatchItem]) -> List:
+    """
+    Insert `items` with multi-row INSERT ... RETURNING, one statement per
+    INSERT_ROWS_PER_STATEMENT rows. Rows come back in `items` order; the
+    caller commits.
+
+    Items without created_at get the statement time plus their position in
+    microseconds, so a batch keeps its order in (created_at, id) pagination.
+    """
+    table = Message.__table__
+    rows = []
+    for position, item in enumerate(items):
+        created_at = item.created_at
+        if created_at is None:
+            created_at = literal_column("statement_timestamp()", DateTime(timezone=True)) + datetime.timedelta(
+                microseconds=position
+            )
+        rows.append({
+            "id": generate_uuid(),
+            "chat_id": item.chat_id,
+            "role": item.role,
+            "content": item.content,
+            "created_at": created_at,
+        })
+
+    created = {}
+    for start in range(0, len(rows), INSERT_ROWS_PER_STATEMENT):
+        result = await db.execute(
+            insert(table)
+            .values(rows[start:start + INSERT_ROWS_PER_STATEMENT])
+            .returning(table.c.id, table.c.chat_id, table.c.role, table.c.content, table.c.created_at)
+        )
+        created.update((str(row.id), row) for row in result)
+    return [created[row["id"]] for row in rows]
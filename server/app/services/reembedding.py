@@ -0,0 +1,576 @@
+"""
+Re-embedding every document with a new embedding model, without downtime.
+
+A run writes into `embedding_next` shadow columns on documents and
+document_chunks, typed for the target dimension, walking documents in
+primary-key order a batch at a time. Each batch's vectors are committed
+together with the run's cursor and counters, so a crashed, cancelled or
+paused run resumes exactly where it stopped. Documents ingested meanwhile
+are picked up by a catch-up pass, then HNSW indexes on the shadow columns
+are built concurrently, and `flip_run` swaps columns and indexes in one
+transaction: readers see either the old vectors or the new ones.
+
+Every process's EmbeddingService follows the last flipped run through an
+EmbeddingSpaceWatcher, and writes check inside their transaction that no
+flip committed since their vectors were computed (verify_embedding_space).
+"""
+import asyncio
+import datetime
+import logging
+import time
+from collections import defaultdict
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import bindparam, exists, select, text as sql_text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import Settings
+from app.core.database import SessionLocal
+from app.models.models import Document, DocumentChunk, ReembeddingRun
+from app.services.chunking import iter_chunks
+from app.services.embedding_cache import EmbeddingCache, embed_with_cache
+from app.services.embedding_providers import create_provider
+from app.services.embeddings import EmbeddingService, EmbeddingSpaceChanged, mean_vector
+
+logger = logging.getLogger(__name__)
+
+# Runs that still own the shadow columns
+OPEN_STATUSES = ("pending", "running", "paused", "failed", "completed")
+
+# (table, live index, shadow index)
+SHADOW_INDEXES = (
+    ("documents", "ix_documents_embedding_hnsw", "ix_documents_embedding_next_hnsw"),
+    ("document_chunks", "ix_document_chunks_embedding_hnsw", "ix_document_chunks_embedding_next_hnsw"),
+)
+# messages gets an empty shadow column instead: its vectors start over in
+# the new space. (live index, shadow index, definition over embedding_next)
+MESSAGE_SHADOW_INDEXES = (
+    (
+        "ix_messages_embedding_hnsw",
+        "ix_messages_embedding_next_hnsw",
+        "USING hnsw (embedding_next vector_cosine_ops) WITH (m = 16, ef_construction = 64)",
+    ),
+    ("ix_messages_unembedded", "ix_messages_unembedded_next", "(created_at) WHERE embedding_next IS NULL AND content <> ''"),
+)
+# What the run still owes, built with the shadow indexes once catch-up is
+# done: from then on they only hold rows written since, so flip_run's
+# check under the lock reads next to nothing
+PENDING_INDEXES = (
+    ("ix_document_chunks_embedding_next_pending", "document_chunks (document_id) WHERE embedding_next IS NULL"),
+    ("ix_documents_embedding_next_pending", "documents (id) WHERE embedding_next IS NULL AND embedding IS NOT NULL"),
+)
+# Compact and other-metric indexes over the old column; rebuild with `cli.py vector-indexes`
+COMPACT_INDEXES = (
+    "ix_document_chunks_embedding_halfvec_hnsw",
+    "ix_document_chunks_embedding_bit_hnsw",
+    "ix_document_chunks_embedding_l2_hnsw",
+    "ix_document_chunks_embedding_ip_hnsw",
+)
+
+# Documents the run still owes a vector: any with a chunk left to re-embed,
+# plus chunkless ones that have a vector to replace, either from their own
+# content or, for dedup links, by copying the original's. (A chunkless
+# document with neither has nothing to re-embed from.)
+MISSING_VECTORS_SQL = """
+    SELECT document_id FROM document_chunks WHERE embedding_next IS NULL
+    UNION
+    SELECT d.id FROM documents d LEFT JOIN documents o ON o.id = d.duplicate_of
+    WHERE d.embedding_next IS NULL AND d.embedding IS NOT NULL
+      AND (d.content <> '' OR o.embedding IS NOT NULL)
+    LIMIT :n
+"""
+
+# The space the stored vectors are in, if a run was ever flipped
+FLIPPED_SPACE_SQL = (
+    "SELECT provider, model, dim FROM reembedding_runs WHERE status = 'flipped' ORDER BY flipped_at DESC LIMIT 1"
+)
+
+
+class ReembeddingError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class _Stopped(Exception):
+    """The run was paused or abandoned by someone else."""
+
+
+class TokenPacer:
+    """Sleeps just long enough to keep average spend under `tokens_per_s` (0 = unthrottled)."""
+
+    def __init__(self, tokens_per_s: Optional[int]):
+        self.tokens_per_s = tokens_per_s or 0
+        self._started: Optional[float] = None
+        self._spent = 0
+
+    async def spend(self, tokens: int) -> None:
+        if self.tokens_per_s <= 0:
+            return
+        now = time.monotonic()
+        if self._started is None:
+            self._started = now
+        self._spent += tokens
+        delay = self._spent / self.tokens_per_s - (now - self._started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def target_settings(settings: Settings, run: ReembeddingRun) -> Settings:
+    """`settings` with the embedding provider swapped for the run's target."""
+    return settings.model_copy(update={
+        "EMBEDDING_PROVIDER": run.provider,
+        "EMBEDDING_MODEL": run.model,
+        "EMBEDDING_DIM": run.dim,
+    })
+
+
+async def latest_run(db: AsyncSession) -> Optional[ReembeddingRun]:
+    return (await db.execute(
+        select(ReembeddingRun).order_by(ReembeddingRun.created_at.desc()).limit(1)
+    )).scalar_one_or_none()
+
+
+async def create_run(
+    db: AsyncSession,
+    *,
+    provider: str,
+    model: str,
+    dim: int,
+    tokens_per_s: Optional[int] = None,
+) -> ReembeddingRun:
+    """Start a run towards (provider, model, dim), or return the open run that already targets it."""
+    run = await latest_run(db)
+    if run is not None and run.status in OPEN_STATUSES:
+        if (run.provider, run.model, run.dim) != (provider, model, dim):
+            raise ReembeddingError(
+                409, f"Run {run.id} towards {run.provider}/{run.model} is {run.status}; abandon it first."
+            )
+        if tokens_per_s is not None:
+            run.tokens_per_s = tokens_per_s
+            await db.commit()
+        return run
+
+    # Metadata-only DDL: dropping marks the column dead, a NULL column needs no rewrite
+    for table, _, shadow_index in SHADOW_INDEXES:
+        await db.execute(sql_text(f"DROP INDEX IF EXISTS {shadow_index}"))
+        await db.execute(sql_text(f"ALTER TABLE {table} DROP COLUMN IF EXISTS embedding_next"))
+        await db.execute(sql_text(f"ALTER TABLE {table} ADD COLUMN embedding_next vector({int(dim)})"))
+    # Dropping a column drops its indexes
+    await db.execute(sql_text("ALTER TABLE messages DROP COLUMN IF EXISTS embedding_next"))
+    await db.execute(sql_text(f"ALTER TABLE messages ADD COLUMN embedding_next vector({int(dim)})"))
+    run = ReembeddingRun(
+        provider=provider,
+        model=model,
+        dim=dim,
+        status="pending",
+        phase="walk",
+        documents_done=0,
+        chunks_done=0,
+        tokens=0,
+        tokens_per_s=tokens_per_s,
+    )
+    db.add(run)
+    await db.commit()
+    await db.refresh(run)
+    return run
+
+
+async def pause_run(db: AsyncSession, run_id: UUID) -> None:
+    """The worker notices at its next batch and stops; resume with a new start."""
+    await db.execute(
+        update(ReembeddingRun).where(ReembeddingRun.id == run_id, ReembeddingRun.status == "running").values(status="paused")
+    )
+    await db.commit()
+
+
+async def abandon_run(db: AsyncSession, run_id: UUID) -> None:
+    run = await db.get(ReembeddingRun, run_id)
+    if run is None or run.status not in OPEN_STATUSES:
+        raise ReembeddingError(409, "No open re-embedding run to abandon.")
+    run.status = "abandoned"
+    for table, _, shadow_index in SHADOW_INDEXES:
+        await db.execute(sql_text(f"DROP INDEX IF EXISTS {shadow_index}"))
+        await db.execute(sql_text(f"ALTER TABLE {table} DROP COLUMN IF EXISTS embedding_next"))
+    await db.execute(sql_text("ALTER TABLE messages DROP COLUMN IF EXISTS embedding_next"))
+    await db.commit()
+
+
+class ReembeddingJob:
+    """
+    Drives one run to `completed`. Only one process works on a run at a
+    time: it is claimed with a heartbeat lease that other processes may
+    take over once `stale_after` seconds pass without progress.
+    """
+
+    def __init__(
+        self,
+        run_id: UUID,
+        service: EmbeddingService,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 50,
+        tokens_per_s: int = 0,
+        stale_after: float = 300,
+        session_factory: async_sessionmaker = SessionLocal,
+    ):
+        self.run_id = run_id
+        self.service = service
+        self.cache = cache
+        self.batch_size = batch_size
+        self.tokens_per_s = tokens_per_s
+        self.stale_after = stale_after
+        self.session_factory = session_factory
+
+    @classmethod
+    def from_settings(
+        cls, settings: Settings, run_id: UUID, service: EmbeddingService, cache: Optional[EmbeddingCache] = None
+    ) -> "ReembeddingJob":
+        return cls(
+            run_id,
+            service,
+            cache,
+            batch_size=settings.REEMBED_BATCH_DOCUMENTS,
+            tokens_per_s=settings.REEMBED_TOKENS_PER_S,
+            stale_after=settings.REEMBED_STALE_AFTER_S,
+        )
+
+    async def run(self) -> ReembeddingRun:
+        run = await self._claim()
+        # A per-run budget overrides REEMBED_TOKENS_PER_S
+        pacer = TokenPacer(run.tokens_per_s if run.tokens_per_s is not None else self.tokens_per_s)
+        try:
+            cursor = run.cursor
+            if run.phase == "walk":
+                while document_ids := await self._next_walk_batch(cursor):
+                    cursor = document_ids[-1]
+                    await self._process(document_ids, pacer, cursor=cursor)
+                await self._update(phase="catch_up")
+                run.phase = "catch_up"
+            if run.phase == "catch_up":
+                await self._catch_up(pacer)
+                await self._update(phase="index")
+            await self._build_indexes()
+            await self._update(
+                status="completed", completed_at=datetime.datetime.now(datetime.timezone.utc), error=None
+            )
+        except _Stopped:
+            pass
+        except asyncio.CancelledError:
+            await self._update(status="paused")
+            raise
+        except Exception as e:
+            await self._update(status="failed", error=f"{type(e).__name__}: {e}")
+            raise
+        return await self._get()
+
+    async def _catch_up(self, pacer: TokenPacer) -> None:
+        """Re-embed documents that were ingested after the walk passed them."""
+        while document_ids := await self._next_catch_up_batch():
+            await self._process(document_ids, pacer)
+
+    async def _get(self) -> ReembeddingRun:
+        async with self.session_factory() as db:
+            return await db.get(ReembeddingRun, self.run_id)
+
+    async def _update(self, **values) -> None:
+        async with self.session_factory() as db:
+            await db.execute(update(ReembeddingRun).where(ReembeddingRun.id == self.run_id).values(**values))
+            await db.commit()
+
+    async def _claim(self) -> ReembeddingRun:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        stale = now - datetime.timedelta(seconds=self.stale_after)
+        async with self.session_factory() as db:
+            run = (await db.execute(
+                select(ReembeddingRun).where(ReembeddingRun.id == self.run_id).with_for_update()
+            )).scalar_one_or_none()
+            if run is None:
+                raise ReembeddingError(404, "Re-embedding run not found")
+            if run.status not in ("pending", "paused", "failed", "running"):
+                raise ReembeddingError(409, f"Run {run.id} is {run.status}.")
+            if run.status == "running" and run.heartbeat_at and run.heartbeat_at > stale:
+                raise ReembeddingError(409, f"Run {run.id} is already running in another process.")
+            run.status = "running"
+            run.heartbeat_at = now
+            run.error = None
+            await db.commit()
+            await db.refresh(run)
+            return run
+
+    async def _next_walk_batch(self, cursor: Optional[UUID]) -> List[UUID]:
+        query = select(Document.id).order_by(Document.id).limit(self.batch_size)
+        if cursor is not None:
+            query = query.where(Document.id > cursor)
+        async with self.session_factory() as db:
+            return list((await db.execute(query)).scalars())
+
+    async def _next_catch_up_batch(self) -> List[UUID]:
+        async with self.session_factory() as db:
+            return list((await db.execute(sql_text(MISSING_VECTORS_SQL), {"n": self.batch_size})).scalars())
+
+    async def _process(self, document_ids: List[UUID], pacer: TokenPacer, cursor: Optional[UUID] = None) -> None:
+        """Re-embed the documents' chunks and advance the run in the same transaction."""
+        dim = self.service.dim
+        async with self.session_factory() as db:
+            chunks = (await db.execute(
+                select(DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.content)
+                .where(DocumentChunk.document_id.in_(document_ids))
+                .order_by(DocumentChunk.document_id, DocumentChunk.chunk_index)
+            )).all()
+            # Documents without chunks (stored before chunking, or dedup links)
+            # still have a document vector to carry over
+            chunkless = (await db.execute(
+                select(Document.id, Document.content, Document.duplicate_of).where(
+                    Document.id.in_(document_ids),
+                    Document.embedding.is_not(None),
+                    ~exists().where(DocumentChunk.document_id == Document.id),
+                )
+            )).all()
+            pieces = [
+                (document.id, piece)
+                for document in chunkless
+                if document.duplicate_of is None and document.content
+                for piece in ([chunk.content for chunk in iter_chunks(document.content)] or [document.content])
+            ]
+            embedded = await embed_with_cache(
+                db, self.service, self.cache, [chunk.content for chunk in chunks] + [text for _, text in pieces]
+            )
+
+            per_document = defaultdict(list)
+            for document_id, vector in zip(
+                [chunk.document_id for chunk in chunks] + [document_id for document_id, _ in pieces], embedded.vectors
+            ):
+                per_document[document_id].append(vector)
+            if chunks:
+                await db.execute(
+                    sql_text("UPDATE document_chunks SET embedding_next = :embedding WHERE id = :id")
+                    .bindparams(bindparam("embedding", type_=Vector(dim))),
+                    [{"id": chunk.id, "embedding": vector} for chunk, vector in zip(chunks, embedded.vectors)],
+                )
+            if per_document:
+                await db.execute(
+                    sql_text("UPDATE documents SET embedding_next = :embedding WHERE id = :id")
+                    .bindparams(bindparam("embedding", type_=Vector(dim))),
+                    [{"id": document_id, "embedding": mean_vector(vectors)} for document_id, vectors in per_document.items()],
+                )
+            links = [document.id for document in chunkless if document.duplicate_of is not None]
+            if links:
+                # Left NULL while the original is not done yet; the catch-up pass returns to it
+                await db.execute(
+                    sql_text(
+                        "UPDATE documents d SET embedding_next = o.embedding_next FROM documents o "
+                        "WHERE o.id = d.duplicate_of AND d.id = ANY(:ids)"
+                    ),
+                    {"ids": links},
+                )
+
+            values = {
+                "documents_done": ReembeddingRun.documents_done + len(document_ids),
+                "chunks_done": ReembeddingRun.chunks_done + len(chunks),
+                "tokens": ReembeddingRun.tokens + embedded.tokens,
+                "heartbeat_at": datetime.datetime.now(datetime.timezone.utc),
+            }
+            if cursor is not None:
+                values["cursor"] = cursor
+            # Progress and vectors commit together; a paused run keeps neither
+            claimed = (await db.execute(
+                update(ReembeddingRun)
+                .where(ReembeddingRun.id == self.run_id, ReembeddingRun.status == "running")
+                .values(**values)
+            )).rowcount
+            if not claimed:
+                await db.rollback()
+                raise _Stopped()
+            await db.commit()
+        await pacer.spend(embedded.tokens)
+
+    async def _build_indexes(self) -> None:
+        async with self.session_factory() as db:
+            # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+            conn = await db.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+
+            async def build(name: str, definition: str) -> None:
+                # A build interrupted by a crash leaves an invalid index behind
+                invalid = (await conn.execute(sql_text(
+                    "SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"
+                ), {"name": name})).scalar_one_or_none()
+                if invalid:
+                    await conn.execute(sql_text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                await conn.execute(sql_text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}"))
+
+            for table, _, shadow_index in SHADOW_INDEXES:
+                await build(
+                    shadow_index,
+                    f"{table} USING hnsw (embedding_next vector_cosine_ops) WITH (m = 16, ef_construction = 64)",
+                )
+            for _, shadow_index, definition in MESSAGE_SHADOW_INDEXES:
+                await build(shadow_index, f"messages {definition}")
+            for name, definition in PENDING_INDEXES:
+                await build(name, definition)
+
+
+async def _send_back_to_catch_up(db: AsyncSession, run_id: UUID) -> None:
+    await db.rollback()
+    # Back to the worker for another catch-up pass; the indexes already exist
+    await db.execute(
+        update(ReembeddingRun).where(ReembeddingRun.id == run_id).values(status="paused", phase="catch_up")
+    )
+    await db.commit()
+    raise ReembeddingError(409, "Documents were added since the run completed; resume the run and flip again.")
+
+
+async def flip_run(db: AsyncSession, run_id: UUID) -> ReembeddingRun:
+    """
+    Swap embedding_next in as `embedding`, with its indexes, in one
+    transaction. Every index is built beforehand, so writes only wait for a
+    check of the rows written since the run completed and for the renames.
+    If any chunk or document is missing its new vector, the run goes back
+    to catch-up and this raises ReembeddingError(409). The old vectors stay
+    in `embedding_prev` until the next flip.
+    """
+    run = await db.get(ReembeddingRun, run_id)
+    if run is None or run.status != "completed":
+        raise ReembeddingError(409, "Only a completed re-embedding run can be flipped.")
+
+    # Without the lock first, so a run that fell behind never holds up writers
+    if (await db.execute(sql_text(MISSING_VECTORS_SQL), {"n": 1})).first() is not None:
+        await _send_back_to_catch_up(db, run_id)
+
+    # Readers carry on; writers queue until the swap commits. Only rows
+    # written since the check above can be missing, and the pending indexes
+    # hold just those
+    await db.execute(sql_text("LOCK TABLE documents, document_chunks IN SHARE ROW EXCLUSIVE MODE"))
+    if (await db.execute(sql_text(MISSING_VECTORS_SQL), {"n": 1})).first() is not None:
+        await _send_back_to_catch_up(db, run_id)
+
+    for index in COMPACT_INDEXES + tuple(name for name, _ in PENDING_INDEXES):
+        await db.execute(sql_text(f"DROP INDEX IF EXISTS {index}"))
+    for table, live_index, shadow_index in SHADOW_INDEXES:
+        await db.execute(sql_text(f"DROP INDEX IF EXISTS {live_index}"))
+        await db.execute(sql_text(f"ALTER TABLE {table} DROP COLUMN IF EXISTS embedding_prev"))
+        await db.execute(sql_text(f"ALTER TABLE {table} RENAME COLUMN embedding TO embedding_prev"))
+        await db.execute(sql_text(f"ALTER TABLE {table} RENAME COLUMN embedding_next TO embedding"))
+        await db.execute(sql_text(f"ALTER INDEX {shadow_index} RENAME TO {live_index}"))
+    # Message vectors start over in the new space, in the empty shadow column
+    # the MessageEmbedder backfills. Dropping the old column drops its indexes.
+    await db.execute(sql_text("ALTER TABLE messages DROP COLUMN embedding"))
+    await db.execute(sql_text("ALTER TABLE messages RENAME COLUMN embedding_next TO embedding"))
+    for live_index, shadow_index, _ in MESSAGE_SHADOW_INDEXES:
+        await db.execute(sql_text(f"ALTER INDEX {shadow_index} RENAME TO {live_index}"))
+    # Failures in the old space say nothing about the new one
+    await db.execute(sql_text(
+        "ALTER TABLE messages DROP COLUMN embedding_attempts, "
+        "ADD COLUMN embedding_attempts integer NOT NULL DEFAULT 0"
+    ))
+    run.status = "flipped"
+    run.flipped_at = datetime.datetime.now(datetime.timezone.utc)
+    await db.commit()
+    return run
+
+
+def _space_mismatch(row, space: Tuple[str, str, int]) -> bool:
+    return row is not None and (row.provider, row.model, row.dim) != tuple(space)
+
+
+async def verify_embedding_space(db: AsyncSession, space: Tuple[str, str, int]) -> None:
+    """
+    Raise EmbeddingSpaceChanged if a flip committed since vectors in
+    `space` (EmbeddingService.space, read before embedding) were computed.
+    Call after the writes and before committing: a flip holds the tables
+    until it commits, so a write that queued behind it sees it here.
+    """
+    if _space_mismatch((await db.execute(sql_text(FLIPPED_SPACE_SQL))).first(), space):
+        raise EmbeddingSpaceChanged("The embedding model changed while this request was embedding; retry it.")
+
+
+class EmbeddingSpaceWatcher:
+    """
+    Keeps this process's EmbeddingService in the space of the last flipped
+    run: a flip here switches it at once, one in another process within
+    `poll_interval` seconds. EMBEDDING_DIM is not reloaded, so a flip to
+    another dimension cannot be followed live; the service refuses to embed
+    until the process restarts with the new EMBEDDING_* settings.
+    """
+
+    def __init__(
+        self,
+        service: EmbeddingService,
+        settings: Settings,
+        poll_interval: float = 5.0,
+        session_factory: async_sessionmaker = SessionLocal,
+    ):
+        self.service = service
+        self.settings = settings
+        self.poll_interval = poll_interval
+        self.session_factory = session_factory
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def start(self) -> None:
+        if self._task is None and self.poll_interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Embedding space check error")
+
+    async def refresh(self) -> None:
+        async with self._lock:
+            async with self.session_factory() as db:
+                row = (await db.execute(sql_text(FLIPPED_SPACE_SQL))).first()
+            if not _space_mismatch(row, self.service.space):
+                return
+            if row.dim != self.settings.EMBEDDING_DIM:
+                if self.service.blocked is None:
+                    logger.error(
+                        "Embedding space flipped to %s/%s with %d dimensions; embedding is blocked until restarted",
+                        row.provider, row.model, row.dim,
+                    )
+                self.service.blocked = (
+                    f"Stored vectors were re-embedded with {row.provider}/{row.model} ({row.dim} dimensions); "
+                    f"restart with EMBEDDING_DIM={row.dim}."
+                )
+                return
+            logger.warning("Embedding space flipped; switching to %s/%s", row.provider, row.model)
+            await self.service.switch_provider(
+                create_provider(target_settings(self.settings, row)), (row.provider, row.model, row.dim)
+            )
+
+
+async def run_in_background(state, settings: Settings, run: ReembeddingRun) -> asyncio.Task:
+    """Work on `run` from this process, with its own embedding client for the target model."""
+    task = getattr(state, "reembedding_task", None)
+    if task is not None and not task.done():
+        raise ReembeddingError(409, "A re-embedding run is already active in this process.")
+
+    service = EmbeddingService.from_settings(target_settings(settings, run))
+    await service.start()
+    job = ReembeddingJob.from_settings(settings, run.id, service, getattr(state, "embedding_cache", None))
+
+    async def work():
+        try:
+            await job.run()
+        except ReembeddingError as e:
+            logger.warning("Re-embedding not started: %s", e.detail)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Re-embedding run %s failed", run.id)
+        finally:
+            await service.close()
+
+    state.reembedding_task = asyncio.create_task(work())
+    return state.reembedding_task
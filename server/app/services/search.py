@@ -0,0 +1,406 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
+from sqlalchemy import cast, func, literal_column, select, text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.models.models import Document, DocumentChunk
+from app.services.admission import AdmissionRejected
+from app.services.embedding_cache import EmbeddingCache, embed_with_cache
+from app.services.embeddings import EmbeddingService, EmbeddingSpaceChanged
+from app.services.ingestion import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# pgvector comparator for each supported metric. max_inner_product is the
+# negated inner product so that ascending order is always "closest first".
+DISTANCE_METRICS = {
+    "cosine": "cosine_distance",
+    "l2": "l2_distance",
+    "inner_product": "max_inner_product",
+}
+
+TEXT_SEARCH_CONFIG = "english"
+
+# ANN indexes over document_chunks.embedding, one per VECTOR_SEARCH_INDEX mode.
+# The compact ones are expression indexes: no extra columns are stored, and
+# queries must use exactly the same expression (see _compact_distance).
+CHUNK_ANN_INDEXES = {
+    "full": (
+        "ix_document_chunks_embedding_hnsw",
+        "CREATE INDEX {concurrently} ix_document_chunks_embedding_hnsw ON document_chunks "
+        "USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)",
+    ),
+    "halfvec": (
+        "ix_document_chunks_embedding_halfvec_hnsw",
+        "CREATE INDEX {concurrently} ix_document_chunks_embedding_halfvec_hnsw ON document_chunks "
+        "USING hnsw ((embedding::halfvec({dim})) halfvec_cosine_ops) WITH (m = 16, ef_construction = 64)",
+    ),
+    "binary": (
+        "ix_document_chunks_embedding_bit_hnsw",
+        "CREATE INDEX {concurrently} ix_document_chunks_embedding_bit_hnsw ON document_chunks "
+        "USING hnsw ((binary_quantize(embedding)::bit({dim})) bit_hamming_ops) WITH (m = 16, ef_construction = 64)",
+    ),
+}
+
+
+# Full-precision indexes for the other metrics, built on demand with
+# `cli.py vector-indexes --metric` and enabled with SEARCH_ANN_METRICS.
+# The compact indexes above are cosine only.
+CHUNK_METRIC_INDEXES = {
+    "l2": (
+        "ix_document_chunks_embedding_l2_hnsw",
+        "CREATE INDEX {concurrently} ix_document_chunks_embedding_l2_hnsw ON document_chunks "
+        "USING hnsw (embedding vector_l2_ops) WITH (m = 16, ef_construction = 64)",
+    ),
+    "inner_product": (
+        "ix_document_chunks_embedding_ip_hnsw",
+        "CREATE INDEX {concurrently} ix_document_chunks_embedding_ip_hnsw ON document_chunks "
+        "USING hnsw (embedding vector_ip_ops) WITH (m = 16, ef_construction = 64)",
+    ),
+}
+
+
+class QueryEmbeddingError(Exception):
+    pass
+
+
+class SearchPlanError(Exception):
+    pass
+
+
+@dataclass
+class SearchHit:
+    chunk_id: UUID
+    chunk_index: int
+    content: str
+    document_id: UUID
+    filename: str
+    distance: Optional[float] = None
+    text_rank: Optional[float] = None
+    score: Optional[float] = None
+
+
+@dataclass
+class SearchStats:
+    """How a search was executed: the chosen plan and per-step timings."""
+    plan: Optional[str] = None
+    tenant_chunks: Optional[int] = None
+    timer: StageTimer = field(default_factory=lambda: StageTimer(pipeline="search"))
+
+
+def _hit_columns():
+    return (
+        DocumentChunk.id.label("chunk_id"),
+        DocumentChunk.chunk_index,
+        DocumentChunk.content,
+        DocumentChunk.document_id,
+        Document.filename,
+    )
+
+
+async def embed_query(
+    db: AsyncSession,
+    service: EmbeddingService,
+    cache: Optional[EmbeddingCache],
+    query: str,
+    user_id: Optional[UUID] = None,
+) -> List[float]:
+    """Embed a search query at interactive priority; AdmissionRejected and EmbeddingSpaceChanged propagate."""
+    try:
+        return (await embed_with_cache(db, service, cache, [query], user_id=user_id, priority="interactive")).vectors[0]
+    except (AdmissionRejected, EmbeddingSpaceChanged):
+        raise
+    except Exception as e:
+        logger.exception("Could not embed search query")
+        raise QueryEmbeddingError("Could not embed search query.") from e
+
+
+def _compact_distance(index: str, query_vector: Sequence[float]):
+    if index == "halfvec":
+        return cast(DocumentChunk.embedding, HALFVEC(settings.EMBEDDING_DIM)).cosine_distance(query_vector)
+    if index == "binary":
+        query_bits = func.binary_quantize(cast(query_vector, Vector(settings.EMBEDDING_DIM)))
+        return cast(func.binary_quantize(DocumentChunk.embedding), BIT(settings.EMBEDDING_DIM)).hamming_distance(query_bits)
+    raise ValueError(f"Unknown vector index: {index}")
+
+
+async def count_tenant_chunks(db: AsyncSession, user_id: UUID, cap: int) -> int:
+    """Chunks owned by `user_id`, counted no further than cap + 1 so big tenants stay cheap."""
+    bounded = select(literal_column("1")).where(DocumentChunk.user_id == user_id).limit(cap + 1).subquery()
+    return (await db.execute(select(func.count()).select_from(bounded))).scalar_one()
+
+
+async def vector_search(
+    db: AsyncSession,
+    query_vector: Sequence[float],
+    *,
+    metric: str = "cosine",
+    limit: int = 10,
+    user_id: Optional[UUID] = None,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    index: Optional[str] = None,
+    rerank_factor: Optional[int] = None,
+    stats: Optional[SearchStats] = None,
+) -> List[SearchHit]:
+    """
+    Nearest chunks to `query_vector`. The caller ends the transaction.
+
+    Small tenants (at most SEARCH_EXACT_MAX_CHUNKS chunks) get an exact scan
+    of their own rows, which is both faster and exact at that size. Everyone
+    else goes through the ANN index with an iterative scan, so a selective
+    user_id filter still returns `limit` rows. With a compact `index`
+    ("halfvec" or "binary") candidates come from the smaller index and are
+    re-ranked by exact distance on the full vector.
+
+    The ANN plan needs an index for `metric`: l2 and inner_product always
+    use their full-precision index, and raise SearchPlanError unless it is
+    enabled in SEARCH_ANN_METRICS.
+    """
+    stats = stats or SearchStats()
+    timer = stats.timer
+    comparator = DISTANCE_METRICS[metric]
+
+    async with timer.stage("plan"):
+        plan = "ann"
+        if user_id is not None and settings.SEARCH_EXACT_MAX_CHUNKS > 0:
+            stats.tenant_chunks = await count_tenant_chunks(db, user_id, settings.SEARCH_EXACT_MAX_CHUNKS)
+            if stats.tenant_chunks <= settings.SEARCH_EXACT_MAX_CHUNKS:
+                plan = "exact"
+        stats.plan = plan
+
+    if plan == "exact":
+        # MATERIALIZED keeps the planner from pushing the ORDER BY into the
+        # ANN index: the tenant's rows are fetched by user_id and sorted.
+        tenant = (
+            select(*_hit_columns(), DocumentChunk.embedding)
+            .join(Document, Document.id == DocumentChunk.document_id)
+            .where(DocumentChunk.user_id == user_id)
+            .cte("tenant_chunks")
+            .prefix_with("MATERIALIZED")
+        )
+        distance = getattr(tenant.c.embedding, comparator)(query_vector).label("distance")
+        query = select(*[column for column in tenant.c if column.key != "embedding"], distance)
+        async with timer.stage("search"):
+            rows = (await db.execute(query.order_by(distance).limit(limit))).all()
+        return [SearchHit(**row._mapping) for row in rows]
+
+    index = index or settings.VECTOR_SEARCH_INDEX
+    if metric != "cosine":
+        if metric not in settings.SEARCH_ANN_METRICS:
+            raise SearchPlanError(
+                f"No {metric} vector index; search this tenant with the cosine metric, "
+                f"or build one with `cli.py vector-indexes --metric {metric}` and add it to SEARCH_ANN_METRICS."
+            )
+        index = "full"
+    candidates = limit if index == "full" else limit * (rerank_factor or settings.VECTOR_RERANK_FACTOR)
+
+    # SET LOCAL only lasts until the end of the current transaction, so the
+    # knobs never leak to other requests sharing this pooled connection.
+    # HNSW returns at most ef_search rows, so it can never be below the
+    # candidate count (pgvector caps it at 1000).
+    ef_search = min(max(ef_search or settings.HNSW_EF_SEARCH, candidates), 1000)
+    await db.execute(sql_text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+    await db.execute(sql_text(f"SET LOCAL ivfflat.probes = {int(probes or settings.IVFFLAT_PROBES)}"))
+    if user_id is not None and settings.SEARCH_ITERATIVE_SCAN != "off":
+        await db.execute(sql_text(f"SET LOCAL hnsw.iterative_scan = {settings.SEARCH_ITERATIVE_SCAN}"))
+        await db.execute(sql_text(f"SET LOCAL hnsw.max_scan_tuples = {int(settings.HNSW_MAX_SCAN_TUPLES)}"))
+        await db.execute(sql_text("SET LOCAL ivfflat.iterative_scan = relaxed_order"))
+
+    distance = getattr(DocumentChunk.embedding, comparator)(query_vector).label("distance")
+    query = select(*_hit_columns(), distance).join(Document, Document.id == DocumentChunk.document_id)
+    if index != "full":
+        shortlist = select(DocumentChunk.id)
+        if user_id is not None:
+            shortlist = shortlist.where(DocumentChunk.user_id == user_id)
+        shortlist = shortlist.order_by(_compact_distance(index, query_vector)).limit(candidates).subquery()
+        query = query.join(shortlist, shortlist.c.id == DocumentChunk.id)
+    elif user_id is not None:
+        query = query.where(DocumentChunk.user_id == user_id)
+    async with timer.stage("search"):
+        rows = (await db.execute(query.order_by(distance).limit(limit))).all()
+    # relaxed_order may return rows slightly out of order
+    return sorted((SearchHit(**row._mapping) for row in rows), key=lambda hit: hit.distance)
+
+
+async def measure_recall(
+    db: AsyncSession,
+    *,
+    index: str,
+    k: int = 10,
+    sample_size: int = 50,
+    metric: str = "cosine",
+) -> float:
+    """
+    Mean recall@k of `index` against an exact scan, using stored chunk
+    embeddings as queries.
+    """
+    sample = (await db.execute(
+        select(DocumentChunk.embedding)
+        .where(DocumentChunk.embedding.is_not(None))
+        .order_by(func.random())
+        .limit(sample_size)
+    )).scalars().all()
+    await db.commit()
+
+    recalls = []
+    for query_vector in sample:
+        # With index scans disabled the planner has to sort every row: exact.
+        await db.execute(sql_text("SET LOCAL enable_indexscan = off"))
+        exact = await vector_search(db, query_vector, metric=metric, limit=k, index="full")
+        await db.commit()
+        approximate = await vector_search(db, query_vector, metric=metric, limit=k, index=index)
+        await db.commit()
+        expected = {hit.chunk_id for hit in exact}
+        if expected:
+            recalls.append(len(expected & {hit.chunk_id for hit in approximate}) / len(expected))
+    return sum(recalls) / len(recalls) if recalls else 1.0
+
+
+async def text_search(
+    db: AsyncSession,
+    query_text: str,
+    *,
+    limit: int = 10,
+    user_id: Optional[UUID] = None,
+) -> List[SearchHit]:
+    """Full-text search over chunks, served by the GIN index on content_tsv."""
+    ts_query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, query_text)
+    rank = func.ts_rank_cd(DocumentChunk.content_tsv, ts_query).label("text_rank")
+    query = (
+        select(*_hit_columns(), rank)
+        .join(Document, Document.id == DocumentChunk.document_id)
+        .where(DocumentChunk.content_tsv.op("@@")(ts_query))
+    )
+    if user_id is not None:
+        query = query.where(DocumentChunk.user_id == user_id)
+    rows = (await db.execute(query.order_by(rank.desc()).limit(limit))).all()
+    return [SearchHit(**row._mapping) for row in rows]
+
+
+def reciprocal_rank_fusion(
+    legs: Sequence[Tuple[List[SearchHit], float]],
+    k: int,
+    rrf_k: int = 60,
+) -> List[SearchHit]:
+    """Merge ranked lists: score = sum(weight / (rrf_k + rank)) over the lists a hit appears in."""
+    fused: Dict[UUID, SearchHit] = {}
+    for hits, weight in legs:
+        for rank, hit in enumerate(hits, start=1):
+            merged = fused.get(hit.chunk_id)
+            if merged is None:
+                merged = fused[hit.chunk_id] = SearchHit(**{**hit.__dict__, "score": 0.0})
+            merged.score += weight / (rrf_k + rank)
+            if hit.distance is not None:
+                merged.distance = hit.distance
+            if hit.text_rank is not None:
+                merged.text_rank = hit.text_rank
+    return sorted(fused.values(), key=lambda hit: hit.score, reverse=True)[:k]
+
+
+async def diversify(
+    db: AsyncSession,
+    hits: List[SearchHit],
+    k: int,
+    mmr_lambda: float,
+    query_vector: Optional[Sequence[float]] = None,
+) -> List[SearchHit]:
+    """
+    Pick `k` of `hits` by maximal marginal relevance: each step takes the hit
+    maximising mmr_lambda * relevance - (1 - mmr_lambda) * its highest cosine
+    similarity to a hit already taken. Relevance is cosine similarity to
+    `query_vector`, or the fused score (hybrid search) scaled to [0, 1].
+    """
+    if len(hits) <= 1:
+        return hits[:k]
+    rows = await db.execute(
+        select(DocumentChunk.id, DocumentChunk.embedding).where(DocumentChunk.id.in_([hit.chunk_id for hit in hits]))
+    )
+    vectors = {row.id: row.embedding for row in rows}
+    matrix = np.array(
+        [vectors.get(hit.chunk_id) if vectors.get(hit.chunk_id) is not None else np.zeros(settings.EMBEDDING_DIM) for hit in hits],
+        dtype=np.float32,
+    )
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+
+    if query_vector is not None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        relevance = matrix @ (query / (np.linalg.norm(query) or 1))
+    else:
+        scores = np.array([hit.score or 0.0 for hit in hits], dtype=np.float32)
+        relevance = scores / (scores.max() or 1)
+    similarity = matrix @ matrix.T
+
+    selected = [int(np.argmax(relevance))]
+    closest = similarity[selected[0]].copy()
+    while len(selected) < min(k, len(hits)):
+        marginal = mmr_lambda * relevance - (1 - mmr_lambda) * closest
+        marginal[selected] = -np.inf
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        closest = np.maximum(closest, similarity[best])
+    return [hits[i] for i in selected]
+
+
+async def hybrid_search(
+    session_factory: async_sessionmaker,
+    service: EmbeddingService,
+    cache: Optional[EmbeddingCache],
+    query_text: str,
+    *,
+    k: int = 10,
+    metric: str = "cosine",
+    user_id: Optional[UUID] = None,
+    vector_weight: float = 1.0,
+    text_weight: float = 1.0,
+    vector_candidates: int = 50,
+    text_candidates: int = 50,
+    rrf_k: int = 60,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    index: Optional[str] = None,
+    rerank_factor: Optional[int] = None,
+    stats: Optional[SearchStats] = None,
+) -> List[SearchHit]:
+    """
+    Run the lexical and vector legs concurrently, each on its own
+    connection, and fuse them with reciprocal rank fusion. The lexical leg
+    overlaps with embedding the query, so it adds little to the latency of
+    a plain vector search.
+    """
+    stats = stats or SearchStats()
+
+    async def vector_leg() -> List[SearchHit]:
+        async with session_factory() as db:
+            async with stats.timer.stage("embed"):
+                query_vector = await embed_query(db, service, cache, query_text, user_id=user_id)
+            hits = await vector_search(
+                db,
+                query_vector,
+                metric=metric,
+                limit=vector_candidates,
+                user_id=user_id,
+                ef_search=ef_search,
+                probes=probes,
+                index=index,
+                rerank_factor=rerank_factor,
+                stats=stats,
+            )
+            await db.commit()
+            return hits
+
+    async def text_leg() -> List[SearchHit]:
+        async with session_factory() as db:
+            async with stats.timer.stage("text_search"):
+                return await text_search(db, query_text, limit=text_candidates, user_id=user_id)
+
+    vector_hits, text_hits = await asyncio.gather(vector_leg(), text_leg())
+    return reciprocal_rank_fusion([(vector_hits, vector_weight), (text_hits, text_weight)], k=k, rrf_k=rrf_k)
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass
+class SpooledFile:
+    """A file streamed to local disk, with its size and sha256 computed on the way."""
+    path: str
+    size: int
+    sha256: str
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def close(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+async def spool_chunks(chunks: AsyncIterator[bytes], max_bytes: Optional[int] = None) -> SpooledFile:
+    """
+    Write `chunks` to a temp file; raises UploadTooLarge once `max_bytes` is
+    exceeded. Hashing and disk writes run in the threadpool.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="upload-", dir=settings.UPLOAD_SPOOL_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+
+            def write(chunk: bytes) -> None:
+                digest.update(chunk)
+                f.write(chunk)
+
+            async for chunk in chunks:
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the {max_bytes} byte limit.")
+                await run_in_threadpool(write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return SpooledFile(path=path, size=size, sha256=digest.hexdigest())
+
+
+async def spool_upload(
+    file: UploadFile,
+    max_bytes: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> SpooledFile:
+    """Stream an UploadFile to disk in fixed-size chunks, never holding more than one in memory."""
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_BYTES
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+
+    async def chunks() -> AsyncIterator[bytes]:
+        while chunk := await file.read(chunk_size):
+            yield chunk
+
+    return await spool_chunks(chunks(), max_bytes)
+
+
+async def spool_fileobj(
+    fileobj: BinaryIO,
+    max_bytes: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> SpooledFile:
+    """Like spool_upload for a plain file object, read off the event loop."""
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_BYTES
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+
+    async def chunks() -> AsyncIterator[bytes]:
+        while chunk := await run_in_threadpool(fileobj.read, chunk_size):
+            yield chunk
+
+    return await spool_chunks(chunks(), max_bytes)
+
+
+async def spool_bytes(data: bytes) -> SpooledFile:
+    async def chunks() -> AsyncIterator[bytes]:
+        yield data
+
+    return await spool_chunks(chunks())
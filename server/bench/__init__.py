@@ -0,0 +1,6 @@
+"""
+Benchmarks for ingestion and search against a local Postgres + pgvector and
+a deterministic fake embedding server:
+
+    cd server && python -m bench.run --documents 10000 --output results.json
+"""
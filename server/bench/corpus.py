@@ -0,0 +1,62 @@
+"""Seeded synthetic corpora: clustered unit vectors plus filler text."""
+import hashlib
+from typing import AsyncIterator, Iterator, List, Tuple
+
+import numpy as np
+
+from app.services.bulk import BulkItem
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "do", "fe", "gi", "hu", "ja"]
+
+
+class SyntheticCorpus:
+    """
+    `size` documents whose vectors are drawn around `clusters` random
+    centroids, like real embeddings that group by topic. Everything derives
+    from `seed`, so two runs with the same arguments load the same corpus.
+    """
+
+    def __init__(self, size: int, dim: int = 1536, clusters: int = 100, spread: float = 0.5, seed: int = 0, words: int = 80):
+        self.size = size
+        self.dim = dim
+        self.spread = spread
+        self.seed = seed
+        self.words = words
+        self.centroids = np.random.default_rng(seed).standard_normal((clusters, dim), dtype=np.float32)
+        vocabulary_rng = np.random.default_rng(seed + 1)
+        self.vocabulary = [
+            "".join(vocabulary_rng.choice(SYLLABLES, size=vocabulary_rng.integers(2, 5))) for _ in range(2000)
+        ]
+
+    def _vectors(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        vectors = self.centroids[rng.integers(len(self.centroids), size=n)]
+        vectors = vectors + self.spread * rng.standard_normal((n, self.dim), dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Tuple[str, str, List[float]]]:
+        """(filename, text, embedding) for every document, generated batch by batch."""
+        rng = np.random.default_rng(self.seed + 2)
+        for start in range(0, self.size, batch_size):
+            n = min(batch_size, self.size - start)
+            vectors = self._vectors(rng, n)
+            for i in range(n):
+                text = " ".join(rng.choice(self.vocabulary, size=self.words))
+                yield f"doc-{start + i:08d}.txt", text, vectors[i].tolist()
+
+    def queries(self, n: int) -> List[List[float]]:
+        """Query vectors from the same distribution as the corpus (not copies of documents)."""
+        return self._vectors(np.random.default_rng(self.seed + 3), n).tolist()
+
+
+async def iter_bulk_items(corpus: SyntheticCorpus) -> AsyncIterator[BulkItem]:
+    for filename, text, embedding in corpus.iter_documents():
+        content = text.encode("utf-8")
+        yield BulkItem(
+            ref=filename,
+            filename=filename,
+            text=text,
+            size=len(content),
+            sha256=hashlib.sha256(content).hexdigest(),
+            content_type="text/plain",
+            embedding=embedding,
+        )
@@ -0,0 +1,101 @@
+"""
+Deterministic stand-in for the OpenAI embeddings and chat completions API.
+
+The same text always gets the same unit vector, so runs are reproducible and
+cost nothing. Run it on its own and point OPENAI_BASE_URL at it:
+
+    cd server && python -m bench.fake_openai --port 8001
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 pdm run start
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import socket
+import threading
+import time
+from typing import List, Tuple, Union
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+def fake_embedding(text: str, dim: int = 1536) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def create_app(dim: int = 1536, latency_ms: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs: Union[str, List[str]] = body["input"]
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        tokens = sum(len(text.split()) for text in inputs)
+        return {
+            "object": "list",
+            "model": body.get("model", "fake"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, dim)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        # Echo the last user message back, one word per delta
+        question = next((m["content"] for m in reversed(body["messages"]) if m["role"] == "user"), "")
+        words = f"You asked: {question}".split(" ")
+
+        async def events():
+            for i, word in enumerate(words):
+                if latency_ms:
+                    await asyncio.sleep(latency_ms / 1000 / len(words))
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def serve_in_thread(dim: int = 1536, latency_ms: float = 0.0, host: str = "127.0.0.1") -> Tuple[str, uvicorn.Server]:
+    """Start the fake server on a free port in a daemon thread; returns its base URL."""
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(dim, latency_ms), host=host, port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://{host}:{port}/v1", server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.fake_openai")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated latency per request")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.dim, args.latency_ms), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
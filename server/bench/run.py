@@ -0,0 +1,269 @@
+"""
+Ingestion and search benchmarks. Writes one JSON document so runs can be
+diffed before and after a change.
+
+    cd server && python -m bench.run --documents 100000 --ef-search 20,40,100,200 --output after.json
+
+Needs DATABASE_URL pointing at a migrated Postgres + pgvector database.
+Embeddings come from the deterministic fake server in bench.fake_openai,
+started in-process, so no OpenAI key or network access is needed.
+"""
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+import argparse
+import asyncio
+import datetime
+import json
+import subprocess
+import time
+import uuid
+from typing import Dict, List, Optional, Sequence
+from uuid import UUID
+
+import httpx
+from sqlalchemy import delete, text as sql_text
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.lifespan import start_services, stop_services
+from app.models.models import Document, User
+from app.services.bulk import BulkLoader
+from app.services.ingestion import IngestionServices
+from app.services.search import vector_search
+from bench.corpus import SyntheticCorpus, iter_bulk_items
+from bench.fake_openai import serve_in_thread
+
+
+def percentiles(latencies_s: Sequence[float]) -> Dict[str, float]:
+    if not latencies_s:
+        return {}
+    ordered = sorted(latencies_s)
+
+    def nearest_rank(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        "p50_ms": nearest_rank(0.50),
+        "p95_ms": nearest_rank(0.95),
+        "p99_ms": nearest_rank(0.99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def run_concurrently(jobs, concurrency: int) -> List[float]:
+    """Run the zero-argument coroutine functions in `jobs`; returns each one's latency."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed(job):
+        async with semaphore:
+            start = time.perf_counter()
+            await job()
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(timed(job) for job in jobs))
+    return latencies
+
+
+async def create_bench_user() -> UUID:
+    async with SessionLocal() as db:
+        user = User(username=f"bench-{uuid.uuid4().hex[:12]}")
+        db.add(user)
+        await db.commit()
+        return UUID(str(user.id))
+
+
+async def drop_bench_user(user_id: UUID) -> None:
+    async with SessionLocal() as db:
+        await db.execute(delete(Document).where(Document.user_id == user_id))
+        await db.execute(delete(User).where(User.id == user_id))
+        await db.commit()
+
+
+async def bench_bulk(services: IngestionServices, user_id: UUID, corpus: SyntheticCorpus, args) -> dict:
+    loader = BulkLoader(services, user_id, batch_size=args.batch_size, defer_indexes=args.defer_indexes, priority="background")
+    result = await loader.run(iter_bulk_items(corpus))
+    return {
+        "documents": result.documents,
+        "chunks": result.chunks,
+        "errors": len(result.errors),
+        "elapsed_s": round(result.elapsed_ms / 1000, 3),
+        "documents_per_s": round(result.documents / (result.elapsed_ms / 1000), 1) if result.elapsed_ms else None,
+        "defer_indexes": args.defer_indexes,
+    }
+
+
+async def bench_upload(app, user_id: UUID, args) -> dict:
+    corpus = SyntheticCorpus(args.uploads, seed=args.seed + 100, words=args.upload_words)
+    documents = list(corpus.iter_documents())
+    failures = 0
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+
+        def upload(filename: str, text: str):
+            async def job():
+                nonlocal failures
+                response = await client.post(
+                    f"{settings.API_V1_STR}/documents/upload",
+                    files={"file": (filename, text.encode("utf-8"), "text/plain")},
+                    data={"user_id": str(user_id)},
+                )
+                if response.status_code != 200:
+                    failures += 1
+            return job
+
+        start = time.perf_counter()
+        latencies = await run_concurrently([upload(name, text) for name, text, _ in documents], args.concurrency)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "documents": len(documents),
+        "failures": failures,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "documents_per_s": round(len(documents) / elapsed, 1),
+        "latency": percentiles(latencies),
+    }
+
+
+async def exact_neighbours(query: List[float], user_id: UUID, k: int) -> List[UUID]:
+    async with SessionLocal() as db:
+        # No index scans: the planner has to sort every row, which is exact
+        await db.execute(sql_text("SET LOCAL enable_indexscan = off"))
+        hits = await vector_search(db, query, limit=k, user_id=user_id, index="full")
+        await db.commit()
+    return [hit.chunk_id for hit in hits]
+
+
+async def bench_search(user_id: UUID, corpus: SyntheticCorpus, args) -> List[dict]:
+    queries = corpus.queries(args.queries)
+    truth = [await exact_neighbours(query, user_id, args.k) for query in queries]
+
+    results = []
+    for index in args.indexes:
+        for ef_search in args.ef_search:
+            found: List[Optional[List[UUID]]] = [None] * len(queries)
+
+            def search(i: int):
+                async def job():
+                    async with SessionLocal() as db:
+                        hits = await vector_search(
+                            db, queries[i], limit=args.k, user_id=user_id, ef_search=ef_search, index=index
+                        )
+                        await db.commit()
+                    found[i] = [hit.chunk_id for hit in hits]
+                return job
+
+            # Warm the index into shared buffers before timing
+            await run_concurrently([search(i) for i in range(min(len(queries), 20))], args.concurrency)
+            start = time.perf_counter()
+            latencies = await run_concurrently([search(i) for i in range(len(queries))], args.concurrency)
+            elapsed = time.perf_counter() - start
+            recall = [len(set(f) & set(t)) / len(t) for f, t in zip(found, truth) if t]
+            results.append({
+                "index": index,
+                "ef_search": ef_search,
+                "k": args.k,
+                "queries": len(queries),
+                "concurrency": args.concurrency,
+                "queries_per_s": round(len(queries) / elapsed, 1),
+                "recall_at_k": round(sum(recall) / len(recall), 4) if recall else None,
+                "latency": percentiles(latencies),
+            })
+    return results
+
+
+async def environment() -> dict:
+    async with SessionLocal() as db:
+        server_version = (await db.execute(sql_text("SHOW server_version"))).scalar_one()
+        pgvector_version = (await db.execute(
+            sql_text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+        )).scalar_one_or_none()
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "git_commit": commit,
+        "postgres": server_version,
+        "pgvector": pgvector_version,
+    }
+
+
+async def main(args: argparse.Namespace) -> dict:
+    base_url, fake_server = serve_in_thread(latency_ms=args.embedding_latency_ms)
+    settings.OPENAI_BASE_URL = base_url
+    settings.INGESTION_WORKERS = 0
+    # Measure the ANN index rather than the small-tenant exact scan
+    settings.SEARCH_EXACT_MAX_CHUNKS = args.exact_max_chunks
+
+    from main import create_app
+
+    app = create_app()
+
+    await start_services(app.state, run_workers=False)
+    services = IngestionServices(app.state.embedding_service, app.state.embedding_cache, app.state.extraction_pool)
+    corpus = SyntheticCorpus(args.documents, seed=args.seed)
+    user_id = args.user_id or await create_bench_user()
+    report = {"environment": await environment(), "arguments": {k: str(v) if isinstance(v, UUID) else v for k, v in vars(args).items()}}
+    try:
+        if "bulk" in args.scenarios and args.user_id is None:
+            report["bulk"] = await bench_bulk(services, user_id, corpus, args)
+        if "search" in args.scenarios:
+            report["search"] = await bench_search(user_id, corpus, args)
+        if "upload" in args.scenarios:
+            upload_user = await create_bench_user()
+            try:
+                report["upload"] = await bench_upload(app, upload_user, args)
+            finally:
+                await drop_bench_user(upload_user)
+        report["embedding_cache"] = app.state.embedding_cache.stats() if app.state.embedding_cache else None
+    finally:
+        if args.user_id is None and not args.keep:
+            await drop_bench_user(user_id)
+        elif args.user_id is None:
+            report["corpus_user_id"] = str(user_id)
+        await stop_services(app.state)
+        fake_server.should_exit = True
+    return report
+
+
+def parse_list(cast):
+    return lambda value: [cast(item) for item in value.split(",") if item]
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=parse_list(str), default=["bulk", "search", "upload"], help="Comma-separated: bulk,search,upload")
+    parser.add_argument("--documents", type=int, default=10_000, help="Corpus size, e.g. 10000, 100000 or 1000000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--user-id", type=UUID, help="Search a corpus kept by an earlier run (--keep) instead of loading one")
+    parser.add_argument("--keep", action="store_true", help="Keep the loaded corpus and print its user id")
+    parser.add_argument("--batch-size", type=int, default=settings.BULK_BATCH_SIZE)
+    parser.add_argument("--defer-indexes", action="store_true")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--ef-search", type=parse_list(int), default=[20, 40, 100, 200])
+    parser.add_argument("--indexes", type=parse_list(str), default=["full"], help="Comma-separated: full,halfvec,binary")
+    parser.add_argument("--exact-max-chunks", type=int, default=0, help="SEARCH_EXACT_MAX_CHUNKS during the run")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--uploads", type=int, default=200, help="Documents sent through POST /documents/upload")
+    parser.add_argument("--upload-words", type=int, default=2000)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0, help="Simulated embedding API latency")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args))
+    rendered = json.dumps(report, indent=2, default=str)
+    print(rendered)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(rendered + "\n")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,192 @@
+"""
+Command-line entry points.
+
+    cd server && python cli.py bulk-load corpus.ndjson --user-id <uuid> --defer-indexes
+    cd server && python cli.py vector-indexes --drop-unused
+    cd server && python cli.py vector-indexes --metric l2
+    cd server && python cli.py measure-recall --index binary
+    cd server && python cli.py reembed --model text-embedding-3-small --dim 1536 --flip
+"""
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import asdict
+from types import SimpleNamespace
+from uuid import UUID
+
+from sqlalchemy import text as sql_text
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.lifespan import start_services, stop_services
+from app.schemas import ReembeddingRunResponse
+from app.services.bulk import BulkLoader, iter_ndjson_items, iter_zip_items
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embeddings import EmbeddingService
+from app.services.ingestion import IngestionServices
+from app.services.reembedding import (
+    ReembeddingError,
+    ReembeddingJob,
+    abandon_run,
+    create_run,
+    flip_run,
+    latest_run,
+    target_settings,
+)
+from app.services.search import CHUNK_ANN_INDEXES, CHUNK_METRIC_INDEXES, DISTANCE_METRICS, SearchPlanError, measure_recall
+
+
+async def bulk_load(args: argparse.Namespace) -> None:
+    state = SimpleNamespace()
+    await start_services(state, run_workers=False)
+    services = IngestionServices(state.embedding_service, state.embedding_cache, state.extraction_pool)
+    try:
+        with open(args.path, "rb") as fileobj:
+            is_zip = args.format == "zip" or (args.format is None and args.path.lower().endswith(".zip"))
+            items = iter_zip_items(fileobj, services) if is_zip else iter_ndjson_items(fileobj)
+            # A load runs for a while anyway: wait for rate limit budget rather than fail
+            loader = BulkLoader(
+                services,
+                args.user_id,
+                batch_size=args.batch_size,
+                defer_indexes=args.defer_indexes,
+                priority="background",
+            )
+            result = await loader.run(items)
+    finally:
+        await stop_services(state)
+    print(json.dumps(asdict(result), indent=2))
+
+
+async def vector_indexes(args: argparse.Namespace) -> None:
+    """
+    Create the ANN index VECTOR_SEARCH_INDEX queries, optionally dropping the
+    others, or with --metric the full-precision index for another metric.
+    """
+    if args.metric == "cosine":
+        name, definition = CHUNK_ANN_INDEXES[settings.VECTOR_SEARCH_INDEX]
+        unused = [other for other, _ in CHUNK_ANN_INDEXES.values() if other != name]
+    else:
+        name, definition = CHUNK_METRIC_INDEXES[args.metric]
+        unused = []
+    async with SessionLocal() as db:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn = await db.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+        await conn.execute(sql_text(f"SET maintenance_work_mem = '{settings.BULK_INDEX_MAINTENANCE_WORK_MEM}'"))
+        await conn.execute(sql_text(definition.format(concurrently="CONCURRENTLY IF NOT EXISTS", dim=settings.EMBEDDING_DIM)))
+        if args.drop_unused:
+            for other in unused:
+                await conn.execute(sql_text(f"DROP INDEX CONCURRENTLY IF EXISTS {other}"))
+        rows = (await conn.execute(sql_text(
+            "SELECT indexname, pg_size_pretty(pg_relation_size(indexname::regclass)) AS size "
+            "FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'document_chunks'"
+        ))).all()
+    print(json.dumps({row.indexname: row.size for row in rows}, indent=2))
+
+
+async def recall(args: argparse.Namespace) -> None:
+    index = args.index or settings.VECTOR_SEARCH_INDEX
+    async with SessionLocal() as db:
+        try:
+            value = await measure_recall(db, index=index, k=args.k, sample_size=args.sample_size, metric=args.metric)
+        except SearchPlanError as e:
+            sys.exit(str(e))
+    target = settings.VECTOR_RECALL_TARGET
+    print(json.dumps({"index": index, "metric": args.metric, "k": args.k, "recall": round(value, 4), "target": target}, indent=2))
+    if value < target:
+        sys.exit(1)
+
+
+def print_run(run) -> None:
+    print(ReembeddingRunResponse.model_validate(run).model_dump_json(indent=2))
+
+
+async def reembed(args: argparse.Namespace) -> None:
+    """Re-embed every document in the foreground; resumes an interrupted run with the same target."""
+    async with SessionLocal() as db:
+        run = await latest_run(db)
+        if args.status or args.abandon:
+            if run is None:
+                sys.exit("No re-embedding run.")
+            if args.abandon:
+                await abandon_run(db, run.id)
+            print_run(run)
+            return
+        try:
+            run = await create_run(
+                db,
+                provider=args.provider or settings.EMBEDDING_PROVIDER,
+                model=args.model or settings.EMBEDDING_MODEL,
+                dim=args.dim or settings.EMBEDDING_DIM,
+                tokens_per_s=args.tokens_per_s,
+            )
+        except ReembeddingError as e:
+            sys.exit(e.detail)
+
+    cache = EmbeddingCache.from_settings(settings) if settings.EMBEDDING_CACHE_ENABLED else None
+    service = EmbeddingService.from_settings(target_settings(settings, run))
+    await service.start()
+    try:
+        # Documents ingested between completion and the flip send the run
+        # back for another short catch-up pass
+        for _ in range(args.flip_attempts):
+            if run.status != "completed":
+                run = await ReembeddingJob.from_settings(settings, run.id, service, cache).run()
+            if not args.flip or run.status != "completed":
+                break
+            async with SessionLocal() as db:
+                try:
+                    run = await flip_run(db, run.id)
+                    break
+                except ReembeddingError as e:
+                    print(e.detail, file=sys.stderr)
+                    run = await latest_run(db)
+    finally:
+        await service.close()
+    print_run(run)
+    if run.status not in ("completed", "flipped"):
+        sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="cli.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bulk = commands.add_parser("bulk-load", help="Load an NDJSON file or zip archive of documents with COPY")
+    bulk.add_argument("path")
+    bulk.add_argument("--user-id", type=UUID, required=True)
+    bulk.add_argument("--format", choices=["ndjson", "zip"])
+    bulk.add_argument("--batch-size", type=int, default=settings.BULK_BATCH_SIZE)
+    bulk.add_argument("--defer-indexes", action="store_true", help="Drop ANN indexes during the load and rebuild them after")
+    bulk.set_defaults(handler=bulk_load)
+
+    indexes = commands.add_parser("vector-indexes", help="Build the chunk ANN index selected by VECTOR_SEARCH_INDEX")
+    indexes.add_argument("--drop-unused", action="store_true", help="Drop the chunk ANN indexes other modes would use")
+    indexes.add_argument("--metric", choices=sorted(DISTANCE_METRICS), default="cosine", help="Build the l2 or inner_product index instead")
+    indexes.set_defaults(handler=vector_indexes)
+
+    measure = commands.add_parser("measure-recall", help="Recall@k of a vector index against exact search; exits 1 below VECTOR_RECALL_TARGET")
+    measure.add_argument("--index", choices=sorted(CHUNK_ANN_INDEXES))
+    measure.add_argument("-k", type=int, default=10)
+    measure.add_argument("--sample-size", type=int, default=50)
+    measure.add_argument("--metric", choices=sorted(DISTANCE_METRICS), default="cosine")
+    measure.set_defaults(handler=recall)
+
+    reembedding = commands.add_parser("reembed", help="Re-embed all documents into shadow columns, resumably, then optionally flip them in")
+    reembedding.add_argument("--provider", help="Target provider (default EMBEDDING_PROVIDER)")
+    reembedding.add_argument("--model", help="Target model (default EMBEDDING_MODEL)")
+    reembedding.add_argument("--dim", type=int, help="Target dimension (default EMBEDDING_DIM)")
+    reembedding.add_argument("--tokens-per-s", type=int, help="Embedding budget (default REEMBED_TOKENS_PER_S; 0 = unthrottled)")
+    reembedding.add_argument("--flip", action="store_true", help="Swap the new vectors in once complete")
+    reembedding.add_argument("--flip-attempts", type=int, default=3)
+    reembedding.add_argument("--status", action="store_true", help="Print the latest run and exit")
+    reembedding.add_argument("--abandon", action="store_true", help="Abandon the open run and drop its shadow columns")
+    reembedding.set_defaults(handler=reembed)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,91 @@
+import time
+
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.core.config import settings
-from app.routes import users, chats, messages, documents
-
-app = FastAPI(
-    title=settings.PROJECT_NAME,
-    version=settings.VERSION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
-)
-
-# Set CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include routers with proper prefixes
-app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
-app.include_router(chats.router, prefix=f"{settings.API_V1_STR}/chats", tags=["chats"])
-app.include_router(messages.router, prefix=f"{settings.API_V1_STR}/messages", tags=["messages"])
-app.include_router(documents.router, prefix=f"{settings.API_V1_STR}/documents", tags=["documents"])
-
-@app.get("/")
-def read_root():
-    return {
-        "name": settings.PROJECT_NAME,
-        "version": settings.VERSION,
-        "docs": "/docs",
-        "redoc": "/redoc"
-    }
\ No newline at end of file
+from app.core.lifespan import start_services, stop_services
+from app.core.metrics import REGISTRY, MetricsMiddleware
+from app.core.middleware import MaxBodySizeMiddleware
+from app.core.startup import StartupReport
+from app.routes import users, chats, messages, documents, system
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Engine, clients and worker pools are built here, not at import time
+    await start_services(app.state, report=app.state.startup_report)
+    yield
+    await stop_services(app.state)
+
+
+def create_app() -> FastAPI:
+    """
+    Build the application. Creating it opens no connections and reads no
+    environment beyond the settings; that all happens in `lifespan`:
+
+        uvicorn main:create_app --factory
+    """
+    app = FastAPI(
+        title=settings.PROJECT_NAME,
+        version=settings.VERSION,
+        openapi_url=f"{settings.API_V1_STR}/openapi.json",
+        lifespan=lifespan
+    )
+    app.state.startup_report = StartupReport()
+    app.state.startup_report.record("import", IMPORT_SECONDS)
+
+    # Set CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # In production, replace with specific origins
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Reject oversized uploads before the multipart body is parsed (one chunk of
+    # slack for the multipart framing; the spooler enforces the exact file limit)
+    app.add_middleware(
+        MaxBodySizeMiddleware,
+        max_bytes=settings.MAX_UPLOAD_BYTES + settings.UPLOAD_CHUNK_BYTES,
+        paths=[f"{settings.API_V1_STR}/documents/upload"],
+    )
+    app.add_middleware(
+        MaxBodySizeMiddleware,
+        max_bytes=settings.BULK_MAX_UPLOAD_BYTES + settings.UPLOAD_CHUNK_BYTES,
+        paths=[f"{settings.API_V1_STR}/documents/bulk"],
+    )
+
+    # Added last so it wraps everything, including requests rejected above
+    app.add_middleware(MetricsMiddleware, paths=lambda: app.openapi()["paths"])
+
+    # Include routers with proper prefixes
+    app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
+    app.include_router(chats.router, prefix=f"{settings.API_V1_STR}/chats", tags=["chats"])
+    app.include_router(messages.router, prefix=f"{settings.API_V1_STR}/messages", tags=["messages"])
+    app.include_router(documents.router, prefix=f"{settings.API_V1_STR}/documents", tags=["documents"])
+    app.include_router(system.router, prefix=f"{settings.API_V1_STR}/system", tags=["system"])
+
+    @app.get("/")
+    def read_root():
+        return {
+            "name": settings.PROJECT_NAME,
+            "version": settings.VERSION,
+            "docs": "/docs",
+            "redoc": "/redoc"
+        }
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    return app
+
@@ -0,0 +1,4 @@
+import os
+
+# Settings are built on first use; unit tests never connect to the database
+os.environ.setdefault("DATABASE_URL", "postgresql://postgres@localhost:5432/postgres")
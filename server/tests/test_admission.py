@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected, TokenBucket
+
+
+def test_bucket_refills_at_its_rate():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    assert bucket.wait_time(1, now) == 0
+    bucket.take(60, now)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1) == pytest.approx(0.0)
+    assert bucket.wait_time(1, now + 1, ahead=2) == pytest.approx(2.0)
+
+
+def test_oversized_call_only_needs_a_full_bucket_and_leaves_debt():
+    bucket = TokenBucket(60)
+    now = bucket.updated
+    assert bucket.wait_time(120, now) == 0
+    bucket.take(120, now)
+    assert bucket.wait_time(1, now) == pytest.approx(61.0)
+
+
+def test_rejects_when_the_wait_exceeds_max_wait():
+    async def main():
+        controller = AdmissionController("test", rpm=60, max_wait={"interactive": 0.5})
+        await controller.acquire(60, 0, priority="interactive")
+        with pytest.raises(AdmissionRejected) as error:
+            await controller.acquire(1, 0, priority="interactive")
+        return controller, error.value
+
+    controller, error = asyncio.run(main())
+    assert error.limit == "provider rpm"
+    assert error.retry_after == pytest.approx(1.0, abs=0.1)
+    assert controller.rejected["interactive"] == 1
+    assert controller.admitted["interactive"] == 1
+
+
+def test_user_budget_is_separate():
+    async def main():
+        controller = AdmissionController("test", user_tpm=60, max_wait={"bulk": 0.5})
+        alice, bob = uuid.uuid4(), uuid.uuid4()
+        await controller.acquire(1, 60, user_id=alice)
+        with pytest.raises(AdmissionRejected) as error:
+            await controller.acquire(1, 10, user_id=alice)
+        await controller.acquire(1, 60, user_id=bob)
+        return error.value
+
+    assert asyncio.run(main()).limit == "user tpm"
+
+
+def test_waiters_are_admitted_by_priority():
+    async def main():
+        controller = AdmissionController("test", rpm=600, max_wait={"interactive": None, "bulk": None})
+        await controller.acquire(600, 0, priority="background")
+        admitted = []
+
+        async def call(priority):
+            await controller.acquire(1, 0, priority=priority)
+            admitted.append(priority)
+
+        tasks = []
+        # Lowest priority first, so each later caller has to overtake
+        for priority in ("background", "bulk", "interactive"):
+            tasks.append(asyncio.create_task(call(priority)))
+            await asyncio.sleep(0)
+        assert controller.depth == {"interactive": 1, "bulk": 1, "background": 1}
+        await asyncio.wait_for(asyncio.gather(*tasks), 5)
+        return controller, admitted
+
+    controller, admitted = asyncio.run(main())
+    assert admitted == ["interactive", "bulk", "background"]
+    assert controller.depth == {"interactive": 0, "bulk": 0, "background": 0}
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        asyncio.run(AdmissionController("test").acquire(1, 1, priority="urgent"))
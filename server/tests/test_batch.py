@@ -0,0 +1,89 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.database import get_db
+from app.routes import messages
+from app.services.message_embeddings import get_message_embedder
+
+CHAT_ID = uuid.uuid4()
+
+
+class FakeSession:
+    """Knows one chat; the batch read finds whichever rows are in `rows`."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.commits = 0
+
+    async def execute(self, statement):
+        if statement.column_descriptions[0]["name"] == "id":
+            return SimpleNamespace(scalars=lambda: [CHAT_ID])
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: self.rows))
+
+    async def commit(self):
+        self.commits += 1
+
+
+def stored(**fields):
+    return SimpleNamespace(id=uuid.uuid4(), created_at=datetime.now(timezone.utc), **fields)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    inserted = []
+
+    async def insert_messages(db, items):
+        inserted.extend(items)
+        return [stored(chat_id=item.chat_id, role=item.role, content=item.content) for item in items]
+
+    monkeypatch.setattr(messages, "insert_messages", insert_messages)
+    app = FastAPI()
+    app.include_router(messages.router, prefix="/messages")
+    app.dependency_overrides[get_message_embedder] = lambda: None
+    app.state.inserted = inserted
+    return app
+
+
+def test_batch_write_creates_the_valid_items_and_reports_the_rest(app):
+    db = FakeSession()
+    app.dependency_overrides[get_db] = lambda: db
+    response = TestClient(app).post("/messages/batch", json={"messages": [
+        {"chat_id": str(CHAT_ID), "role": "user", "content": "first"},
+        {"chat_id": str(CHAT_ID), "role": "user"},
+        {"chat_id": str(uuid.uuid4()), "role": "user", "content": "orphan"},
+        {"chat_id": str(CHAT_ID), "role": "assistant", "content": "second"},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["content"] for item in body["items"]] == ["first", "second"]
+    assert [error["ref"] for error in body["errors"]] == ["messages[1]", "messages[2]"]
+    assert body["errors"][0]["error"].startswith("content:")
+    assert body["errors"][1]["error"] == "Chat not found"
+    assert [item.content for item in app.state.inserted] == ["first", "second"]
+    assert db.commits == 1
+
+
+def test_batch_write_with_no_valid_items_writes_nothing(app):
+    db = FakeSession()
+    app.dependency_overrides[get_db] = lambda: db
+    response = TestClient(app).post("/messages/batch", json={"messages": [{"role": "user"}]})
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+    assert app.state.inserted == [] and db.commits == 0
+
+
+def test_batch_read_reports_missing_and_malformed_ids(app):
+    found = stored(chat_id=CHAT_ID, role="user", content="hi")
+    missing = uuid.uuid4()
+    app.dependency_overrides[get_db] = lambda: FakeSession([found])
+    response = TestClient(app).get("/messages/", params={"ids": f"{missing},not-a-uuid,{found.id}"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == [str(found.id)]
+    assert body["missing"] == [str(missing)]
+    assert body["errors"] == [{"ref": "not-a-uuid", "error": "Not a valid UUID."}]
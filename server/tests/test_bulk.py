@@ -0,0 +1,53 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+from app.core.config import get_settings
+from app.services.bulk import BulkError, BulkItem, iter_ndjson_items, iter_zip_items
+from app.services.uploads import UploadTooLarge, spool_fileobj
+
+
+async def collect(items):
+    return [item async for item in items]
+
+
+def test_ndjson_bad_line_is_a_per_item_error():
+    body = b'{"filename": "a.txt", "content": "alpha"}\nnot json\n\n{"filename": "b.txt", "content": "beta"}\n'
+    items = asyncio.run(collect(iter_ndjson_items(io.BytesIO(body))))
+    assert [type(item) for item in items] == [BulkItem, BulkError, BulkItem]
+    assert items[1].ref == "line 2"
+    assert [item.filename for item in items if isinstance(item, BulkItem)] == ["a.txt", "b.txt"]
+
+
+def test_ndjson_embedding_of_the_wrong_size_is_rejected():
+    body = b'{"filename": "a.txt", "content": "alpha", "embedding": [0.1, 0.2]}\n'
+    [item] = asyncio.run(collect(iter_ndjson_items(io.BytesIO(body))))
+    assert isinstance(item, BulkError)
+    assert "dimensions" in item.error
+
+
+def test_zip_member_over_the_upload_limit_is_not_extracted(monkeypatch):
+    monkeypatch.setattr(get_settings(), "MAX_UPLOAD_BYTES", 16)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("big.txt", "a" * 10_000)
+        archive.writestr("image.bin", b"\x00")
+    buf.seek(0)
+
+    # No extraction pool: neither member may reach it
+    items = asyncio.run(collect(iter_zip_items(buf, services=None)))
+    assert [(item.ref, type(item)) for item in items] == [("big.txt", BulkError), ("image.bin", BulkError)]
+    assert "byte limit" in items[0].error
+
+
+def test_spool_fileobj_enforces_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "UPLOAD_SPOOL_DIR", str(tmp_path))
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_fileobj(io.BytesIO(b"a" * 100), max_bytes=10, chunk_size=8))
+    assert list(tmp_path.iterdir()) == []
+
+    upload = asyncio.run(spool_fileobj(io.BytesIO(b"a" * 10), max_bytes=10, chunk_size=8))
+    assert upload.size == 10
+    upload.close()
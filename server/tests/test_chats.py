@@ -0,0 +1,140 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.database import get_db
+from app.models.models import Chat, Message
+from app.routes import chats
+from app.services.admission import AdmissionRejected
+from app.services.chat import get_chat_service
+from app.services.embedding_cache import get_embedding_cache
+from app.services.embeddings import get_embedding_service
+from app.services.message_embeddings import RecalledMessage, get_message_embedder
+from app.services.search import SearchHit
+
+USER_ID = uuid.uuid4()
+
+
+class FakeSession:
+    """Stores added messages in `stored` and has an empty history."""
+
+    def __init__(self, stored):
+        self.stored = stored
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, model, id):
+        assert model is Chat
+        return SimpleNamespace(id=id, user_id=USER_ID)
+
+    async def execute(self, statement):
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: []))
+
+    def add(self, obj):
+        obj.id = uuid.uuid4()
+        self.stored.append(obj)
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, obj):
+        pass
+
+
+class StubChatService:
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.prompts = []
+
+    async def stream(self, messages):
+        self.prompts.append(messages)
+        for delta in self.deltas:
+            yield delta
+
+
+@pytest.fixture
+def chat_app(monkeypatch):
+    stored = []
+    chat_service = StubChatService(["Hello", ", world"])
+    recalled = RecalledMessage(
+        id=uuid.uuid4(), chat_id=uuid.uuid4(), role="user", content="earlier", created_at=datetime.now(timezone.utc), distance=0.2
+    )
+    hit = SearchHit(chunk_id=uuid.uuid4(), chunk_index=0, content="excerpt", document_id=uuid.uuid4(), filename="a.txt", distance=0.1)
+
+    async def embed_query(db, service, cache, text, user_id=None):
+        return [1.0, 0.0]
+
+    async def vector_search(db, query_vector, limit, user_id=None):
+        return [hit]
+
+    async def recall_messages(db, chat_id, query_vector, limit):
+        return [recalled]
+
+    monkeypatch.setattr(chats, "SessionLocal", lambda: FakeSession(stored))
+    monkeypatch.setattr(chats, "embed_query", embed_query)
+    monkeypatch.setattr(chats, "vector_search", vector_search)
+    monkeypatch.setattr(chats, "recall_messages", recall_messages)
+
+    async def db():
+        yield FakeSession(stored)
+
+    app = FastAPI()
+    app.include_router(chats.router, prefix="/chats")
+    app.dependency_overrides[get_db] = db
+    app.dependency_overrides[get_chat_service] = lambda: chat_service
+    app.dependency_overrides[get_embedding_service] = lambda: None
+    app.dependency_overrides[get_embedding_cache] = lambda: None
+    app.dependency_overrides[get_message_embedder] = lambda: None
+    return SimpleNamespace(client=TestClient(app), stored=stored, chat_service=chat_service, hit=hit, recalled=recalled)
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event"), json.loads(fields["data"])))
+    return events
+
+
+def test_completion_streams_context_recall_tokens_and_done(chat_app):
+    response = chat_app.client.post(f"/chats/{uuid.uuid4()}/completions", json={"content": "question", "recall": 1})
+    assert response.status_code == 200
+    events = parse_events(response.text)
+    assert [name for name, _ in events] == ["context", "recall", None, None, "done"]
+    assert events[0][1][0]["chunk_id"] == str(chat_app.hit.chunk_id)
+    assert events[1][1][0]["message_id"] == str(chat_app.recalled.id)
+    assert [data["delta"] for name, data in events if name is None] == ["Hello", ", world"]
+
+    user_message, assistant_message = chat_app.stored
+    assert isinstance(assistant_message, Message)
+    assert (user_message.role, user_message.content) == ("user", "question")
+    assert (assistant_message.role, assistant_message.content) == ("assistant", "Hello, world")
+    done = events[-1][1]
+    assert done["user_message_id"] == str(user_message.id)
+    assert done["assistant_message_id"] == str(assistant_message.id)
+    assert "time_to_first_token" in done["timings"]
+
+    [prompt] = chat_app.chat_service.prompts
+    assert "excerpt" in prompt[0]["content"] and "earlier" in prompt[0]["content"]
+    assert prompt[-1] == {"role": "user", "content": "question"}
+
+
+def test_rejected_completion_stores_no_message(chat_app, monkeypatch):
+    async def embed_query(db, service, cache, text, user_id=None):
+        raise AdmissionRejected(retry_after=2.5, limit="user")
+
+    monkeypatch.setattr(chats, "embed_query", embed_query)
+    response = chat_app.client.post(f"/chats/{uuid.uuid4()}/completions", json={"content": "question"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
+    assert chat_app.stored == []
+    assert chat_app.chat_service.prompts == []
@@ -0,0 +1,50 @@
+import sys
+
+import pytest
+
+from app.services.chunking import iter_chunks
+
+
+def contents(chunks):
+    return [chunk.content for chunk in chunks]
+
+
+def test_char_chunks_overlap():
+    assert contents(iter_chunks("abcdefghij", size=4, overlap=1, unit="chars")) == ["abcd", "defg", "ghij"]
+
+
+def test_char_chunks_without_overlap_keep_the_tail():
+    assert contents(iter_chunks("abcdefghij", size=4, overlap=0, unit="chars")) == ["abcd", "efgh", "ij"]
+
+
+def test_blank_chunks_are_skipped_and_indexes_stay_contiguous():
+    chunks = list(iter_chunks("ab    cd", size=2, overlap=0, unit="chars"))
+    assert [(chunk.index, chunk.content) for chunk in chunks] == [(0, "ab"), (1, "cd")]
+
+
+def test_word_chunks_without_tiktoken(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tiktoken", None)
+    text = "one two three four five six seven"
+    assert contents(iter_chunks(text, size=3, overlap=1, unit="tokens")) == [
+        "one two three",
+        "three four five",
+        "five six seven",
+    ]
+
+
+def test_word_chunks_keep_line_breaks(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tiktoken", None)
+    assert contents(iter_chunks("first line\nsecond line", size=10, overlap=0, unit="tokens")) == [
+        "first line\nsecond line"
+    ]
+
+
+@pytest.mark.parametrize("size, overlap", [(-1, 0), (4, 4), (4, -1)])
+def test_invalid_window(size, overlap):
+    with pytest.raises(ValueError):
+        list(iter_chunks("text", size=size, overlap=overlap, unit="chars"))
+
+
+def test_unknown_unit():
+    with pytest.raises(ValueError):
+        list(iter_chunks("text", size=4, overlap=0, unit="lines"))
@@ -0,0 +1,84 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.services import embedding_cache
+from app.services.embedding_cache import EmbeddingCache, content_hash, embed_with_cache
+from app.services.embeddings import EmbeddingResult
+
+
+class FakeService:
+    model = "fake-v1"
+    dim = 2
+
+    def __init__(self):
+        self.calls = []
+
+    async def embed(self, texts, user_id=None, priority="bulk"):
+        self.calls.append(list(texts))
+        return EmbeddingResult(vectors=[[float(len(text)), 1.0] for text in texts], tokens=len(texts))
+
+
+class FakeSession:
+    """The embedding_cache table as a list of (content_hash, embedding) rows."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.inserts = 0
+
+    async def execute(self, statement):
+        if statement.is_insert:
+            self.inserts += 1
+        return SimpleNamespace(all=lambda: self.rows)
+
+
+def test_repeated_texts_are_embedded_once():
+    cache, service, db = EmbeddingCache(), FakeService(), FakeSession()
+
+    async def main():
+        first = await embed_with_cache(db, service, cache, ["a", "bb", "a"])
+        second = await embed_with_cache(db, service, cache, ["bb", "ccc"])
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert service.calls == [["a", "bb"], ["ccc"]]
+    assert first.vectors == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert (first.cache_hits, second.cache_hits) == (0, 1)
+    assert second.cached == [True, False]
+    assert second.tokens == 1
+    assert cache.stats()["memory_hits"] == 1
+    assert db.inserts == 2
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    cache = EmbeddingCache(max_entries=2)
+    keys = [(content_hash(text), "fake-v1", 2) for text in ["a", "b", "c"]]
+    db = FakeSession()
+
+    async def main():
+        await cache.put_many(db, {keys[0]: [1.0, 0.0], keys[1]: [0.0, 1.0]})
+        await cache.get_many(db, [keys[0]])
+        await cache.put_many(db, {keys[2]: [1.0, 1.0]})
+        return await cache.get_many(db, keys)
+
+    found = asyncio.run(main())
+    assert set(found) == {keys[0], keys[2]}
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_memory_entries_fall_back_to_the_table(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(embedding_cache.time, "monotonic", lambda: now[0])
+    cache = EmbeddingCache(ttl_seconds=60)
+    key = (content_hash("a"), "fake-v1", 2)
+    db = FakeSession([(key[0], [1.0, 0.0])])
+
+    async def main():
+        await cache.put_many(db, {key: [1.0, 0.0]})
+        await cache.get_many(db, [key])
+        now[0] += 61
+        return await cache.get_many(db, [key])
+
+    assert asyncio.run(main()) == {key: [1.0, 0.0]}
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["db_hits"], stats["evictions"]) == (1, 1, 1)
@@ -0,0 +1,29 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.embedding_providers import EmbeddingProvider, HashingProvider
+
+
+def test_hashing_provider_is_deterministic():
+    texts = ["Postgres stores the vectors", "an unrelated sentence about cooking"]
+    first = asyncio.run(HashingProvider(64).embed(texts)).vectors
+    second = asyncio.run(HashingProvider(64).embed(texts)).vectors
+    assert first == second
+    assert np.linalg.norm(first, axis=1) == pytest.approx([1.0, 1.0])
+
+
+def test_hashing_provider_places_shared_vocabulary_closer():
+    vectors = np.array(asyncio.run(HashingProvider(256).embed([
+        "vector search in postgres",
+        "postgres vector search with an index",
+        "baking bread at home",
+    ])).vectors)
+    similarity = vectors @ vectors.T
+    assert similarity[0, 1] > similarity[0, 2]
+
+
+def test_providers_must_implement_embed():
+    with pytest.raises(TypeError):
+        EmbeddingProvider("model", 8)
@@ -0,0 +1,120 @@
+import asyncio
+from typing import List
+
+import numpy as np
+import pytest
+
+from app.services.embedding_providers import EmbeddingProvider, EmbeddingResult, OpenAIProvider
+from app.services.embeddings import EmbeddingService, EmbeddingSpaceChanged
+
+
+class Flaky(Exception):
+    pass
+
+
+class RecordingProvider(EmbeddingProvider):
+    """Embeds a text as [len(text), 1] and remembers every batch it was sent."""
+
+    name = "recording"
+    retryable_errors = (Flaky,)
+
+    def __init__(self, failures: int = 0, error: Exception = Flaky()):
+        super().__init__("recording-v1", 2)
+        self.batches: List[List[str]] = []
+        self.failures = failures
+        self.error = error
+
+    async def embed(self, texts: List[str]) -> EmbeddingResult:
+        self.batches.append(list(texts))
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        return EmbeddingResult(vectors=[[float(len(text)), 1.0] for text in texts], tokens=10 * len(texts))
+
+
+def run_with_service(provider, test, **kwargs):
+    async def main():
+        service = EmbeddingService(provider, retry_backoff=0, **kwargs)
+        await service.start()
+        try:
+            return await test(service)
+        finally:
+            await service.close()
+
+    return asyncio.run(main())
+
+
+def test_batches_are_split_by_size():
+    provider = RecordingProvider()
+    texts = [f"text {'x' * i}" for i in range(7)]
+    result = run_with_service(provider, lambda service: service.embed(texts), max_batch_size=3)
+    assert [len(batch) for batch in provider.batches] == [3, 3, 1]
+    assert result.vectors == [[float(len(text)), 1.0] for text in texts]
+    assert result.tokens == 70
+
+
+def test_batches_are_split_by_estimated_tokens():
+    provider = RecordingProvider()
+    # 20 characters is estimated at 5 tokens
+    texts = ["a" * 20, "b" * 20, "c" * 20]
+    run_with_service(provider, lambda service: service.embed(texts), max_batch_tokens=10)
+    assert provider.batches == [texts[:2], texts[2:]]
+
+
+def test_concurrent_callers_share_a_batch():
+    provider = RecordingProvider()
+
+    async def test(service):
+        return await asyncio.gather(service.embed(["a", "bb"]), service.embed(["ccc"]))
+
+    first, second = run_with_service(provider, test, max_wait_ms=50)
+    assert provider.batches == [["a", "bb", "ccc"]]
+    assert first.vectors == [[1.0, 1.0], [2.0, 1.0]]
+    assert second.vectors == [[3.0, 1.0]]
+    # Usage is split by each caller's share of the estimated tokens
+    assert first.tokens + second.tokens == 30
+
+
+def test_retryable_errors_are_retried():
+    provider = RecordingProvider(failures=2)
+    result = run_with_service(provider, lambda service: service.embed(["a"]), max_retries=2)
+    assert len(provider.batches) == 3
+    assert result.vectors == [[1.0, 1.0]]
+
+
+def test_other_errors_fail_the_callers():
+    provider = RecordingProvider(failures=1, error=RuntimeError("bad input"))
+    with pytest.raises(RuntimeError, match="bad input"):
+        run_with_service(provider, lambda service: service.embed(["a"]))
+    assert len(provider.batches) == 1
+
+
+def test_blocked_service_refuses():
+    async def test(service):
+        service.blocked = "Vectors were re-embedded into another dimension."
+        await service.embed(["a"])
+
+    with pytest.raises(EmbeddingSpaceChanged):
+        run_with_service(RecordingProvider(), test)
+
+
+def test_openai_provider_against_the_fake_server():
+    from openai import AsyncOpenAI
+
+    from bench.fake_openai import fake_embedding, serve_in_thread
+
+    base_url, server = serve_in_thread(dim=8)
+
+    async def main():
+        provider = OpenAIProvider(AsyncOpenAI(api_key="test", base_url=base_url, max_retries=0), "fake-model", 8)
+        try:
+            return await provider.embed(["first text", "second"])
+        finally:
+            await provider.close()
+
+    try:
+        result = asyncio.run(main())
+    finally:
+        server.should_exit = True
+    assert np.allclose(result.vectors, [fake_embedding("first text", 8), fake_embedding("second", 8)])
+    assert result.tokens == 3
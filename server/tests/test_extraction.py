@@ -0,0 +1,87 @@
+import asyncio
+import os
+import threading
+import time
+from typing import List
+
+import pytest
+
+from app.services.extraction import (
+    DocxExtractor,
+    ExtractionError,
+    ExtractionPool,
+    Extractor,
+    PdfExtractor,
+    TextExtractor,
+    get_extractor,
+)
+
+
+class SlowExtractor(Extractor):
+    """Hangs on the first page, crashes its worker on the second."""
+
+    def extract_pages(self, path: str, start: int, stop: int) -> List[str]:
+        if path == "hang":
+            time.sleep(60)
+        if path == "crash":
+            os._exit(1)
+        return [f"{path} {start}"]
+
+
+class ThreadRecordingExtractor(TextExtractor):
+    def extract_pages(self, path: str, start: int, stop: int) -> List[str]:
+        return [threading.current_thread().name]
+
+
+@pytest.mark.parametrize(
+    "content_type, filename, expected",
+    [
+        ("application/pdf", None, PdfExtractor),
+        ("text/plain", "notes.pdf", TextExtractor),
+        (None, "Report.DOCX", DocxExtractor),
+        ("application/octet-stream", "notes.txt", TextExtractor),
+    ],
+)
+def test_extractor_is_chosen_by_content_type_then_extension(content_type, filename, expected):
+    assert isinstance(get_extractor(content_type, filename), expected)
+
+
+def test_unsupported_files_have_no_extractor():
+    assert get_extractor("image/png", "photo.png") is None
+    assert get_extractor(None, None) is None
+
+
+def test_extractors_must_implement_extract_pages():
+    with pytest.raises(TypeError):
+        Extractor()
+
+
+def test_text_extractor_runs_off_the_event_loop(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("hello")
+
+    async def main():
+        # Never started: in-process extractors do not need the workers
+        pool = ExtractionPool(max_workers=1)
+        text = [page async for page in pool.iter_pages(TextExtractor(), str(path))]
+        thread = [page async for page in pool.iter_pages(ThreadRecordingExtractor(), str(path))]
+        return text, thread
+
+    text, [thread] = asyncio.run(main())
+    assert text == ["hello"]
+    assert thread != threading.current_thread().name
+
+
+@pytest.mark.parametrize("path, error", [("hang", "timed out"), ("crash", "resource limits")])
+def test_pool_replaces_its_workers_after_a_failed_job(path, error):
+    async def main():
+        pool = ExtractionPool(max_workers=1, timeout=1, max_memory_mb=None)
+        pool.start()
+        try:
+            with pytest.raises(ExtractionError, match=error):
+                [page async for page in pool.iter_pages(SlowExtractor(), path)]
+            return [page async for page in pool.iter_pages(SlowExtractor(), "fine")]
+        finally:
+            pool.close()
+
+    assert asyncio.run(main()) == ["fine 0"]
@@ -0,0 +1,34 @@
+import asyncio
+import uuid
+
+from app.services.jobs import IngestionWorkerPool
+
+
+def test_worker_survives_a_failing_job():
+    jobs = [uuid.uuid4(), uuid.uuid4()]
+    processed = []
+
+    class Pool(IngestionWorkerPool):
+        async def _claim(self):
+            return jobs.pop(0) if jobs else None
+
+        async def _process(self, job_id):
+            processed.append(job_id)
+            if len(processed) == 1:
+                raise ConnectionError("database went away")
+
+    async def main():
+        pool = Pool(None, concurrency=1, poll_interval=0.01)
+        pool.start()
+        try:
+            for _ in range(100):
+                if len(processed) == 2:
+                    break
+                await asyncio.sleep(0.01)
+            return [task.done() for task in pool._tasks]
+        finally:
+            await pool.close()
+
+    expected = list(jobs)
+    assert asyncio.run(main()) == [False]
+    assert processed == expected
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.elements import TextClause
+
+from app.services.embedding_providers import EmbeddingProvider, EmbeddingResult
+from app.services.embeddings import EmbeddingService
+from app.services.message_embeddings import MessageEmbedder
+
+
+class Unavailable(Exception):
+    pass
+
+
+class PickyProvider(EmbeddingProvider):
+    """Rejects any batch containing "bad"; raises a retryable error for "down"."""
+
+    name = "picky"
+    retryable_errors = (Unavailable,)
+
+    def __init__(self):
+        super().__init__("picky-v1", 2)
+        self.batches: List[List[str]] = []
+
+    async def embed(self, texts: List[str]) -> EmbeddingResult:
+        self.batches.append(list(texts))
+        if "down" in texts:
+            raise Unavailable()
+        if "bad" in texts:
+            raise ValueError("input rejected")
+        return EmbeddingResult(vectors=[[float(len(text)), 1.0] for text in texts], tokens=len(texts))
+
+
+class FakeSession:
+    """Hands out `rows` to the claim query and records every other statement."""
+
+    def __init__(self, rows, statements):
+        self.rows = rows
+        self.statements = statements
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        if isinstance(statement, TextClause):
+            # No flip has happened
+            return SimpleNamespace(first=lambda: None)
+        self.statements.append((statement, params))
+        if statement.is_select:
+            return SimpleNamespace(all=lambda: self.rows)
+        return SimpleNamespace()
+
+    async def commit(self):
+        pass
+
+
+def row(content, attempts=0):
+    return SimpleNamespace(id=uuid.uuid4(), content=content, embedding_attempts=attempts)
+
+
+def run_batch(rows, statements=None):
+    statements = [] if statements is None else statements
+
+    async def main():
+        service = EmbeddingService(PickyProvider(), retry_backoff=0, max_retries=0)
+        await service.start()
+        embedder = MessageEmbedder(service, session_factory=lambda: FakeSession(rows, statements), max_attempts=3, lease=60)
+        try:
+            return await embedder.embed_batch(), service.provider.batches
+        finally:
+            await service.close()
+
+    claimed, batches = asyncio.run(main())
+    return claimed, batches, statements
+
+
+def compiled(statement):
+    return statement.compile(dialect=postgresql.dialect())
+
+
+def test_claim_skips_leased_and_exhausted_messages():
+    started = datetime.now(timezone.utc)
+    claimed, _, statements = run_batch([])
+    assert claimed == 0
+    [(claim, _)] = statements
+    sql = str(compiled(claim))
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    params = compiled(claim).params
+    assert 3 in params.values()
+    [cutoff] = [value for value in params.values() if isinstance(value, datetime)]
+    assert started - timedelta(seconds=61) < cutoff <= started - timedelta(seconds=59)
+
+
+def test_rejected_message_only_fails_itself_and_counts_an_attempt():
+    good, bad = row("good"), row("bad")
+    claimed, batches, statements = run_batch([good, bad])
+    assert claimed == 2
+    # The whole batch, then each message on its own
+    assert batches == [["good", "bad"], ["good"], ["bad"]]
+
+    claim, lease, store, attempts = statements
+    assert "embedding_claimed_at" in str(compiled(lease[0]))
+    assert [params["message_id"] for params in store[1]] == [good.id]
+    # Normalized, like every stored vector
+    assert np.allclose(store[1][0]["vector"], np.array([4.0, 1.0]) / np.hypot(4.0, 1.0))
+    attempts_sql = compiled(attempts[0])
+    assert "embedding_attempts=(messages.embedding_attempts +" in str(attempts_sql)
+    assert [bad.id] in attempts_sql.params.values()
+
+
+def test_giving_up_is_logged_on_the_last_attempt(caplog):
+    last_try = row("bad", attempts=2)
+    with caplog.at_level(logging.ERROR, logger="app.services.message_embeddings"):
+        run_batch([row("bad", attempts=0), last_try])
+    [record] = caplog.records
+    assert str(last_try.id) in record.getMessage()
+
+
+def test_retryable_failure_releases_the_lease():
+    down, statements = row("down"), []
+    with pytest.raises(Unavailable):
+        run_batch([down], statements)
+    release = compiled(statements[-1][0])
+    assert "embedding_claimed_at" in str(release)
+    assert None in release.params.values()
+    assert [down.id] in release.params.values()
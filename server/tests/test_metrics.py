@@ -0,0 +1,22 @@
+from app.core.metrics import fingerprint
+
+
+def test_fingerprint_collapses_cast_parameter_lists():
+    two = fingerprint("SELECT * FROM documents WHERE id IN ($1::UUID, $2::UUID) AND filename = $3::VARCHAR")
+    three = fingerprint("SELECT * FROM documents WHERE id IN ($1::UUID, $2::UUID, $3::UUID) AND filename = $4::VARCHAR")
+    assert two == three == "SELECT * FROM documents WHERE id IN (...) AND filename = ?"
+
+
+def test_fingerprint_strips_multi_word_and_sized_casts():
+    statement = "UPDATE messages SET embedding=$1::vector(384), embedding_claimed_at=$2::TIMESTAMP WITH TIME ZONE WHERE id = $3::UUID"
+    assert fingerprint(statement) == "UPDATE messages SET embedding=?, embedding_claimed_at=? WHERE id = ?"
+
+
+def test_fingerprint_hashes_long_statements():
+    prefix = "SELECT " + ", ".join(f"column_{name}" for name in "abcdefghijklmnopqrstuvwxyz") + " FROM documents"
+    first = fingerprint(prefix + " WHERE user_id = $1::UUID")
+    second = fingerprint(prefix + " WHERE sha256 = $1::VARCHAR")
+    assert len(first) <= 160 and len(second) <= 160
+    assert first.startswith("SELECT column_a, column_b")
+    assert first != second
+    assert first == fingerprint(prefix + " WHERE user_id = $7::UUID")
@@ -0,0 +1,22 @@
+import datetime
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime.datetime(2026, 10, 18, 12, 30, 5, 123456, tzinfo=datetime.timezone.utc)
+    id = uuid.uuid4()
+    cursor = encode_cursor(created_at, id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, id)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor(datetime.datetime(2026, 1, 1), "not-a-uuid")])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
@@ -0,0 +1,71 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.reembedding import MISSING_VECTORS_SQL, ReembeddingError, flip_run
+
+
+class FakeSession:
+    """Answers the missing-vectors check from `missing`, one answer per check, and records the SQL."""
+
+    def __init__(self, missing):
+        self.run = SimpleNamespace(id=uuid.uuid4(), status="completed", dim=8, flipped_at=None)
+        self.missing = list(missing)
+        self.statements = []
+        self.commits = 0
+
+    async def get(self, model, id):
+        return self.run
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql)
+        if sql == MISSING_VECTORS_SQL:
+            row = SimpleNamespace(document_id=uuid.uuid4()) if self.missing.pop(0) else None
+            return SimpleNamespace(first=lambda: row)
+        return SimpleNamespace()
+
+    async def rollback(self):
+        self.statements.append("ROLLBACK")
+
+    async def commit(self):
+        self.commits += 1
+
+    def locked(self):
+        return any(sql.startswith("LOCK TABLE") for sql in self.statements)
+
+
+def test_flip_swaps_only_prebuilt_indexes_under_the_lock():
+    db = FakeSession([False, False])
+    run = asyncio.run(flip_run(db, db.run.id))
+    assert run.status == "flipped" and db.commits == 1
+
+    lock = next(i for i, sql in enumerate(db.statements) if sql.startswith("LOCK TABLE"))
+    # One check before the lock, one after it
+    assert db.statements[lock - 1] == db.statements[lock + 1] == MISSING_VECTORS_SQL
+    under_lock = db.statements[lock:]
+    assert not any("CREATE INDEX" in sql for sql in under_lock)
+    assert "ALTER TABLE messages RENAME COLUMN embedding_next TO embedding" in under_lock
+    assert "ALTER INDEX ix_messages_embedding_next_hnsw RENAME TO ix_messages_embedding_hnsw" in under_lock
+    assert "DROP INDEX IF EXISTS ix_document_chunks_embedding_next_pending" in under_lock
+
+
+def test_flip_of_a_run_that_fell_behind_never_takes_the_lock():
+    db = FakeSession([True])
+    with pytest.raises(ReembeddingError) as error:
+        asyncio.run(flip_run(db, db.run.id))
+    assert error.value.status_code == 409
+    assert not db.locked()
+    assert "ROLLBACK" in db.statements and db.commits == 1
+    assert db.run.status == "completed"
+
+
+def test_rows_written_during_the_check_send_the_run_back():
+    db = FakeSession([False, True])
+    with pytest.raises(ReembeddingError):
+        asyncio.run(flip_run(db, db.run.id))
+    assert db.locked()
+    assert not any("RENAME" in sql for sql in db.statements)
+    assert db.statements[-1].startswith("UPDATE reembedding_runs")
@@ -0,0 +1,74 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.search import SearchHit, diversify, reciprocal_rank_fusion
+
+
+def hit(**fields):
+    defaults = {"chunk_id": uuid.uuid4(), "chunk_index": 0, "content": "", "document_id": uuid.uuid4(), "filename": "f.txt"}
+    return SearchHit(**{**defaults, **fields})
+
+
+class FakeSession:
+    """Answers diversify's embedding lookup from a dict."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        return [SimpleNamespace(id=id, embedding=vector) for id, vector in self.vectors.items()]
+
+
+def test_rrf_scores_and_merges():
+    a, b, c = hit(distance=0.1), hit(distance=0.2), hit(text_rank=0.5)
+    b_text = SearchHit(**{**b.__dict__, "distance": None, "text_rank": 0.9})
+    fused = reciprocal_rank_fusion([([a, b], 1.0), ([b_text, c], 1.0)], k=10, rrf_k=60)
+
+    assert [h.chunk_id for h in fused] == [b.chunk_id, a.chunk_id, c.chunk_id]
+    assert fused[0].score == pytest.approx(1 / 62 + 1 / 61)
+    assert (fused[0].distance, fused[0].text_rank) == (0.2, 0.9)
+    # Inputs are not modified
+    assert a.score is None
+
+
+def test_rrf_weights_and_k():
+    a, b = hit(), hit()
+    fused = reciprocal_rank_fusion([([a], 1.0), ([b], 3.0)], k=1)
+    assert [h.chunk_id for h in fused] == [b.chunk_id]
+
+
+def near_duplicates():
+    hits = [hit(), hit(), hit()]
+    vectors = {hits[0].chunk_id: [1.0, 0.0], hits[1].chunk_id: [0.99, 0.1], hits[2].chunk_id: [0.0, 1.0]}
+    return hits, FakeSession(vectors)
+
+
+def test_diversify_relevance_only():
+    hits, db = near_duplicates()
+    picked = asyncio.run(diversify(db, hits, 2, 1.0, [1.0, 0.0]))
+    assert picked == hits[:2]
+
+
+def test_diversify_skips_near_duplicates():
+    hits, db = near_duplicates()
+    picked = asyncio.run(diversify(db, hits, 2, 0.3, [1.0, 0.0]))
+    assert picked == [hits[0], hits[2]]
+
+
+def test_diversify_by_fused_score():
+    hits, db = near_duplicates()
+    for h, score in zip(hits, [0.03, 0.02, 0.01]):
+        h.score = score
+    picked = asyncio.run(diversify(db, hits, 2, 0.3))
+    assert picked == [hits[0], hits[2]]
+
+
+def test_diversify_single_hit_needs_no_vectors():
+    hits, db = near_duplicates()
+    assert asyncio.run(diversify(db, hits[:1], 5, 0.5, [1.0, 0.0])) == hits[:1]
+    assert db.queries == 0
@@ -0,0 +1,65 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.core.middleware import MaxBodySizeMiddleware
+from app.services.uploads import UploadTooLarge, spool_upload
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(MaxBodySizeMiddleware, max_bytes=100, paths=["/upload"])
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return {"size": len(await request.body())}
+
+    @app.post("/other")
+    async def other(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def test_body_under_the_limit_passes(client):
+    assert client.post("/upload", content=b"a" * 100).json() == {"size": 100}
+
+
+def test_declared_oversize_body_is_rejected_up_front(client):
+    response = client.post("/upload", content=b"a" * 101)
+    assert response.status_code == 413
+    assert "100 byte limit" in response.json()["detail"]
+
+
+def test_chunked_oversize_body_is_rejected_while_streaming(client):
+    def body():
+        for _ in range(10):
+            yield b"a" * 20
+
+    response = client.post("/upload", content=body())
+    assert response.status_code == 413
+
+
+def test_other_paths_are_not_limited(client):
+    assert client.post("/other", content=b"a" * 1000).json() == {"size": 1000}
+
+
+def test_spooler_enforces_the_file_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "UPLOAD_SPOOL_DIR", str(tmp_path))
+
+    async def spool(data, max_bytes):
+        return await spool_upload(UploadFile(io.BytesIO(data), filename="a.txt"), max_bytes=max_bytes, chunk_size=4)
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool(b"a" * 11, 10))
+    assert list(tmp_path.iterdir()) == []
+
+    upload = asyncio.run(spool(b"a" * 10, 10))
+    assert (upload.size, upload.read_bytes()) == (10, b"a" * 10)
+    upload.close()
+    assert list(tmp_path.iterdir()) == []
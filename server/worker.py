@@ -0,0 +1,36 @@
+"""
+Standalone ingestion worker.
+
+Runs the same pipeline as the API's in-process workers, without serving
+HTTP, so ingestion capacity can be scaled separately from API pods:
+
+    cd server && python worker.py
+"""
+import asyncio
+import logging
+import signal
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.core.lifespan import start_services, stop_services
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    if settings.INGESTION_WORKERS <= 0:
+        raise SystemExit("INGESTION_WORKERS must be at least 1 to run a worker process.")
+    state = SimpleNamespace()
+    await start_services(state)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info("Ingestion worker running with %d concurrent jobs", settings.INGESTION_WORKERS)
+    await stop.wait()
+    await stop_services(state)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(main())